@@ -1,6 +1,58 @@
+import os
+import signal
+import sys
+import threading
 from django.apps import AppConfig
 
 
 class DatabaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'database'
+    
+    def ready(self):
+        """
+        服务进程启动时注册公钥重新加载信号，并在后台预热向量存储（连接、建索引、加载集合），
+        首个搜索无需等待加载
+        """
+        from utils.env_config import get_env_config
+        
+        # 管理命令（迁移、预热命令本身等）不做这些准备，只有服务进程需要
+        if not self._is_server_process():
+            return
+        
+        self._install_key_reload_signal()
+        
+        if not get_env_config().milvus_warmup:
+            return
+        
+        from utils.vector_store import get_vector_store
+        threading.Thread(
+            target=get_vector_store().ensure_ready,
+            name='milvus-warmup',
+            daemon=True
+        ).start()
+    
+    @staticmethod
+    def _is_server_process():
+        """是否为处理请求的服务进程"""
+        command = sys.argv[1] if len(sys.argv) > 1 else ''
+        if 'manage.py' in sys.argv[0]:
+            if command != 'runserver':
+                return False
+            # runserver的自动重载父进程不处理请求
+            if os.environ.get('RUN_MAIN') != 'true' and '--noreload' not in sys.argv:
+                return False
+        return True
+    
+    def _install_key_reload_signal(self):
+        """收到 SIGHUP 时重新加载API签名公钥（信号处理函数只能在主线程注册）"""
+        if not hasattr(signal, 'SIGHUP') or threading.current_thread() is not threading.main_thread():
+            return
+        
+        from utils.auth_utils import get_auth_utils
+        keyring = get_auth_utils().keyring
+        
+        def handle_sighup(signum, frame):
+            keyring.request_reload()
+        
+        signal.signal(signal.SIGHUP, handle_sighup)
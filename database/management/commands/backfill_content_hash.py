@@ -0,0 +1,73 @@
+"""
+内容哈希回填命令
+为去重功能上线前写入的数据补齐 content_hash 字段，同时补齐后续新增的
+doc_id / chunk_index / 结构化元数据字段（JSON格式的旧metadata中的同名字段会被提取）
+
+使用方法:
+    python manage.py backfill_content_hash
+    python manage.py backfill_content_hash --dry-run
+
+Milvus集合缺少任一字段时会按新schema重建集合（主键会重新分配，NumPy兜底镜像同步改为新主键）；
+NumPy存储的新增列在打开时自动补齐默认值，这里只补齐空哈希
+"""
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from utils.milvus_client import get_milvus_client
+from utils.vector_store import rebuild_milvus_collection
+from utils.numpy_vector_store import NumpyVectorStore
+from utils.env_config import get_env_config
+
+
+class Command(BaseCommand):
+    help = '为已有数据补齐内容哈希（content_hash）'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理条数')
+        parser.add_argument('--dry-run', action='store_true', help='只检查，不修改数据')
+    
+    def handle(self, *args, **options):
+        config = get_env_config()
+        
+        if config.vector_backend == 'milvus':
+            self._backfill_milvus(options)
+        
+        if config.vector_backend == 'numpy' or config.vector_fallback:
+            self._backfill_numpy(options)
+    
+    def _backfill_milvus(self, options):
+        config = get_env_config()
+        milvus_client = get_milvus_client()
+        if not milvus_client.ensure_ready():
+            raise CommandError('Milvus连接或集合初始化失败')
+        
+        missing = milvus_client.missing_fields()
+        if not missing:
+            self.stdout.write(self.style.SUCCESS(
+                f'集合 {milvus_client.collection_name} 已包含全部字段，无需回填'
+            ))
+            return
+        
+        count = milvus_client.collection.num_entities
+        if options['dry_run']:
+            self.stdout.write(f'集合 {milvus_client.collection_name} 缺少字段 {missing}，需重建 {count} 条数据')
+            return
+        
+        self.stdout.write(f'集合缺少字段 {missing}，开始重建（约 {count} 条，主键会重新分配）...')
+        try:
+            total = rebuild_milvus_collection(milvus_client, batch_size=options['batch_size'])
+        except Exception as e:
+            raise CommandError(f'重建集合失败: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Milvus回填完成，共 {total} 条'))
+        
+        # 重建后主键重新分配，词法索引需同步重建
+        if config.lexical_index_enabled:
+            call_command('rebuild_lexical_index', batch_size=options['batch_size'], stdout=self.stdout)
+    
+    def _backfill_numpy(self, options):
+        store = NumpyVectorStore()
+        if options['dry_run']:
+            self.stdout.write('NumPy存储将补齐空的 content_hash')
+            return
+        
+        total = store.backfill_content_hash(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'NumPy存储回填完成，共 {total} 条'))
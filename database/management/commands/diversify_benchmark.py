@@ -0,0 +1,68 @@
+"""
+结果多样化基准测试命令
+测量不同候选数量下MMR重排 + 近重复折叠的耗时（p50/p99），用于确认该阶段对搜索延迟的影响
+
+使用方法:
+    python manage.py diversify_benchmark
+    python manage.py diversify_benchmark --candidates 30 90 150 600 --k 10 --dim 1024
+
+候选数量一般为 (offset + limit) * CHUNK_SEARCH_OVERFETCH，默认limit=10时为30
+"""
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from utils.diversify import mmr_select
+from utils.env_config import get_env_config
+
+# 目标耗时（毫秒）
+TARGET_MS = 1.0
+
+
+class Command(BaseCommand):
+    help = '测量MMR重排和近重复折叠在不同候选数量下的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidates', type=int, nargs='+', default=[30, 60, 90, 150],
+                            help='候选数量列表')
+        parser.add_argument('--k', type=int, default=11, help='选出的结果数量（limit + 1）')
+        parser.add_argument('--dim', type=int, default=None, help='向量维度（默认使用VECTOR_DIMENSION）')
+        parser.add_argument('--repeat', type=int, default=2000, help='每组重复次数')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子')
+
+    def handle(self, *args, **options):
+        config = get_env_config()
+        dim = options['dim'] or int(os.getenv('VECTOR_DIMENSION', '384'))
+        k = options['k']
+        rng = np.random.default_rng(options['seed'])
+
+        self.stdout.write(
+            f'维度 {dim}, k={k}, λ={config.mmr_lambda}, 近重复阈值={config.near_duplicate_threshold}, '
+            f'每组 {options["repeat"]} 次'
+        )
+        header = f'{"候选数":>8} {"p50(ms)":>10} {"p99(ms)":>10} {"平均(ms)":>10} {"折叠数":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for count in options['candidates']:
+            query = rng.standard_normal(dim).astype(np.float32)
+            # 候选与查询相关，并混入约10%的近重复向量
+            candidates = (query + rng.standard_normal((count, dim)) * 1.5).astype(np.float32)
+            duplicates = rng.choice(count, size=max(1, count // 10), replace=False)
+            candidates[duplicates] = candidates[0] + rng.standard_normal((len(duplicates), dim)) * 0.01
+
+            latencies = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                mmr_select(query, candidates, k, config.mmr_lambda, config.near_duplicate_threshold)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            p50 = float(np.percentile(latencies, 50))
+            p99 = float(np.percentile(latencies, 99))
+            # 折叠数: 选满全部候选时被丢弃的数量
+            dropped = count - len(mmr_select(query, candidates, count, config.mmr_lambda,
+                                             config.near_duplicate_threshold))
+            line = f'{count:>8} {p50:>10.3f} {p99:>10.3f} {float(np.mean(latencies)):>10.3f} {dropped:>8}'
+            self.stdout.write(self.style.SUCCESS(line) if p99 < TARGET_MS else self.style.WARNING(line))
+
+        self.stdout.write(f'\n目标: p99 < {TARGET_MS}ms')
@@ -0,0 +1,93 @@
+"""
+向量精度迁移命令
+修改 VECTOR_PRECISION 后，将已有向量转换为配置的存储精度，并输出迁移前后的向量内存占用
+
+使用方法:
+    python manage.py migrate_vector_precision --dry-run
+    python manage.py migrate_vector_precision
+
+Milvus集合按新schema重建（主键会重新分配，NumPy兜底镜像同步改为新主键，词法索引随之重建）；
+NumPy存储直接转换向量文件，主键不变
+迁移前可先用 vector_benchmark --precisions float32 float16 对比召回率
+"""
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from utils.milvus_client import get_milvus_client
+from utils.vector_store import rebuild_milvus_collection
+from utils.numpy_vector_store import NumpyVectorStore
+from utils.env_config import get_env_config
+
+
+def format_mb(num_bytes):
+    """字节数格式化为MB"""
+    return f'{num_bytes / 1024 / 1024:.1f}MB'
+
+
+class Command(BaseCommand):
+    help = '将已有向量转换为 VECTOR_PRECISION 配置的存储精度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Milvus重建时每批复制条数')
+        parser.add_argument('--dry-run', action='store_true', help='只输出迁移前后的内存占用，不修改数据')
+
+    def handle(self, *args, **options):
+        config = get_env_config()
+
+        if config.vector_backend == 'milvus':
+            self._migrate_milvus(config, options)
+
+        if config.vector_backend == 'numpy' or config.vector_fallback:
+            self._migrate_numpy(config, options)
+
+    def _migrate_milvus(self, config, options):
+        milvus_client = get_milvus_client()
+        if not milvus_client.ensure_ready():
+            raise CommandError('Milvus连接或集合初始化失败')
+
+        current = milvus_client.collection_precision
+        target = config.vector_precision
+        count = milvus_client.collection.num_entities
+        self.stdout.write(
+            f'Milvus集合 {milvus_client.collection_name}: {count} 条，'
+            f'{current} {format_mb(milvus_client.vector_memory_bytes(count, current))} -> '
+            f'{target} {format_mb(milvus_client.vector_memory_bytes(count, target))}'
+        )
+
+        if current == target:
+            self.stdout.write(self.style.SUCCESS('Milvus集合已是目标精度，无需迁移'))
+            return
+        if options['dry_run']:
+            return
+
+        self.stdout.write('开始重建集合（主键会重新分配）...')
+        try:
+            total = rebuild_milvus_collection(milvus_client, batch_size=options['batch_size'])
+        except Exception as e:
+            raise CommandError(f'重建集合失败: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Milvus精度迁移完成，共 {total} 条'))
+
+        # 重建后主键重新分配，词法索引需同步重建
+        if config.lexical_index_enabled:
+            call_command('rebuild_lexical_index', batch_size=options['batch_size'], stdout=self.stdout)
+
+    def _migrate_numpy(self, config, options):
+        store = NumpyVectorStore()
+        if not store.ensure_ready():
+            raise CommandError('NumPy向量存储初始化失败')
+
+        current = store.precision
+        target = config.vector_precision
+        self.stdout.write(
+            f'NumPy存储 {store.data_dir}: '
+            f'{current} {format_mb(store.vector_memory_bytes(precision=current))} -> '
+            f'{target} {format_mb(store.vector_memory_bytes(precision=target))}'
+        )
+
+        if current == target:
+            self.stdout.write(self.style.SUCCESS('NumPy存储已是目标精度，无需迁移'))
+            return
+        if options['dry_run']:
+            return
+
+        total = store.convert_precision(target)
+        self.stdout.write(self.style.SUCCESS(f'NumPy精度迁移完成，共 {total} 条'))
@@ -0,0 +1,58 @@
+"""
+Milvus社区分区管理命令
+查看各分区数据量，按社区加载/释放分区（热点社区常驻内存，冷门社区释放），
+或将开启分区前写入默认分区的数据按社区重新分区
+
+使用方法:
+    python manage.py milvus_partitions
+    python manage.py milvus_partitions --load c1 c2
+    python manage.py milvus_partitions --release c3
+    python manage.py milvus_partitions --rebuild
+
+需设置 MILVUS_PARTITION_BY_COMMUNITY=True 并连接支持分区的Milvus（Milvus Lite不支持分区）
+"""
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from utils.env_config import get_env_config
+from utils.milvus_client import get_milvus_client
+from utils.vector_store import rebuild_milvus_collection
+
+
+class Command(BaseCommand):
+    help = '查看、加载、释放Milvus社区分区，或将已有数据按社区重新分区'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--load', nargs='+', metavar='COMMUNITY_ID', help='加载这些社区的分区')
+        parser.add_argument('--release', nargs='+', metavar='COMMUNITY_ID', help='释放这些社区的分区')
+        parser.add_argument('--rebuild', action='store_true', help='重建集合，将已有数据按社区写入分区（主键会重新分配）')
+        parser.add_argument('--batch-size', type=int, default=1000, help='重建时每批复制条数')
+
+    def handle(self, *args, **options):
+        milvus_client = get_milvus_client()
+        if not milvus_client.ensure_ready():
+            raise CommandError('Milvus连接或集合初始化失败')
+        if not milvus_client.partitioned:
+            raise CommandError('未启用社区分区（MILVUS_PARTITION_BY_COMMUNITY=False 或当前Milvus不支持分区）')
+
+        if options['rebuild']:
+            self.stdout.write('开始重建集合（主键会重新分配）...')
+            try:
+                total = rebuild_milvus_collection(milvus_client, batch_size=options['batch_size'])
+            except Exception as e:
+                raise CommandError(f'重建集合失败: {e}')
+            self.stdout.write(self.style.SUCCESS(f'按社区分区完成，共 {total} 条'))
+            if get_env_config().lexical_index_enabled:
+                call_command('rebuild_lexical_index', batch_size=options['batch_size'], stdout=self.stdout)
+
+        if options['load']:
+            names = milvus_client.load_partitions(options['load'])
+            self.stdout.write(self.style.SUCCESS(f'已加载分区: {", ".join(names) or "无"}'))
+
+        if options['release']:
+            names = milvus_client.release_partitions(options['release'])
+            self.stdout.write(self.style.SUCCESS(f'已释放分区: {", ".join(names) or "无"}'))
+
+        self.stdout.write(f'集合 {milvus_client.collection_name} 的分区:')
+        for item in milvus_client.partition_stats():
+            state = '已加载' if item['loaded'] else '未加载'
+            self.stdout.write(f'  {item["name"]:<40} {item["rows"]:>10} 条  {state}')
@@ -0,0 +1,26 @@
+"""
+Milvus预热命令
+连接数据库、确保集合和索引存在并加载到内存
+
+使用方法:
+    python manage.py milvus_warmup
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from utils.milvus_client import get_milvus_client
+
+
+class Command(BaseCommand):
+    help = '预热Milvus: 连接、确保集合和索引存在并加载集合'
+    
+    def handle(self, *args, **options):
+        milvus_client = get_milvus_client()
+        
+        start = time.perf_counter()
+        if not milvus_client.ensure_ready():
+            raise CommandError('Milvus预热失败')
+        
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'集合 {milvus_client.collection_name} 已就绪，耗时 {elapsed:.2f}s'
+        ))
@@ -0,0 +1,47 @@
+"""
+词法索引重建命令
+从向量存储全量重建词法索引（启用混合搜索前的存量数据、或重建集合导致主键变化后执行）
+
+使用方法:
+    python manage.py rebuild_lexical_index
+    python manage.py rebuild_lexical_index --batch-size 2000
+"""
+from django.core.management.base import BaseCommand, CommandError
+from utils.lexical_index import get_lexical_index
+from utils.metadata_fields import STRUCTURED_FIELDS
+from utils.vector_store import get_vector_store
+
+
+class Command(BaseCommand):
+    help = '从向量存储全量重建词法索引'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理条数')
+    
+    def handle(self, *args, **options):
+        lexical_index = get_lexical_index()
+        if lexical_index is None:
+            raise CommandError('词法索引未启用（LEXICAL_INDEX_ENABLED=False）')
+        
+        vector_store = get_vector_store()
+        attribute_fields = [name for name in STRUCTURED_FIELDS if vector_store.has_field(name)]
+        output_fields = ['id', 'content'] + (['doc_id'] if vector_store.has_field('doc_id') else []) + attribute_fields
+        
+        try:
+            rows = vector_store.iterate_rows(output_fields, batch_size=options['batch_size'])
+            lexical_index.clear()
+            total = 0
+            for batch in rows:
+                if not lexical_index.add(
+                    [row['id'] for row in batch],
+                    [row['content'] for row in batch],
+                    [row.get('doc_id', '') for row in batch],
+                    [{name: row[name] for name in attribute_fields} for row in batch]
+                ):
+                    raise CommandError('写入词法索引失败')
+                total += len(batch)
+                self.stdout.write(f'已索引 {total} 条')
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        
+        self.stdout.write(self.style.SUCCESS(f'词法索引重建完成，共 {total} 条'))
@@ -0,0 +1,193 @@
+"""
+重新嵌入命令
+更换嵌入模型（或同名模型更新版本）时，将活动集合的数据按限速分批用新模型重新嵌入，
+写入影子集合（含NumPy镜像和词法索引），追平后原子切换活动集合，读写无需停机
+
+使用方法:
+    python manage.py reembed_collection --model nomic-embed-text --model-version 1
+    python manage.py reembed_collection --model nomic-embed-text --rate 50 --batch-size 32
+    python manage.py reembed_collection --model nomic-embed-text --no-switch   # 只构建，不切换
+    python manage.py reembed_collection --status
+    python manage.py reembed_collection --activate zhihui_vectors             # 回滚到旧集合
+
+中断后重新执行相同命令会从上次的进度继续；旧集合保留用于回滚，确认无误后可手动删除
+切换前在旧集合中更新的元数据不会同步到影子集合
+"""
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from pymilvus import utility
+from utils.env_config import get_env_config
+from utils.metadata_fields import STRUCTURED_FIELDS
+from utils.milvus_client import get_milvus_client
+from utils.model_registry import base_collection_name, get_model_registry, active_model_info
+from utils.ollama_client import get_ollama_client
+from utils.vector_store import get_vector_store, build_vector_store
+
+# 探测新模型向量维度使用的文本
+PROBE_TEXT = '智慧社区'
+
+
+class Command(BaseCommand):
+    help = '使用新的嵌入模型将数据重新嵌入到影子集合，完成后原子切换'
+
+    def add_arguments(self, parser):
+        config = get_env_config()
+        parser.add_argument('--model', default=config.embedding_model, help='新的嵌入模型（默认EMBEDDING_MODEL）')
+        parser.add_argument('--model-version', default=config.embedding_model_version,
+                            help='新模型的版本标识（默认EMBEDDING_MODEL_VERSION）')
+        parser.add_argument('--rate', type=float, default=config.reembed_rate, help='速率上限（条/秒）')
+        parser.add_argument('--batch-size', type=int, default=config.embedding_batch_size, help='每批嵌入条数')
+        parser.add_argument('--grace-seconds', type=float, default=5,
+                            help='切换后等待其他进程完成切换的秒数，之后再追平一次旧集合的新写入')
+        parser.add_argument('--no-switch', action='store_true', help='只构建影子集合，不切换活动集合')
+        parser.add_argument('--activate', metavar='COLLECTION', help='直接将活动集合切换为指定集合（用于回滚）')
+        parser.add_argument('--status', action='store_true', help='输出模型登记信息')
+
+    def handle(self, *args, **options):
+        registry = get_model_registry()
+
+        if options['status']:
+            self.stdout.write(json.dumps(registry.snapshot(), ensure_ascii=False, indent=2))
+            return
+
+        if options['activate']:
+            self._activate(registry, options['activate'])
+            return
+
+        if options['rate'] <= 0 or options['batch_size'] < 1:
+            raise CommandError('rate和batch-size必须为正数')
+
+        source = get_vector_store()
+        if not source.ensure_ready():
+            raise CommandError('活动集合初始化失败')
+        source_name = source.collection_name
+        source_info = active_model_info()
+        model, version = options['model'], options['model_version']
+        if (source_info['model'], source_info['version']) == (model, version):
+            self.stdout.write(self.style.SUCCESS(f'活动集合 {source_name} 已使用 {model} (v{version})，无需重新嵌入'))
+            return
+
+        target_name, after_id = self._prepare_target(registry, source_name, model, version)
+        target_info = registry.collection_info(target_name)
+        target = build_vector_store(target_name, target_info['dim'])
+        if not target.ensure_ready():
+            raise CommandError(f'影子集合 {target_name} 初始化失败')
+
+        self.stdout.write(
+            f'重新嵌入: {source_name} ({source_info["model"]} v{source_info["version"]}) -> '
+            f'{target_name} ({model} v{version}, {target_info["dim"]}维)，限速 {options["rate"]} 条/秒'
+        )
+        after_id, total = self._copy(registry, source, target, target_name, model, after_id, options)
+
+        registry.update(target_name, status='built')
+        if options['no_switch']:
+            self.stdout.write(self.style.SUCCESS(
+                f'影子集合 {target_name} 构建完成（本次 {total} 条），'
+                f'切换: python manage.py reembed_collection --activate {target_name}'
+            ))
+            return
+
+        registry.activate(target_name)
+        self.stdout.write(self.style.SUCCESS(f'活动集合已切换为 {target_name}'))
+
+        # 其他进程在下一次获取向量存储时切换，期间写入旧集合的数据再追平一次
+        time.sleep(options['grace_seconds'])
+        _, caught_up = self._copy(registry, source, target, target_name, model, after_id, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'重新嵌入完成，共 {total + caught_up} 条（切换后追平 {caught_up} 条）；'
+            f'旧集合 {source_name} 保留用于回滚: python manage.py reembed_collection --activate {source_name}'
+        ))
+
+    def _activate(self, registry, name):
+        """切换活动集合（目标集合必须已登记且构建完成）"""
+        info = registry.collection_info(name)
+        if info is None:
+            raise CommandError(f'集合 {name} 未登记')
+        if info.get('status') == 'building':
+            raise CommandError(f'集合 {name} 尚未构建完成，请先执行重新嵌入')
+        registry.activate(name)
+        self.stdout.write(self.style.SUCCESS(f'活动集合已切换为 {name} ({info["model"]} v{info["version"]})'))
+
+    def _prepare_target(self, registry, source_name, model, version):
+        """
+        复用未完成的同模型影子集合，否则登记新的影子集合（探测新模型的向量维度）
+
+        Returns:
+            tuple: (影子集合名, 断点主键或None)
+        """
+        collections = registry.snapshot()['collections']
+        for name, info in collections.items():
+            if (info.get('status') in ('building', 'built') and info.get('source') == source_name
+                    and (info.get('model'), info.get('version')) == (model, version)):
+                self.stdout.write(f'继续未完成的影子集合 {name}，断点主键 {info.get("progress_id")}')
+                return name, info.get('progress_id')
+
+        probe = get_ollama_client().get_embeddings([PROBE_TEXT], model, use_cache=False)
+        if not probe:
+            raise CommandError(f'调用新模型 {model} 失败，请确认Ollama中已拉取该模型')
+
+        base_name = base_collection_name()
+        index = 2
+        while f'{base_name}_v{index}' in collections or self._collection_exists(f'{base_name}_v{index}'):
+            index += 1
+        name = f'{base_name}_v{index}'
+
+        registry.register(name, model, version, len(probe[0]), status='building', source=source_name)
+        return name, None
+
+    def _collection_exists(self, name):
+        """Milvus中是否已存在同名集合（NumPy后端时不检查）"""
+        if get_env_config().vector_backend == 'numpy':
+            return False
+        milvus_client = get_milvus_client()
+        return milvus_client.connect() and utility.has_collection(name)
+
+    def _copy(self, registry, source, target, target_name, model, after_id, options):
+        """
+        按主键顺序分批读取、重新嵌入并写入影子集合，直到追平源集合（限速，进度写入登记文件）
+
+        Returns:
+            tuple: (最后处理的主键, 本次处理条数)
+        """
+        optional_fields = ['metadata', 'doc_id', 'chunk_index'] + list(STRUCTURED_FIELDS)
+        fields = ['id', 'content'] + [name for name in optional_fields if source.has_field(name)]
+        attribute_fields = [name for name in STRUCTURED_FIELDS if source.has_field(name)]
+        ollama_client = get_ollama_client()
+
+        started = time.monotonic()
+        total = 0
+        while True:
+            # 每批重新查询，限速等待期间不持有迭代器
+            rows = source.iterate_rows(fields, after_id=after_id, batch_size=options['batch_size'])
+            try:
+                batch = next(rows, None)
+            finally:
+                rows.close()
+            if not batch:
+                return after_id, total
+
+            embeddings = ollama_client.get_embeddings([row['content'] for row in batch], model, use_cache=False)
+            if embeddings is None:
+                raise CommandError(f'重新嵌入失败，已保存进度（主键 {after_id}），重新执行命令可继续')
+
+            ids = target.insert_vectors(
+                embeddings,
+                [row['content'] for row in batch],
+                [row.get('metadata', '') for row in batch],
+                doc_ids=[row.get('doc_id', '') for row in batch],
+                chunk_indexes=[row.get('chunk_index', 0) for row in batch],
+                attributes=[{name: row[name] for name in attribute_fields} for row in batch]
+            )
+            if ids is None:
+                raise CommandError(f'写入影子集合失败，已保存进度（主键 {after_id}），重新执行命令可继续')
+
+            after_id = max(int(row['id']) for row in batch)
+            registry.update(target_name, progress_id=after_id)
+            total += len(batch)
+            self.stdout.write(f'已重新嵌入 {total} 条（主键 {after_id}）')
+
+            # 限速: 按累计条数计算应达到的时间点
+            delay = started + total / options['rate'] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
@@ -0,0 +1,237 @@
+"""
+向量索引基准测试命令
+对多种索引配置和向量存储精度测量构建耗时、向量内存占用、召回率(recall@k)和搜索延迟(p50/p95/p99)
+
+使用方法:
+    python manage.py vector_benchmark --num 20000 --queries 200 --k 10
+    python manage.py vector_benchmark --configs FLAT "IVF_FLAT:nlist=256:nprobe=16"
+    python manage.py vector_benchmark --configs FLAT --precisions float32 float16
+    python manage.py vector_benchmark --vectors data.npy --uri http://localhost:19530 \
+        --configs IVF_SQ8 "HNSW:M=16,efConstruction=200:ef=64"
+
+配置格式: 索引类型[:构建参数[:搜索参数]]，参数为逗号分隔的 key=value
+Milvus Lite 只支持 FLAT / IVF_FLAT / AUTOINDEX（float16向量只支持FLAT），其他索引类型需通过 --uri 连接独立部署的Milvus
+"""
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
+from utils.env_config import get_env_config, VECTOR_INDEX_DEFAULTS, VECTOR_METRIC_TYPES, VECTOR_PRECISION_BYTES
+
+
+BENCH_ALIAS = 'vector_benchmark'
+INSERT_BATCH_SIZE = 5000
+
+# 存储精度对应的向量字段类型和NumPy类型
+PRECISION_TYPES = {
+    'float32': (DataType.FLOAT_VECTOR, np.float32),
+    'float16': (DataType.FLOAT16_VECTOR, np.float16),
+}
+
+
+def parse_params(text):
+    """解析 key=value,key=value 格式的参数"""
+    params = {}
+    if not text:
+        return params
+    for pair in text.split(','):
+        key, _, value = pair.partition('=')
+        key, value = key.strip(), value.strip()
+        if not key or not value:
+            raise CommandError(f'参数格式错误: {pair}')
+        try:
+            params[key] = int(value)
+        except ValueError:
+            try:
+                params[key] = float(value)
+            except ValueError:
+                params[key] = value
+    return params
+
+
+def parse_config(spec):
+    """解析单个索引配置，返回 (索引类型, 构建参数, 搜索参数)"""
+    parts = spec.split(':')
+    index_type = parts[0].strip().upper()
+    if index_type not in VECTOR_INDEX_DEFAULTS:
+        raise CommandError(f'不支持的索引类型: {index_type}')
+
+    default_build, default_search = VECTOR_INDEX_DEFAULTS[index_type]
+    build_params = parse_params(parts[1]) if len(parts) > 1 and parts[1] else dict(default_build)
+    search_params = parse_params(parts[2]) if len(parts) > 2 and parts[2] else dict(default_search)
+    return index_type, build_params, search_params
+
+
+def exact_top_k(base, queries, k, metric_type, chunk_size=256):
+    """使用NumPy精确计算每个查询的top-k（作为召回率的基准）"""
+    if metric_type == 'COSINE':
+        base = base / np.maximum(np.linalg.norm(base, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    base_norms = (base * base).sum(axis=1)
+    ground_truth = np.empty((len(queries), k), dtype=np.int64)
+
+    for start in range(0, len(queries), chunk_size):
+        chunk = queries[start:start + chunk_size]
+        scores = chunk @ base.T
+        if metric_type == 'L2':
+            # |q-x|^2 = |q|^2 - 2q·x + |x|^2，|q|^2 对排序无影响
+            scores = base_norms[None, :] - 2 * scores
+        else:
+            scores = -scores
+
+        top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)
+        ground_truth[start:start + len(chunk)] = np.take_along_axis(top, order, axis=1)
+
+    return ground_truth
+
+
+class Command(BaseCommand):
+    help = '对比不同向量索引配置的召回率、搜索延迟和构建耗时'
+
+    def add_arguments(self, parser):
+        config = get_env_config()
+        parser.add_argument('--num', type=int, default=10000, help='基础向量数量（随机生成时）')
+        parser.add_argument('--queries', type=int, default=100, help='查询向量数量')
+        parser.add_argument('--k', type=int, default=10, help='recall@k 中的 k')
+        parser.add_argument('--dim', type=int, default=None, help='向量维度，默认使用 VECTOR_DIMENSION')
+        parser.add_argument('--metric', default=config.milvus_metric_type, choices=VECTOR_METRIC_TYPES)
+        parser.add_argument('--vectors', default=None, help='从 .npy 文件加载基础向量（N x dim）')
+        parser.add_argument('--uri', default='./milvus_data/benchmark.db', help='Milvus连接URI')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--configs',
+            nargs='+',
+            default=['FLAT', 'IVF_FLAT', 'AUTOINDEX'],
+            help='索引配置列表，格式: 索引类型[:构建参数[:搜索参数]]'
+        )
+        parser.add_argument(
+            '--precisions',
+            nargs='+',
+            default=['float32'],
+            choices=list(PRECISION_TYPES),
+            help='向量存储精度列表，与每个索引配置组合测试'
+        )
+
+    def handle(self, *args, **options):
+        configs = [parse_config(spec) for spec in options['configs']]
+        k = options['k']
+        metric_type = options['metric']
+        rng = np.random.default_rng(options['seed'])
+
+        # 准备数据
+        if options['vectors']:
+            base = np.load(options['vectors']).astype(np.float32)
+            if base.ndim != 2:
+                raise CommandError('向量文件必须是二维数组')
+        else:
+            dim = options['dim'] or int(os.getenv('VECTOR_DIMENSION', '384'))
+            base = rng.standard_normal((options['num'], dim), dtype=np.float32)
+
+        num, dim = base.shape
+        if num < k:
+            raise CommandError('基础向量数量不能小于k')
+
+        # 查询向量取自基础向量并加扰动，更接近真实的近邻分布
+        picks = rng.choice(num, size=options['queries'], replace=num < options['queries'])
+        queries = base[picks] + 0.1 * rng.standard_normal((len(picks), dim), dtype=np.float32)
+
+        self.stdout.write(f'数据: {num} x {dim}, 查询 {len(queries)} 条, k={k}, metric={metric_type}')
+
+        start = time.perf_counter()
+        ground_truth = exact_top_k(base, queries, k, metric_type)
+        self.stdout.write(f'精确基准计算耗时: {time.perf_counter() - start:.2f}s\n')
+
+        connections.connect(alias=BENCH_ALIAS, uri=options['uri'])
+        try:
+            rows = []
+            for precision in options['precisions']:
+                for index_type, build_params, search_params in configs:
+                    try:
+                        rows.append(self._run_config(
+                            base, queries, ground_truth, k, metric_type,
+                            index_type, build_params, search_params, precision
+                        ))
+                    except Exception as e:
+                        # 例如 Milvus Lite 仅支持 FLAT / IVF_FLAT / AUTOINDEX
+                        self.stderr.write(f'❌ {index_type} ({precision}) 测试失败: {e}')
+        finally:
+            connections.disconnect(BENCH_ALIAS)
+
+        self._print_report(rows, k)
+
+    def _run_config(self, base, queries, ground_truth, k, metric_type, index_type, build_params, search_params,
+                    precision='float32'):
+        """对单个索引配置和存储精度建集合、建索引并测量"""
+        name = f'bench_{index_type.lower()}_{precision}_{int(time.time() * 1000)}'
+        self.stdout.write(f'测试 {index_type} ({precision}) build={build_params} search={search_params} ...')
+
+        field_type, dtype = PRECISION_TYPES[precision]
+        fields = [
+            FieldSchema(name='id', dtype=DataType.INT64, is_primary=True, auto_id=False),
+            FieldSchema(name='vector', dtype=field_type, dim=base.shape[1]),
+        ]
+        collection = Collection(name, CollectionSchema(fields, '向量索引基准测试'), using=BENCH_ALIAS)
+
+        try:
+            for start in range(0, len(base), INSERT_BATCH_SIZE):
+                batch = base[start:start + INSERT_BATCH_SIZE].astype(dtype)
+                collection.insert([list(range(start, start + len(batch))), list(batch)])
+            collection.flush()
+
+            # 构建耗时 = 建索引 + 加载
+            start = time.perf_counter()
+            collection.create_index('vector', {
+                'metric_type': metric_type,
+                'index_type': index_type,
+                'params': build_params
+            })
+            collection.load()
+            build_time = time.perf_counter() - start
+
+            param = {'metric_type': metric_type, 'params': search_params}
+            latencies = []
+            hits = 0
+            for query, truth in zip(queries, ground_truth):
+                start = time.perf_counter()
+                result = collection.search(
+                    data=[query.astype(dtype)], anns_field='vector', param=param, limit=k
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(set(result[0].ids) & set(truth.tolist()))
+
+            latencies = np.array(latencies)
+            return {
+                'index': index_type,
+                'precision': precision,
+                'memory': base.shape[0] * base.shape[1] * VECTOR_PRECISION_BYTES[precision],
+                'build': build_params,
+                'search': search_params,
+                'build_time': build_time,
+                'recall': hits / (len(queries) * k),
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+            }
+        finally:
+            collection.release()
+            utility.drop_collection(name, using=BENCH_ALIAS)
+
+    def _print_report(self, rows, k):
+        """输出对比表格"""
+        self.stdout.write('')
+        header = (
+            f"{'索引':<10} {'精度':<8} {'向量内存(MB)':>12} {f'recall@{k}':>10} {'构建(s)':>8} "
+            f"{'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}  参数"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f"{row['index']:<10} {row['precision']:<8} {row['memory'] / 1024 / 1024:>12.1f} "
+                f"{row['recall']:>10.4f} {row['build_time']:>8.2f} "
+                f"{row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f}  "
+                f"build={row['build']} search={row['search']}"
+            )
@@ -1,3 +1,1435 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.test import SimpleTestCase
+import requests
+
+from utils.auth import TokenAuth
+from utils.auth_utils import AuthUtils, NonceStore, NonceStoreFullError, SignatureCache, parse_auth_data
+from utils.diversify import diversify_results, mmr_select
+from utils.embedding_cache import EmbeddingCache, model_cache_key, text_hash
+from utils.lexical_index import LexicalIndex, ngram_tokens, reciprocal_rank_fusion
+from utils.keyring import Keyring, load_public_key, sign_with_key, verify_with_key
+from utils.metadata_fields import MissingFieldError, parse_filter, to_milvus_expr, to_sql_where
+from utils.milvus_client import MilvusClient
+from utils.model_registry import ModelRegistry
+from utils.numpy_vector_store import NumpyVectorStore
+from utils.ollama_client import AsyncOllamaClient, OllamaClient
+from utils.search_cache import SearchResultCache, make_search_key
+from utils.text_chunker import chunk_text, collapse_by_document, split_sentences
+from utils.vector_store import FallbackVectorStore, LexicalSyncedStore
+from utils.write_buffer import BufferFullError, WriteBehindBuffer
+
+
+def _sign(private_key, data):
+    """用测试私钥签名，返回base64编码的签名"""
+    return base64.b64encode(sign_with_key(private_key, data.encode('utf-8'))).decode('utf-8')
+
+
+def _write_public_key(path, private_key):
+    """以OpenSSH格式写入公钥文件"""
+    with open(path, 'wb') as f:
+        f.write(private_key.public_key().public_bytes(
+            serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH
+        ))
+
+
+class AuthTestMixin:
+    """生成测试密钥对并构造鉴权工具"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.public_key = cls.private_key.public_key()
+
+    def make_auth(self, **kwargs):
+        kwargs.setdefault('timestamp_window', 300)
+        kwargs.setdefault('require_nonce', False)
+        kwargs.setdefault('signature_cache', SignatureCache(max_size=16, ttl=300))
+        kwargs.setdefault('nonce_store', NonceStore(max_size=1000))
+        return AuthUtils(public_key=self.public_key, **kwargs)
+
+    def headers(self, data):
+        return data, _sign(self.private_key, data)
+
+
+class SignatureCacheTests(AuthTestMixin, SimpleTestCase):
+    """签名验证结果缓存"""
+
+    def test_repeated_header_skips_rsa_verify(self):
+        auth = self.make_auth()
+        data, signature = self.headers(str(int(time.time())))
+        with mock.patch('utils.auth_utils.verify_with_key', wraps=verify_with_key) as verify:
+            self.assertTrue(auth.verify_signature(data, signature))
+            self.assertTrue(auth.verify_signature(data, signature))
+            self.assertEqual(verify.call_count, 1)
+        self.assertEqual(auth.signature_cache.stats()['hits'], 1)
+
+    def test_invalid_signature_is_cached_as_failure(self):
+        auth = self.make_auth()
+        data, signature = self.headers('1700000000')
+        self.assertFalse(auth.verify_signature('1700000001', signature))
+        self.assertFalse(auth.verify_signature('1700000001', signature))
+        self.assertTrue(auth.verify_signature(data, signature))
+        self.assertEqual(auth.signature_cache.stats()['hits'], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = SignatureCache(max_size=16, ttl=10)
+        key = SignatureCache.make_key('data', 'signature')
+        with mock.patch('utils.auth_utils.time.monotonic', return_value=100.0):
+            cache.set(key, True)
+            self.assertTrue(cache.get(key))
+        with mock.patch('utils.auth_utils.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get(key))
+
+    def test_size_is_bounded(self):
+        cache = SignatureCache(max_size=2, ttl=300)
+        for index in range(3):
+            cache.set(SignatureCache.make_key(str(index), 'signature'), True)
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertIsNone(cache.get(SignatureCache.make_key('0', 'signature')))
+
+    def test_key_separates_data_and_signature(self):
+        self.assertNotEqual(SignatureCache.make_key('ab', 'c'), SignatureCache.make_key('a', 'bc'))
+
+
+class TimestampWindowTests(AuthTestMixin, SimpleTestCase):
+    """认证数据时间戳窗口"""
+
+    def test_parse_auth_data(self):
+        self.assertEqual(parse_auth_data('1700000000'), (1700000000.0, None))
+        self.assertEqual(parse_auth_data('1700000000:abc'), (1700000000.0, 'abc'))
+        self.assertIsNone(parse_auth_data('random-string'))
+        self.assertIsNone(parse_auth_data('nan'))
+        self.assertIsNone(parse_auth_data('1700000000:' + 'x' * 200))
+
+    def test_fresh_timestamp_is_accepted(self):
+        auth = self.make_auth()
+        self.assertIsNone(auth.authenticate(*self.headers(str(int(time.time())))))
+
+    def test_stale_and_future_timestamps_are_rejected(self):
+        auth = self.make_auth(timestamp_window=60)
+        now = int(time.time())
+        self.assertIn('过期', auth.authenticate(*self.headers(str(now - 120))))
+        self.assertIn('过期', auth.authenticate(*self.headers(str(now + 120))))
+
+    def test_stale_header_is_rejected_without_rsa_verify(self):
+        auth = self.make_auth(timestamp_window=60)
+        data, signature = self.headers(str(int(time.time()) - 120))
+        with mock.patch.object(auth, 'verify_signature') as verify_signature:
+            self.assertIsNotNone(auth.authenticate(data, signature))
+            verify_signature.assert_not_called()
+
+    def test_cached_header_expires_with_window(self):
+        auth = self.make_auth(timestamp_window=60)
+        now = time.time()
+        data, signature = self.headers(str(int(now)))
+        self.assertIsNone(auth.authenticate(data, signature))
+        with mock.patch('utils.auth_utils.time.time', return_value=now + 120):
+            self.assertIn('过期', auth.authenticate(data, signature))
+
+    def test_malformed_data_is_rejected(self):
+        auth = self.make_auth()
+        self.assertIn('格式错误', auth.authenticate(*self.headers('random-string')))
+
+    def test_zero_window_disables_timestamp_check(self):
+        auth = self.make_auth(timestamp_window=0)
+        self.assertIsNone(auth.authenticate(*self.headers('random-string')))
+        self.assertIsNone(auth.authenticate(*self.headers('1000')))
+
+    def test_window_is_disabled_by_default(self):
+        # 旧客户端签名的不是时间戳，升级后默认仍可通过，AUTH_TIMESTAMP_WINDOW 设置后才校验
+        with mock.patch.dict(os.environ):
+            os.environ.pop('AUTH_TIMESTAMP_WINDOW', None)
+            auth = self.make_auth(timestamp_window=None)
+            self.assertEqual(auth.timestamp_window, 0)
+            self.assertIsNone(auth.authenticate(*self.headers('legacy-payload')))
+            os.environ['AUTH_TIMESTAMP_WINDOW'] = '300'
+            auth = self.make_auth(timestamp_window=None)
+            self.assertIn('格式错误', auth.authenticate(*self.headers('legacy-payload')))
+
+    def test_bad_signature_is_rejected(self):
+        auth = self.make_auth()
+        data = str(int(time.time()))
+        _, signature = self.headers(str(int(time.time()) - 1))
+        self.assertIn('签名验证失败', auth.authenticate(data, signature))
+
+
+class NonceReplayTests(AuthTestMixin, SimpleTestCase):
+    """nonce防重放"""
+
+    def test_nonce_replay_is_rejected(self):
+        auth = self.make_auth()
+        now = int(time.time())
+        data, signature = self.headers(f'{now}:n1')
+        self.assertIsNone(auth.authenticate(data, signature))
+        self.assertIn('重放', auth.authenticate(data, signature))
+        self.assertIsNone(auth.authenticate(*self.headers(f'{now}:n2')))
+        self.assertEqual(auth.nonce_store.stats()['replays'], 1)
+
+    def test_header_without_nonce_can_be_reused_within_window(self):
+        auth = self.make_auth()
+        data, signature = self.headers(str(int(time.time())))
+        for _ in range(3):
+            self.assertIsNone(auth.authenticate(data, signature))
+
+    def test_require_nonce(self):
+        auth = self.make_auth(require_nonce=True)
+        now = int(time.time())
+        self.assertIn('nonce', auth.authenticate(*self.headers(str(now))))
+        self.assertIsNone(auth.authenticate(*self.headers(f'{now}:n1')))
+
+    def test_forged_request_does_not_consume_nonce(self):
+        auth = self.make_auth()
+        data, signature = self.headers(f'{int(time.time())}:n1')
+        self.assertIsNotNone(auth.authenticate(data, 'Zm9yZ2Vk'))
+        self.assertIsNone(auth.authenticate(data, signature))
+
+    def test_memory_store_expires_nonces(self):
+        store = NonceStore(max_size=2)
+        now = time.time()
+        self.assertTrue(store.add('a', now + 60))
+        self.assertFalse(store.add('a', now + 60))
+        with mock.patch('utils.auth_utils.time.time', return_value=now + 61):
+            self.assertTrue(store.add('a', now + 120))
+        self.assertEqual(store.stats()['size'], 1)
+
+    def test_full_memory_store_rejects_new_nonces(self):
+        store = NonceStore(max_size=2)
+        now = time.time()
+        store.add('a', now + 60)
+        store.add('b', now + 300)
+        with self.assertRaises(NonceStoreFullError):
+            store.add('c', now + 300)
+        # 未过期的记录不被淘汰，仍能识别重放
+        self.assertFalse(store.add('a', now + 60))
+        self.assertEqual(store.stats()['rejected'], 1)
+        # 过期记录清理后腾出空间
+        with mock.patch('utils.auth_utils.time.time', return_value=now + 61):
+            self.assertTrue(store.add('c', now + 300))
+
+    def test_sqlite_store_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'nonces.db')
+            first, second = NonceStore(db_path=path), NonceStore(db_path=path)
+            expires_at = time.time() + 60
+            self.assertTrue(first.add('n1', expires_at))
+            self.assertFalse(second.add('n1', expires_at))
+            self.assertTrue(second.add('n2', expires_at))
+            self.assertEqual(second.stats()['backend'], 'sqlite')
+            first._db.close()
+            second._db.close()
+
+
+class KeyringTests(SimpleTestCase):
+    """多公钥密钥环"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.ed25519_key = ed25519.Ed25519PrivateKey.generate()
+        _write_public_key(os.path.join(self.directory.name, 'ops.pub'), self.rsa_key)
+        _write_public_key(os.path.join(self.directory.name, 'loader.pub'), self.ed25519_key)
+        self.keyring = Keyring(self.directory.name, reload_interval=3600)
+
+    def make_auth(self):
+        return AuthUtils(timestamp_window=300, require_nonce=False, keyring=self.keyring,
+                         signature_cache=SignatureCache(), nonce_store=NonceStore())
+
+    def test_loads_rsa_and_ed25519_keys(self):
+        keys = {item['id']: item['type'] for item in self.keyring.stats()['keys']}
+        self.assertEqual(keys, {'ops': 'rsa-2048', 'loader': 'ed25519'})
+
+    def test_key_id_selects_public_key(self):
+        auth = self.make_auth()
+        data = str(int(time.time()))
+        self.assertIsNone(auth.authenticate(data, _sign(self.rsa_key, data), 'ops'))
+        self.assertIsNone(auth.authenticate(data, _sign(self.ed25519_key, data), 'loader'))
+        self.assertIn('签名验证失败', auth.authenticate(data, _sign(self.rsa_key, data), 'loader'))
+        self.assertIn('未知的密钥ID', auth.authenticate(data, _sign(self.rsa_key, data), 'missing'))
+
+    def test_request_reload_picks_up_changes(self):
+        _write_public_key(os.path.join(self.directory.name, 'ops.pub'), ed25519.Ed25519PrivateKey.generate())
+        os.remove(os.path.join(self.directory.name, 'loader.pub'))
+        # 未到检查间隔且未请求重新加载时保持原有密钥
+        self.assertIsNotNone(self.keyring.get('loader'))
+
+        self.keyring.request_reload()
+        self.assertEqual(self.keyring.get('ops')['type'], 'ed25519')
+        self.assertIsNone(self.keyring.get('loader'))
+
+    def test_periodic_check_parses_changed_files_only(self):
+        _write_public_key(os.path.join(self.directory.name, 'extra.pub'), ed25519.Ed25519PrivateKey.generate())
+        with mock.patch('utils.keyring.load_public_key', wraps=load_public_key) as load:
+            self.keyring.reload(force=False)
+            self.assertEqual(load.call_count, 1)
+        self.assertEqual(self.keyring.get('extra')['type'], 'ed25519')
+
+    def test_rotated_key_does_not_reuse_cached_result(self):
+        auth = self.make_auth()
+        data = str(int(time.time()))
+        signature = _sign(self.rsa_key, data)
+        self.assertTrue(auth.verify_signature(data, signature, 'ops'))
+
+        _write_public_key(os.path.join(self.directory.name, 'ops.pub'), rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        self.keyring.request_reload()
+        self.assertFalse(auth.verify_signature(data, signature, 'ops'))
+
+    def test_unparseable_file_keeps_previous_key(self):
+        with open(os.path.join(self.directory.name, 'ops.pub'), 'wb') as f:
+            f.write(b'ssh-rsa truncated')
+        self.keyring.request_reload()
+        self.assertEqual(self.keyring.get('ops')['type'], 'rsa-2048')
+
+
+class InsertAuthViewTests(AuthTestMixin, SimpleTestCase):
+    """插入接口的签名认证"""
+
+    def post(self, auth, data, signature):
+        with mock.patch('database.views.get_auth_utils', return_value=auth):
+            return self.client.post(
+                '/database/insert-text/', data='{}', content_type='application/json',
+                HTTP_X_AUTH_DATA=data, HTTP_X_AUTH_SIGNATURE=signature
+            )
+
+    def test_stale_header_returns_401(self):
+        response = self.post(self.make_auth(), *self.headers(str(int(time.time()) - 3600)))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('过期', response.json()['message'])
+
+    def test_replayed_header_returns_401(self):
+        auth = self.make_auth()
+        data, signature = self.headers(f'{int(time.time())}:n1')
+        # 第一次通过认证，因缺少text返回400
+        self.assertEqual(self.post(auth, data, signature).status_code, 400)
+        response = self.post(auth, data, signature)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('重放', response.json()['message'])
+
+    def test_full_nonce_store_returns_503(self):
+        auth = self.make_auth(nonce_store=NonceStore(max_size=1))
+        now = int(time.time())
+        self.assertEqual(self.post(auth, *self.headers(f'{now}:n1')).status_code, 400)
+        response = self.post(auth, *self.headers(f'{now}:n2'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('nonce', response.json()['message'])
+
+
+class OllamaEmbedEndpointTests(SimpleTestCase):
+    """单条、批量和异步嵌入使用同一个 /api/embed 接口"""
+
+    def setUp(self):
+        patcher = mock.patch('utils.ollama_client.get_embedding_cache', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _response(count):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'embeddings': [[0.6, 0.8]] * count}
+        return response
+
+    def test_single_and_batch_use_embed(self):
+        client = OllamaClient(base_url='http://ollama')
+        reply = lambda *args, **kwargs: self._response(len(kwargs['json']['input']))
+        with mock.patch.object(client, '_request', side_effect=reply) as request:
+            self.assertEqual(client.get_embedding('a', model='m'), [0.6, 0.8])
+            self.assertEqual(client.get_embeddings(['a', 'b'], model='m'), [[0.6, 0.8]] * 2)
+        self.assertEqual([call.args[1] for call in request.call_args_list], ['/api/embed', '/api/embed'])
+
+    def test_async_uses_embed(self):
+        client = AsyncOllamaClient(base_url='http://ollama')
+        with mock.patch.object(client, '_request', new=mock.AsyncMock(return_value=self._response(1))) as request:
+            self.assertEqual(async_to_sync(client.get_embedding)('a', model='m'), [0.6, 0.8])
+        self.assertEqual(request.call_args.args[1], '/api/embed')
+        self.assertEqual(request.call_args.kwargs['json']['input'], ['a'])
+
+    def test_async_client_is_shared_across_event_loops(self):
+        client = AsyncOllamaClient(base_url='http://ollama')
+        loops = []
+
+        async def request(*args, **kwargs):
+            loops.append(asyncio.get_running_loop())
+            return self._response(1)
+
+        with mock.patch.object(client, '_request', side_effect=request):
+            # async_to_sync每次调用使用新的事件循环，请求都在客户端自己的循环上执行
+            async_to_sync(client.get_embedding)('a', model='m')
+            http_client = client._client
+            async_to_sync(client.get_embedding)('b', model='m')
+        self.assertIs(client._client, http_client)
+        self.assertEqual(loops, [client._loop, client._loop])
+
+        loop = client._loop
+        async_to_sync(client.aclose)()
+        self.assertTrue(http_client.is_closed)
+        self.assertIsNone(client._client)
+        time.sleep(0.05)
+        self.assertFalse(loop.is_running())
+
+
+class OllamaRetryTests(SimpleTestCase):
+    """连接错误和5xx按指数退避重试，4xx不重试，并发等待超时返回None"""
+
+    def setUp(self):
+        for target in ('utils.ollama_client.get_embedding_cache', 'utils.ollama_client.time.sleep'):
+            patcher = mock.patch(target, return_value=None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = OllamaClient(base_url='http://ollama')
+        self.client.max_retries = 2
+
+    @staticmethod
+    def _response(status_code):
+        response = mock.Mock(status_code=status_code, text='')
+        response.json.return_value = {'embeddings': [[0.6, 0.8]]}
+        return response
+
+    def embed(self, *replies):
+        with mock.patch.object(self.client.session, 'request', side_effect=list(replies)) as request:
+            embedding = self.client.get_embedding('a', model='m')
+        return embedding, request.call_count
+
+    def test_retries_connection_error_and_5xx(self):
+        embedding, calls = self.embed(
+            requests.exceptions.ConnectionError('refused'), self._response(503), self._response(200)
+        )
+        self.assertEqual(embedding, [0.6, 0.8])
+        self.assertEqual(calls, 3)
+
+    def test_client_error_is_not_retried(self):
+        self.assertEqual(self.embed(self._response(400), self._response(200)), (None, 1))
+
+    def test_gives_up_after_max_retries(self):
+        self.assertEqual(self.embed(*[self._response(500)] * 3), (None, 3))
+        self.assertEqual(self.embed(*[requests.exceptions.ConnectionError('refused')] * 3), (None, 3))
+
+    def test_semaphore_timeout_returns_none(self):
+        self.client._semaphore = threading.BoundedSemaphore(1)
+        self.client.acquire_timeout = 0.01
+        self.client._semaphore.acquire()
+        self.addCleanup(self.client._semaphore.release)
+        self.assertEqual(self.embed(self._response(200)), (None, 0))
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    """嵌入向量缓存: 内存LRU + SQLite磁盘层"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, 'embeddings.db')
+
+    def test_normalized_text_shares_entry(self):
+        cache = EmbeddingCache(max_size=16)
+        cache.set('智慧  社区 ', 'm', [1.0, 2.0])
+        self.assertEqual(cache.get('智慧 社区', 'm'), [1.0, 2.0])
+        self.assertIsNone(cache.get('智慧社区', 'm'))
+
+    def test_alternating_models_keep_their_entries(self):
+        cache = EmbeddingCache(max_size=16, db_path=self.db_path)
+        cache.set('text', 'a', [1.0])
+        cache.set('text', 'b', [2.0])
+        for _ in range(2):
+            self.assertEqual(cache.get('text', 'a'), [1.0])
+            self.assertEqual(cache.get('text', 'b'), [2.0])
+
+        reopened = EmbeddingCache(max_size=16, db_path=self.db_path)
+        self.assertEqual(reopened.get('text', 'a'), [1.0])
+        self.assertEqual(reopened.get('text', 'b'), [2.0])
+
+    def test_memory_is_bounded_and_falls_back_to_disk(self):
+        cache = EmbeddingCache(max_size=2, db_path=self.db_path)
+        for index in range(3):
+            cache.set(f'text-{index}', 'm', [float(index)])
+        self.assertEqual(cache.stats()['memory_size'], 2)
+        self.assertEqual(cache.get('text-0', 'm'), [0.0])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_rows_without_format_marker_are_dropped(self):
+        EmbeddingCache(max_size=16, db_path=self.db_path).set('text', 'm', [1.0])
+        db = sqlite3.connect(self.db_path)
+        db.execute("DELETE FROM meta WHERE key = 'format'")
+        db.commit()
+        db.close()
+        self.assertIsNone(EmbeddingCache(max_size=16, db_path=self.db_path).get('text', 'm'))
+
+    def test_new_model_version_misses_old_vectors(self):
+        client = OllamaClient()
+        cache = EmbeddingCache(max_size=16, db_path=self.db_path)
+        with mock.patch('utils.ollama_client.get_embedding_cache', return_value=cache), \
+                mock.patch.object(client, '_request_embeddings', side_effect=[[[1.0]], [[2.0]]]) as request:
+            self.assertEqual(client.get_embedding('text', model='m', version='1'), [1.0])
+            self.assertEqual(client.get_embedding('text', model='m', version='1'), [1.0])
+            # 同名模型重新嵌入为v2后，查询不再命中v1权重的向量（重启后磁盘层同样区分）
+            self.assertEqual(client.get_embedding('text', model='m', version='2'), [2.0])
+            self.assertEqual(request.call_count, 2)
+        reopened = EmbeddingCache(max_size=16, db_path=self.db_path)
+        self.assertEqual(reopened.get('text', model_cache_key('m', '1')), [1.0])
+        self.assertEqual(reopened.get('text', model_cache_key('m', '2')), [2.0])
+
+    def test_default_model_uses_active_collection_version(self):
+        client = OllamaClient()
+        cache = EmbeddingCache(max_size=16)
+        cache.set('text', model_cache_key('m', '1'), [1.0])
+        with mock.patch('utils.ollama_client.get_embedding_cache', return_value=cache), \
+                mock.patch('utils.ollama_client.active_model_info', return_value={'model': 'm', 'version': '2'}), \
+                mock.patch.object(client, '_request_embeddings', return_value=[[2.0]]) as request:
+            self.assertEqual(client.get_embeddings(['text']), [[2.0]])
+        request.assert_called_once_with(['text'], 'm')
+
+
+class MilvusLifecycleTests(SimpleTestCase):
+    """并发的ensure_ready只建一次集合、加载一次，就绪探针在预热完成前返回503"""
+
+    def setUp(self):
+        self.milvus = MilvusClient('lifecycle_test', vector_dim=4)
+        self.collection = mock.Mock(indexes=[])
+        self.collection.schema.fields = self.milvus.build_schema().fields
+        # 加载耗时较长时其他线程会在生命周期锁上等待
+        self.collection.load.side_effect = lambda *args, **kwargs: time.sleep(0.05)
+        connections = mock.Mock()
+        connections.has_connection.return_value = True
+        connections.get_connection_addr.return_value = {'address': 'localhost:19530'}
+        utility = mock.Mock()
+        utility.has_collection.return_value = False
+        for target, value in (('connections', connections), ('utility', utility), ('register_store', mock.Mock())):
+            patcher = mock.patch(f'utils.milvus_client.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('utils.milvus_client.Collection', return_value=self.collection)
+        self.collection_class = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_ensure_ready_initializes_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.milvus.ensure_ready())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [True] * 8)
+        self.collection_class.assert_called_once()
+        self.collection.load.assert_called_once_with()
+        self.assertEqual(self.collection.create_index.call_args_list[0].args[0], 'vector')
+        self.assertEqual(len(self.collection.create_index.call_args_list), 1 + len(MilvusClient.SCALAR_INDEX_FIELDS))
+
+    def test_readiness_returns_503_until_warmed_up(self):
+        with mock.patch('database.views.get_vector_store', return_value=self.milvus):
+            response = self.client.get('/database/ready/')
+            self.assertEqual(response.status_code, 503)
+            self.assertFalse(json.loads(response.content)['data']['milvus_ready'])
+
+            self.milvus.ensure_ready()
+            response = self.client.get('/database/ready/')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(json.loads(response.content)['data']['milvus_ready'])
+
+
+class MilvusIndexTests(SimpleTestCase):
+    """向量索引与配置不一致时重建"""
+
+    def make_client(self, params):
+        client = MilvusClient('index_test', vector_dim=4)
+        client.index_type, client.metric_type = 'IVF_FLAT', 'L2'
+        client.index_params = {'metric_type': 'L2', 'index_type': 'IVF_FLAT', 'params': {'nlist': 128}}
+        index = mock.Mock(field_name='vector', index_name='vector', params=params)
+        client.collection = mock.Mock(indexes=[index])
+        client.collection.schema.fields = []
+        return client
+
+    def test_matching_index_is_kept(self):
+        client = self.make_client({'index_type': 'IVF_FLAT', 'metric_type': 'L2', 'nlist': '128', 'dim': '4'})
+        self.assertTrue(client._ensure_index())
+        client.collection.drop_index.assert_not_called()
+        client.collection.create_index.assert_not_called()
+
+    def test_changed_metric_or_params_rebuilds_index(self):
+        for params in ({'index_type': 'IVF_FLAT', 'metric_type': 'IP', 'nlist': '128'},
+                       {'index_type': 'FLAT', 'metric_type': 'L2'},
+                       {'index_type': 'IVF_FLAT', 'metric_type': 'L2', 'nlist': '64'}):
+            client = self.make_client(params)
+            self.assertTrue(client._ensure_index())
+            client.collection.release.assert_called_once()
+            client.collection.drop_index.assert_called_once_with(index_name='vector')
+            client.collection.create_index.assert_called_once_with('vector', client.index_params)
+
+
+class Float16IndexFallbackTests(SimpleTestCase):
+    """float16集合只在Milvus Lite下改用FLAT索引"""
+
+    def make_client(self, lite):
+        client = MilvusClient('f16_index_test', vector_dim=4)
+        client.index_type = 'HNSW'
+        client.index_params = {'metric_type': 'L2', 'index_type': 'HNSW', 'params': {'M': 16}}
+        collection = mock.Mock()
+        collection.schema.fields = [mock.Mock(dtype=MilvusClient.VECTOR_DTYPES['float16'])]
+        collection.schema.fields[0].name = 'vector'
+        with mock.patch.object(client, 'is_lite', return_value=lite):
+            client._apply_lite_index_fallback(collection)
+        return client
+
+    def test_lite_uses_flat(self):
+        client = self.make_client(lite=True)
+        self.assertEqual(client.index_params, {'metric_type': 'L2', 'index_type': 'FLAT', 'params': {}})
+
+    def test_standalone_keeps_configured_index(self):
+        self.assertEqual(self.make_client(lite=False).index_type, 'HNSW')
+
+
+class SearchResultCacheTests(SimpleTestCase):
+    """搜索结果缓存与写入代数失效"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_key_depends_on_vector_limit_and_params(self):
+        key = make_search_key([0.1, 0.2], 10, {'metric_type': 'L2'}, expr='')
+        self.assertEqual(key, make_search_key([0.1, 0.2], 10, {'metric_type': 'L2'}, expr=''))
+        for other in (make_search_key([0.1, 0.3], 10, {'metric_type': 'L2'}, expr=''),
+                      make_search_key([0.1, 0.2], 5, {'metric_type': 'L2'}, expr=''),
+                      make_search_key([0.1, 0.2], 10, {'metric_type': 'IP'}, expr=''),
+                      make_search_key([0.1, 0.2], 10, {'metric_type': 'L2'}, expr='category == "a"')):
+            self.assertNotEqual(key, other)
+
+    def test_entries_expire_with_generation_and_ttl(self):
+        cache = SearchResultCache(max_size=16, ttl=10)
+        with mock.patch('utils.search_cache.time.monotonic', return_value=100.0):
+            cache.set('key', 1, [{'id': 1}])
+            self.assertEqual(cache.get('key', 1), [{'id': 1}])
+            self.assertIsNone(cache.get('key', 2))
+            cache.set('key', 2, [{'id': 1}])
+        with mock.patch('utils.search_cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('key', 2))
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_results_are_copied_and_size_is_bounded(self):
+        cache = SearchResultCache(max_size=2, ttl=300)
+        cache.set('a', 0, [{'id': 1}])
+        cache.get('a', 0)[0]['id'] = 99
+        self.assertEqual(cache.get('a', 0), [{'id': 1}])
+        cache.set('b', 0, [])
+        cache.get('a', 0)
+        cache.set('c', 0, [])
+        # a最近被访问，淘汰最久未使用的b
+        self.assertIsNone(cache.get('b', 0))
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def make_client(self):
+        client = MilvusClient('cache_test', vector_dim=4)
+        client.generation_path = os.path.join(self.directory, 'cache_test.generation')
+        client.search_cache = SearchResultCache(max_size=16, ttl=300)
+        client.collection = mock.Mock()
+        client.collection.schema.fields = client.build_schema().fields
+        client.collection.search.return_value = [[]]
+        client.collection.insert.return_value = mock.Mock(primary_keys=[1])
+        client._ready.set()
+        return client
+
+    def test_insert_invalidates_cached_search(self):
+        client = self.make_client()
+
+        client.search_vectors([0.1] * 4)
+        client.search_vectors([0.1] * 4)
+        self.assertEqual(client.collection.search.call_count, 1)
+        client.insert_vectors([[0.1] * 4], ['text'])
+        client.search_vectors([0.1] * 4)
+        self.assertEqual(client.collection.search.call_count, 2)
+
+    def test_insert_in_other_worker_invalidates_cached_search(self):
+        reader, writer = self.make_client(), self.make_client()
+
+        reader.search_vectors([0.1] * 4)
+        reader.search_vectors([0.1] * 4)
+        self.assertEqual(reader.collection.search.call_count, 1)
+        writer.insert_vectors([[0.1] * 4], ['text'])
+        reader.search_vectors([0.1] * 4)
+        self.assertEqual(reader.collection.search.call_count, 2)
+
+    def test_generation_file_is_replaced_when_full(self):
+        client = self.make_client()
+        client.GENERATION_FILE_MAX_BYTES = 2
+
+        client._bump_generation()
+        first = client.generation
+        client._bump_generation()
+        self.assertEqual(os.path.getsize(client.generation_path), 0)
+        self.assertNotEqual(client.generation, first)
+
+
+class CommunityPartitionTests(SimpleTestCase):
+    """按社区分区: 分区解析、跨进程分区刷新、分区上限和元数据更新的分区归属"""
+
+    def make_client(self, partitions=('_default',), max_partitions='1024'):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        client = MilvusClient('partition_test', vector_dim=4)
+        client.generation_path = os.path.join(directory.name, 'partition_test.generation')
+        client.collection = mock.Mock()
+        client.collection.schema.fields = client.build_schema().fields
+        client.collection.search.return_value = [[]]
+        client.collection.partitions = [mock.Mock(name=name) for name in partitions]
+        for partition, name in zip(client.collection.partitions, partitions):
+            partition.name = name
+        client.partitioned = True
+        client._partitions = set(partitions)
+        client._loaded_partitions = set(partitions)
+        client._ready.set()
+        patcher = mock.patch.dict(os.environ, {'MILVUS_MAX_PARTITIONS': max_partitions})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        partition = mock.patch('utils.milvus_client.Partition')
+        self.partition = partition.start()
+        self.addCleanup(partition.stop)
+        return client
+
+    def test_partition_name(self):
+        self.assertEqual(MilvusClient.partition_name('c1'), 'c_c1')
+        self.assertEqual(MilvusClient.partition_name(''), '_default')
+        self.assertTrue(MilvusClient.partition_name('社区-1').startswith('h_'))
+
+    def test_search_scopes_to_community_and_default_partitions(self):
+        client = self.make_client(partitions=('_default', 'c_c1', 'c_c2'))
+        client.search_vectors([0.1] * 4, partitions=['c1'])
+        kwargs = client.collection.search.call_args.kwargs
+        self.assertEqual(kwargs['partition_names'], ['_default', 'c_c1'])
+        self.assertEqual(kwargs['expr'], to_milvus_expr([('community_id', 'in', ['c1'])]))
+
+    def test_missing_partition_refreshes_from_server(self):
+        client = self.make_client()
+        # 其他进程创建了c_c1分区，本进程的分区列表中还没有
+        client.collection.partitions = client.collection.partitions + [mock.Mock()]
+        client.collection.partitions[-1].name = 'c_c1'
+        self.assertEqual(client.load_partitions(['c1']), ['c_c1'])
+        self.partition.return_value.load.assert_called_once_with()
+
+        # 节流间隔内不重复读取分区列表
+        client.collection.partitions = []
+        client.search_vectors([0.1] * 4, partitions=['c2'])
+        self.assertIn('c_c1', client._partitions)
+
+    def test_insert_creates_partitions_until_limit(self):
+        client = self.make_client(partitions=('_default', 'c_c1'), max_partitions='3')
+        client.collection.has_partition.return_value = False
+        client.collection.insert.side_effect = lambda data, partition_name: mock.Mock(
+            primary_keys=list(range(len(data[0])))
+        )
+        client.insert_vectors([[0.1] * 4] * 3, ['a', 'b', 'c'], attributes=[
+            {'community_id': community_id} for community_id in ('c1', 'c2', 'c3')
+        ])
+
+        created = [call.args[0] for call in client.collection.create_partition.call_args_list]
+        self.assertEqual(len(created), 1)
+        inserted = sorted(call.kwargs['partition_name'] for call in client.collection.insert.call_args_list)
+        self.assertEqual(inserted, sorted({'c_c1', created[0], '_default'}))
+
+    def test_update_metadata_upserts_into_community_partition(self):
+        client = self.make_client(partitions=('_default', 'c_c1', 'c_c2'))
+        row = {name: '' for name in ('content', 'metadata', 'doc_id', 'content_hash')}
+        row.update({'id': 7, 'vector': [0.1] * 4, 'community_id': 'c1'})
+        client.collection.query.return_value = [row]
+
+        self.assertTrue(client.update_metadata(7, 'new', {'community_id': 'c2'}))
+        upsert = client.collection.upsert.call_args
+        self.assertEqual(upsert.kwargs['partition_name'], 'c_c2')
+        self.assertEqual(upsert.args[0][0]['community_id'], 'c2')
+        deleted = [call.kwargs['partition_name'] for call in client.collection.delete.call_args_list]
+        self.assertEqual(deleted, ['_default', 'c_c1'])
+
+    def test_release_and_load_communities(self):
+        client = self.make_client(partitions=('_default', 'c_c1', 'c_c2'))
+        self.assertEqual(client.release_partitions(['c1']), ['c_c1'])
+        self.assertNotIn('c_c1', client._loaded_partitions)
+        self.assertEqual(client.load_partitions(['c1', 'c2']), ['c_c1', 'c_c2'])
+        self.assertEqual(self.partition.return_value.load.call_count, 1)
+
+    def test_unpartitioned_store_filters_by_community(self):
+        client = self.make_client()
+        client.partitioned = False
+        client.search_vectors([0.1] * 4, partitions=['c1'])
+        kwargs = client.collection.search.call_args.kwargs
+        self.assertIsNone(kwargs['partition_names'])
+        self.assertEqual(kwargs['expr'], to_milvus_expr([('community_id', 'in', ['c1'])]))
+
+
+class NumpyStoreTestMixin:
+    """在临时目录中创建NumPy向量存储"""
+
+    def make_store(self, vector_dim=4, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch('utils.numpy_vector_store.register_store')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        store = NumpyVectorStore(data_dir=directory.name, collection_name='test_vectors', vector_dim=vector_dim, **kwargs)
+        self.addCleanup(store.disconnect)
+        return store
+
+
+class FallbackReplayTests(NumpyStoreTestMixin, SimpleTestCase):
+    """Milvus不可用期间只写入NumPy的数据在恢复后回放"""
+
+    def setUp(self):
+        self.primary = mock.Mock(collection_name='test_vectors')
+        self.primary.insert_vectors.return_value = None
+        self.primary.ensure_ready.return_value = False
+        self.fallback = self.make_store()
+        self.store = FallbackVectorStore(self.primary, self.fallback)
+        patcher = mock.patch('utils.vector_store.get_lexical_index', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pending_rows_are_served_from_fallback_then_replayed(self):
+        ids = self.store.insert_vectors([[1, 0, 0, 0], [0, 1, 0, 0]], ['a', 'b'])
+        self.assertEqual(self.store.pending_count, 2)
+
+        # Milvus恢复后搜索仍使用NumPy存储，直到回放完成
+        self.primary.ensure_ready.return_value = True
+        self.primary.insert_vectors.return_value = [1001, 1002]
+        self.store._last_replay_attempt = time.time()
+        results = self.store.search_vectors([1, 0, 0, 0], limit=2)
+        self.assertEqual([result['id'] for result in results], ids)
+        self.primary.search_vectors_batch.assert_not_called()
+
+        self.store._last_replay_attempt = 0
+        self.store._replay_lock.acquire()
+        self.store._replay_pending()
+        self.assertEqual(self.store.pending_count, 0)
+        vectors, contents = self.primary.insert_vectors.call_args.args[:2]
+        self.assertEqual(contents, ['a', 'b'])
+        self.assertEqual(vectors[1].tolist(), [0, 1, 0, 0])
+        self.assertEqual(self.fallback.find_ids_by_hashes([text_hash('a')]), {text_hash('a'): 1001})
+
+        self.primary.search_vectors_batch.return_value = [[]]
+        self.store.search_vectors([1, 0, 0, 0])
+        self.primary.search_vectors_batch.assert_called_once()
+
+    def test_failed_replay_keeps_rows_pending(self):
+        self.store.insert_vectors([[1, 0, 0, 0]], ['a'])
+        self.primary.ensure_ready.return_value = True
+        self.store._replay_lock.acquire()
+        self.store._replay_pending()
+        self.assertEqual(self.store.pending_count, 1)
+        self.assertFalse(self.store._replay_lock.locked())
+
+
+class FilterParsingTests(SimpleTestCase):
+    """搜索过滤条件的解析和转换"""
+
+    def test_parse_and_translate(self):
+        conditions = parse_filter({
+            'category': '通知', 'community_id': ['c1', 'c2'], 'created_at': {'gte': 10, 'lt': 20}
+        })
+        self.assertEqual(conditions, [
+            ('category', '==', '通知'), ('community_id', 'in', ['c1', 'c2']),
+            ('created_at', '>=', 10), ('created_at', '<', 20)
+        ])
+        self.assertEqual(
+            to_milvus_expr(conditions),
+            'category == "通知" and community_id in ["c1", "c2"] and created_at >= 10 and created_at < 20'
+        )
+        self.assertEqual(
+            to_sql_where(conditions),
+            ('category == ? AND community_id IN (?, ?) AND created_at >= ? AND created_at < ?',
+             ['通知', 'c1', 'c2', 10, 20])
+        )
+
+    def test_invalid_filters_are_rejected(self):
+        for raw in ('x', {'unknown': 1}, {'category': 1}, {'community_id': []},
+                    {'created_at': {'eq': 1}}, {'created_at': True}):
+            with self.assertRaises(ValueError):
+                parse_filter(raw)
+
+
+class MissingFilterFieldTests(SimpleTestCase):
+    """旧集合缺少过滤字段时报错，而不是返回空结果"""
+
+    def test_missing_field_raises(self):
+        client = MilvusClient('missing_field_test', vector_dim=4)
+        client.collection = mock.Mock()
+        client.collection.schema.fields = [mock.Mock(), mock.Mock()]
+        client.collection.schema.fields[0].name = 'id'
+        client.collection.schema.fields[1].name = 'vector'
+        with mock.patch.object(client, 'ensure_ready', return_value=True):
+            with self.assertRaises(MissingFieldError) as context:
+                client.search_vectors_batch([[0.1] * 4], filters=[('category', '==', 'a')])
+        self.assertEqual(context.exception.fields, ['category'])
+        self.assertIn('backfill_content_hash', str(context.exception))
+        client.collection.search.assert_not_called()
+
+
+class UpdateAttributesTests(NumpyStoreTestMixin, SimpleTestCase):
+    """update去重策略同时更新结构化字段"""
+
+    def test_numpy_update_changes_filtered_fields(self):
+        store = self.make_store()
+        vector_id = store.insert_vectors([[1, 0, 0, 0]], ['a'], attributes=[{'category': 'old', 'source': 's'}])[0]
+        self.assertTrue(store.update_metadata(vector_id, 'm', {'category': 'new'}))
+
+        self.assertEqual(store.search_vectors([1, 0, 0, 0], filters=[('category', '==', 'old')]), [])
+        result = store.search_vectors([1, 0, 0, 0], filters=[('category', '==', 'new')])[0]
+        self.assertEqual((result['metadata'], result['source']), ('m', 's'))
+
+    def test_lexical_index_attributes_are_updated(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        index = LexicalIndex(os.path.join(directory.name, 'lexical.db'))
+        index.add([1], ['停水通知'], attributes=[{'category': 'old'}])
+        self.assertTrue(index.update_attributes(1, {'category': 'new'}))
+        self.assertEqual(index.search('停水', filters=[('category', '==', 'old')]), [])
+        self.assertEqual(index.search('停水', filters=[('category', '==', 'new')])[0]['id'], 1)
+
+class TextChunkerTests(SimpleTestCase):
+    """长文本分块与按文档折叠"""
+
+    def test_split_sentences_keeps_punctuation(self):
+        self.assertEqual(
+            split_sentences('第一句。“第二句！”第三句？\n\n第四句'),
+            ['第一句。', '“第二句！”', '第三句？', '第四句']
+        )
+
+    def test_short_text_is_single_chunk(self):
+        self.assertEqual(chunk_text('短文本。'), ['短文本。'])
+
+    def test_chunks_break_at_sentences_with_overlap(self):
+        sentences = [f'句子{index:02d}内容内容。' for index in range(10)]
+        chunks = chunk_text(''.join(sentences), max_chars=40, overlap_chars=10)
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+        # 相邻块以上一块的最后一句重叠
+        self.assertTrue(chunks[1].startswith(sentences[3]))
+        self.assertTrue(chunks[0].endswith(sentences[3]))
+        self.assertTrue(chunks[-1].endswith(sentences[-1]))
+
+    def test_long_sentence_is_hard_split(self):
+        chunks = chunk_text('甲' * 25, max_chars=10, overlap_chars=3)
+        self.assertTrue(all(len(chunk) <= 10 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 25 + 3 * (len(chunks) - 1))
+
+    def test_collapse_by_document_keeps_best_chunk(self):
+        results = [
+            {'id': 1, 'doc_id': 'd1'}, {'id': 2, 'doc_id': 'd1'},
+            {'id': 3, 'doc_id': ''}, {'id': 4, 'doc_id': ''}, {'id': 5, 'doc_id': 'd2'}
+        ]
+        self.assertEqual([item['id'] for item in collapse_by_document(results, 10)], [1, 3, 4, 5])
+        self.assertEqual([item['id'] for item in collapse_by_document(results, 2)], [1, 3])
+
+
+class DiversifyTests(SimpleTestCase):
+    """MMR重排与近重复折叠"""
+
+    query = [1.0, 0.0]
+    # b与a几乎相同，c相关性较低但方向不同
+    vectors = [[1.0, 0.0], [0.99, 0.14], [0.6, 0.8]]
+
+    def test_lambda_one_ranks_by_relevance(self):
+        self.assertEqual(mmr_select(self.query, self.vectors, 3, lambda_mult=1.0), [0, 1, 2])
+
+    def test_low_lambda_prefers_diverse_candidate(self):
+        self.assertEqual(mmr_select(self.query, self.vectors, 2, lambda_mult=0.3), [0, 2])
+
+    def test_duplicate_threshold_drops_near_duplicates(self):
+        self.assertEqual(mmr_select(self.query, self.vectors, 3, lambda_mult=1.0, duplicate_threshold=0.95), [0, 2])
+
+    def test_diversify_results_reorders_items(self):
+        results = [{'id': index, 'vector': vector} for index, vector in enumerate(self.vectors)]
+        reordered = diversify_results(self.query, results, 2, lambda_mult=0.3)
+        self.assertEqual([item['id'] for item in reordered], [0, 2])
+        self.assertEqual(diversify_results(self.query, [], 2), [])
+
+
+class LexicalIndexTests(SimpleTestCase):
+    """中英混合分词，以及经LexicalSyncedStore写入后按结构化字段过滤检索"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index = LexicalIndex(os.path.join(directory.name, 'lexical.db'))
+        self.addCleanup(self.index._db.close)
+
+    def test_mixed_cjk_and_ascii_tokens(self):
+        self.assertEqual(ngram_tokens('3号楼 A座'), ['3号', '号楼', '3', 'a座', 'a'])
+        self.assertEqual(
+            ngram_tokens('物业电话13800138000，Room502'),
+            ['物业', '业电', '电话', '话13800138000', '13800138000', 'room502']
+        )
+        # 全角字符先归一化为半角
+        self.assertEqual(ngram_tokens('ＷｉＦｉ密码'), ['wifi密', '密码', 'wifi'])
+        self.assertEqual(ngram_tokens('，。 '), [])
+
+    def test_synced_insert_is_searchable_with_filters(self):
+        inner = mock.Mock()
+        inner.insert_vectors.side_effect = lambda vectors, *args: [11, 12][:len(vectors)]
+        inner.update_metadata.return_value = True
+        store = LexicalSyncedStore(inner, self.index)
+        store.insert_vectors(
+            [[0.1], [0.2]], ['3号楼停车位出租', '5号楼停车位出租'],
+            attributes=[{'community_id': 'c1', 'category': '通知'}, {'community_id': 'c2', 'category': '通知'}]
+        )
+
+        self.assertEqual({item['id'] for item in self.index.search('停车位')}, {11, 12})
+        results = self.index.search('停车位', filters=parse_filter({'community_id': 'c1'}))
+        self.assertEqual([(item['id'], item['content']) for item in results], [(11, '3号楼停车位出租')])
+        self.assertEqual([item['id'] for item in self.index.search('3号楼')][0], 11)
+
+        # 更新结构化字段后过滤条件同步生效
+        store.update_metadata(12, 'm', {'community_id': 'c1'})
+        results = self.index.search('停车位', filters=parse_filter({'community_id': 'c1'}))
+        self.assertEqual({item['id'] for item in results}, {11, 12})
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    """倒数排名融合"""
+
+    def test_items_in_both_lists_rank_first(self):
+        vector = [{'id': 1, 'distance': 0.1}, {'id': 2, 'distance': 0.2}]
+        lexical = [{'id': 2, 'score': -3.0}, {'id': 3, 'score': -2.0}]
+        fused = reciprocal_rank_fusion([vector, lexical], k=60)
+
+        self.assertEqual([item['id'] for item in fused], [2, 1, 3])
+        self.assertAlmostEqual(fused[0]['rrf_score'], 1 / 62 + 1 / 61)
+        # 两路都命中的条目保留向量检索的版本
+        self.assertEqual(fused[0]['distance'], 0.2)
+        self.assertNotIn('distance', fused[2])
+
+
+class HybridRadiusTests(SimpleTestCase):
+    """混合搜索指定radius时丢弃没有向量距离的融合结果"""
+
+    def search(self, radius):
+        from concurrent.futures import Future
+        from database.views import _search_with_embedding
+
+        store = mock.Mock(vector_dim=2)
+        store.search_vectors.return_value = [{'id': 1, 'distance': 0.1, 'content': 'a'}]
+        lexical_future = Future()
+        lexical_future.set_result([{'id': 2, 'score': -1.0, 'content': 'b'}])
+        window = {'limit': 10, 'offset': 0, 'radius': radius, 'diversify': None}
+        response = _search_with_embedding(store, window, [0.1, 0.2], 'openid', lexical_future)
+        return [item['id'] for item in json.loads(response.content)['data']['items']]
+
+    def test_lexical_only_hits_are_dropped_with_radius(self):
+        self.assertEqual(self.search(radius=None), [1, 2])
+        self.assertEqual(self.search(radius=0.5), [1])
+
+class NumpySearchTests(NumpyStoreTestMixin, SimpleTestCase):
+    """NumPy存储的精确top-k和范围搜索（L2）"""
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.store.metric_type = 'L2'
+        self.ids = self.store.insert_vectors(
+            [[1, 0, 0, 0], [0, 1, 0, 0], [0.9, 0.1, 0, 0]], ['a', 'b', 'c']
+        )
+
+    def test_top_k_is_ordered_by_distance(self):
+        results = self.store.search_vectors([1, 0, 0, 0], limit=2)
+        self.assertEqual([result['id'] for result in results], [self.ids[0], self.ids[2]])
+        self.assertLess(results[0]['distance'], results[1]['distance'])
+
+    def test_radius_drops_distant_rows(self):
+        results = self.store.search_vectors([1, 0, 0, 0], limit=3, radius=0.5)
+        self.assertEqual([result['content'] for result in results], ['a', 'c'])
+
+class NumpyPrecisionTests(NumpyStoreTestMixin, SimpleTestCase):
+    """NumPy存储的float16精度转换"""
+
+    def reopen(self, store):
+        store.disconnect()
+        reopened = NumpyVectorStore(data_dir=store.data_dir, collection_name='test_vectors', vector_dim=4)
+        self.addCleanup(reopened.disconnect)
+        self.assertTrue(reopened.ensure_ready())
+        return reopened
+
+    def test_convert_to_float16(self):
+        store = self.make_store()
+        store.insert_vectors([[1, 0, 0, 0], [0, 0.5, 0, 0]], ['a', 'b'])
+        self.assertEqual(store.convert_precision('float16'), 2)
+
+        store = self.reopen(store)
+        self.assertEqual(store.precision, 'float16')
+        self.assertEqual([name for name in os.listdir(store.data_dir) if name.startswith('vectors')], ['vectors.f16'])
+        results = store.search_vectors([0, 0.5, 0, 0], limit=1, with_vectors=True)
+        self.assertEqual(results[0]['content'], 'b')
+        self.assertEqual(results[0]['vector'].tolist(), [0, 0.5, 0, 0])
+
+    def test_crash_after_meta_switch_keeps_converted_file(self):
+        store = self.make_store()
+        store.insert_vectors([[1, 0, 0, 0]], ['a'])
+        with mock.patch('utils.numpy_vector_store.os.remove', side_effect=OSError('crash')):
+            with self.assertRaises(OSError):
+                store.convert_precision('float16')
+
+        store = self.reopen(store)
+        self.assertEqual(store.precision, 'float16')
+        self.assertFalse(os.path.exists(os.path.join(store.data_dir, 'vectors.f32')))
+        self.assertEqual(store.search_vectors([1, 0, 0, 0], limit=1)[0]['content'], 'a')
+
+class NumpyRemapTests(NumpyStoreTestMixin, SimpleTestCase):
+    """Milvus集合重建后NumPy镜像按新旧主键映射改写主键"""
+
+    def test_remap_keeps_pending_rows(self):
+        store = self.make_store()
+        store.insert_vectors([[1, 0, 0, 0], [0, 1, 0, 0]], ['a', 'b'], ids=[10, 11])
+        store.insert_vectors([[0, 0, 1, 0]], ['c'], pending=True)
+        store.remap_ids({10: 100, 11: 101})
+
+        self.assertEqual(store.find_ids_by_hashes([text_hash('a'), text_hash('b')]),
+                         {text_hash('a'): 100, text_hash('b'): 101})
+        self.assertEqual(store.pending_count(), 1)
+        self.assertEqual(store.search_vectors([0, 1, 0, 0], limit=1)[0]['id'], 101)
+
+
+class NumpyContentHashTests(NumpyStoreTestMixin, SimpleTestCase):
+    """为缺少内容哈希的旧数据补齐哈希"""
+
+    def test_backfill_content_hash(self):
+        store = self.make_store()
+        store.insert_vectors([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]], ['a', 'b', 'c'])
+        # 模拟加入内容哈希之前写入的数据
+        store._db.execute("UPDATE rows SET content_hash = '' WHERE content != 'c'")
+        store._db.commit()
+        self.assertEqual(store.find_ids_by_hashes([text_hash('a')]), {})
+
+        self.assertEqual(store.backfill_content_hash(batch_size=1), 2)
+        hashes = [text_hash('a'), text_hash('b')]
+        self.assertEqual(set(store.find_ids_by_hashes(hashes)), set(hashes))
+        self.assertEqual(store.backfill_content_hash(), 0)
+
+
+class NumpyMultiWorkerTests(NumpyStoreTestMixin, SimpleTestCase):
+    """多个worker进程共用同一数据目录时追加写入互不覆盖"""
+
+    def test_stale_worker_appends_after_other_workers_rows(self):
+        first = self.make_store()
+        second = NumpyVectorStore(data_dir=first.data_dir, collection_name='test_vectors', vector_dim=4)
+        self.addCleanup(second.disconnect)
+        for store in (first, second):
+            store.CHUNK_ROWS = 2
+            store.ensure_ready()
+
+        # second打开后first写入的行（包括向量文件扩容）second都不知道
+        first_ids = first.insert_vectors([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]], ['a', 'b', 'c'])
+        second_ids = second.insert_vectors([[0, 0, 0, 1]], ['d'])
+        self.assertEqual(first_ids, [1, 2, 3])
+        self.assertEqual(second_ids, [4])
+
+        for store, vector, content in ((first, [0, 0, 0, 1], 'd'), (second, [0, 1, 0, 0], 'b')):
+            self.assertEqual(store.search_vectors(vector, limit=1)[0]['content'], content)
+        self.assertEqual(len(second.search_vectors([1, 1, 1, 1], limit=10)), 4)
+        self.assertEqual(first.insert_vectors([[1, 1, 0, 0]], ['e']), [5])
+
+
+class WriteBehindBufferTests(SimpleTestCase):
+    """写后缓冲的合并写入、失败回填和关闭"""
+
+    def make_buffer(self, **kwargs):
+        store = mock.Mock()
+        store.insert_vectors.side_effect = lambda vectors, *args, **kw: list(range(1, len(vectors) + 1))
+        buffer = WriteBehindBuffer(store, **kwargs)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_concurrent_submits_are_flushed_together(self):
+        buffer = self.make_buffer(max_rows=3, max_delay_ms=1000)
+        futures = [buffer.submit([0.1], f'text-{i}') for i in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [1, 2, 3])
+        buffer.store.insert_vectors.assert_called_once()
+        self.assertEqual(buffer.stats()['flush_count'], 1)
+
+    def test_failed_flush_sets_exception(self):
+        buffer = self.make_buffer(max_delay_ms=1)
+        buffer.store.insert_vectors.side_effect = None
+        buffer.store.insert_vectors.return_value = None
+        with self.assertRaises(RuntimeError):
+            buffer.submit([0.1], 'text').result(timeout=5)
+
+    def test_full_buffer_raises(self):
+        flushing, release = threading.Event(), threading.Event()
+
+        def slow_insert(vectors, *args, **kwargs):
+            flushing.set()
+            release.wait(5)
+            return list(range(1, len(vectors) + 1))
+
+        buffer = self.make_buffer(capacity=1, max_rows=1)
+        buffer.store.insert_vectors.side_effect = slow_insert
+        buffer.submit([0.1], 'a')
+        self.assertTrue(flushing.wait(5))
+        buffer.submit([0.1], 'b')
+        with self.assertRaises(BufferFullError):
+            buffer.submit([0.1], 'c', timeout=0)
+        release.set()
+
+    def test_close_drains_queue(self):
+        buffer = self.make_buffer(max_delay_ms=1)
+        future = buffer.submit([0.1], 'text')
+        buffer.close()
+        self.assertEqual(future.result(timeout=0), 1)
+        with self.assertRaises(RuntimeError):
+            buffer.submit([0.1], 'late')
+
+    def test_submit_racing_close_is_cancelled(self):
+        buffer = self.make_buffer()
+        buffer.close()
+        # 模拟在close()之前通过检查、在后台线程退出之后才入队的submit
+        with mock.patch.object(buffer._closed, 'is_set', side_effect=[False, True]):
+            future = buffer.submit([0.1], 'text')
+        self.assertTrue(future.cancelled())
+        buffer.store.insert_vectors.assert_not_called()
+
+
+class InsertWriteBehindViewTests(SimpleTestCase):
+    """写后缓冲刷新超时时插入接口返回202"""
+
+    def test_result_timeout_returns_202(self):
+        from concurrent.futures import Future
+        from database.views import _insert_with_embedding
+
+        store = mock.Mock(vector_dim=2)
+        buffer = mock.Mock(store=store)
+        buffer.submit.return_value = Future()
+        with mock.patch('database.views.get_write_buffer', return_value=buffer), \
+                mock.patch.dict(os.environ, {'WRITE_BEHIND_RESULT_TIMEOUT': '0'}):
+            response = _insert_with_embedding(store, 'text', {}, [0.1, 0.2])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)['data']['status'], 'pending')
+
+
+class _ExportStore:
+    """按主键顺序分两批返回数据的导出用存储"""
+
+    ROWS = [
+        {'id': 1, 'content': '普通文本', 'metadata': ''},
+        {'id': 2, 'content': 'a,b "quoted"', 'metadata': '{"k": 1}'},
+        {'id': 3, 'content': '第一行\n第二行', 'metadata': ''},
+    ]
+
+    def ensure_ready(self):
+        return True
+
+    def iterate_rows(self, output_fields, after_id=None, batch_size=1000):
+        rows = [row for row in self.ROWS if after_id is None or row['id'] > after_id]
+        yield rows[:2]
+        yield rows[2:]
+
+
+class CsvExportTests(SimpleTestCase):
+    """流式CSV导出: 表头、转义、gzip和断点续传"""
+
+    def export(self, query=''):
+        with mock.patch('database.views.get_vector_store', return_value=_ExportStore()):
+            response = self.client.get(f'/database/export-csv/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    @staticmethod
+    def rows(body):
+        return list(csv.reader(io.StringIO(body.decode('utf-8-sig'), newline='')))
+
+    def test_streams_header_and_escaped_rows(self):
+        response, body = self.export()
+        self.assertTrue(response.streaming)
+        self.assertTrue(body.startswith('\ufeff'.encode('utf-8')))
+        rows = self.rows(body)
+        self.assertEqual(rows[0], ['id', 'content', 'metadata'])
+        self.assertEqual(rows[1:], [[str(row['id']), row['content'], row['metadata']] for row in _ExportStore.ROWS])
+
+    def test_gzip_output_decodes_to_same_csv(self):
+        response, body = self.export('?gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+        self.assertEqual(self.rows(gzip.decompress(body)), self.rows(self.export()[1]))
+
+    def test_after_id_skips_earlier_rows(self):
+        rows = self.rows(self.export('?after_id=1')[1])
+        self.assertEqual([row[0] for row in rows[1:]], ['2', '3'])
+
+    def test_invalid_after_id_is_rejected(self):
+        response = self.client.get('/database/export-csv/?after_id=x')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkInsertViewTests(SimpleTestCase):
+    """批量插入逐条返回结果，无效条目不参与嵌入和写入"""
+
+    def test_invalid_items_get_per_item_errors(self):
+        items = [
+            {'text': '有效文本1', 'category': '通知'},
+            {'text': ''},
+            {'text': '元数据不合法', 'created_at': -1},
+            'not-an-object',
+            {'text': '有效文本2', 'metadata': 'm'},
+        ]
+        store = mock.Mock(vector_dim=2, collection_name='vectors')
+        store.find_ids_by_hashes.return_value = {}
+        store.insert_vectors.side_effect = lambda vectors, *args, **kwargs: [101, 102][:len(vectors)]
+        ollama = mock.Mock()
+        ollama.get_embeddings.side_effect = lambda texts, **kwargs: [[0.6, 0.8]] * len(texts)
+        with mock.patch('database.views._verify_signature_headers', return_value=None), \
+                mock.patch('database.views.get_vector_store', return_value=store), \
+                mock.patch('database.views.get_ollama_client', return_value=ollama), \
+                mock.patch('database.views.collection_model_info', return_value={'model': 'm', 'version': '1'}):
+            response = self.client.post(
+                '/database/insert-texts/', data=json.dumps({'items': items}), content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)['data']
+        self.assertEqual([result['index'] for result in data['results']], [0, 1, 2, 3, 4])
+        self.assertEqual([result['id'] for result in data['results']], [101, None, None, None, 102])
+        errors = [result['error'] for result in data['results']]
+        self.assertEqual(errors[1], errors[3])
+        self.assertIn('text', errors[1])
+        self.assertIn('created_at', errors[2])
+        self.assertIsNone(errors[0])
+        self.assertIsNone(errors[4])
+        self.assertEqual((data['inserted'], data['failed']), (2, 3))
+
+        ollama.get_embeddings.assert_called_once_with(['有效文本1', '有效文本2'], model='m', version='1')
+        store.insert_vectors.assert_called_once()
+        args, kwargs = store.insert_vectors.call_args
+        self.assertEqual(args[1:], (['有效文本1', '有效文本2'], [None, 'm']))
+        self.assertEqual(kwargs['attributes'], [{'category': '通知'}, {}])
+
+
+class DuplicateInsertViewTests(SimpleTestCase):
+    """重复文本在调用Ollama之前按内容哈希命中已有数据"""
+
+    def post(self, store, policy):
+        ollama = mock.Mock()
+        with mock.patch('database.views._verify_signature_headers', return_value=None), \
+                mock.patch('database.views.get_vector_store', return_value=store), \
+                mock.patch('database.views.get_ollama_client', return_value=ollama), \
+                mock.patch.dict(os.environ, {'DEDUP_POLICY': policy}):
+            response = self.client.post(
+                '/database/insert-text/', data=json.dumps({'text': 'hello', 'metadata': 'm'}),
+                content_type='application/json'
+            )
+        ollama.get_embedding.assert_not_called()
+        store.insert_vectors.assert_not_called()
+        return response
+
+    def make_store(self):
+        store = mock.Mock(vector_dim=2, collection_name='vectors')
+        store.find_ids_by_hashes.return_value = {text_hash('hello'): 42}
+        return store
+
+    def test_duplicate_returns_existing_id_without_embedding(self):
+        store = self.make_store()
+        response = self.post(store, 'skip')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)['data']
+        self.assertEqual((data['id'], data['duplicate']), (42, True))
+        store.update_metadata.assert_not_called()
+
+    def test_update_policy_updates_metadata(self):
+        store = self.make_store()
+        store.update_metadata.return_value = True
+        self.assertEqual(self.post(store, 'update').status_code, 200)
+        store.update_metadata.assert_called_once_with(42, 'm', {})
+
+
+class BatchSearchViewTests(SimpleTestCase):
+    """多个查询只做一次批量嵌入和一次多向量搜索，结果按查询顺序返回"""
+
+    def test_queries_share_one_embedding_and_search_call(self):
+        texts = ['停车', '物业', '快递']
+        store = mock.Mock(vector_dim=2, collection_name='vectors')
+        store.search_vectors_batch.return_value = [
+            [{'id': index, 'distance': 0.1, 'content': f'{text}-结果'}] for index, text in enumerate(texts)
+        ]
+        ollama = mock.Mock()
+        ollama.get_embeddings.return_value = [[0.6, 0.8], [0.8, 0.6], [1.0, 0.0]]
+        with mock.patch('database.views.get_vector_store', return_value=store), \
+                mock.patch('database.views.get_ollama_client', return_value=ollama), \
+                mock.patch('database.views.collection_model_info', return_value={'model': 'm', 'version': '1'}):
+            response = self.client.post(
+                '/database/search-texts/', data=json.dumps({'texts': texts, 'limit': 5}),
+                content_type='application/json',
+                HTTP_AUTHORIZATION='Bearer ' + TokenAuth.generate_token('openid-1')
+            )
+
+        self.assertEqual(response.status_code, 200)
+        ollama.get_embeddings.assert_called_once_with(texts, model='m', version='1')
+        ollama.get_embedding.assert_not_called()
+        store.search_vectors_batch.assert_called_once()
+        self.assertEqual(store.search_vectors_batch.call_args.args[0], ollama.get_embeddings.return_value)
+        store.search_vectors.assert_not_called()
+
+        results = json.loads(response.content)['data']['results']
+        self.assertEqual([result['text'] for result in results], texts)
+        self.assertEqual([result['results'] for result in results], [[f'{text}-结果'] for text in texts])
+        self.assertEqual([result['items'][0]['id'] for result in results], [0, 1, 2])
+
+
+class ModelSnapshotTests(SimpleTestCase):
+    """嵌入模型和写入/搜索的集合取自同一个向量存储"""
+
+    def test_insert_embeds_with_the_store_collection_model(self):
+        store = mock.Mock(vector_dim=2, collection_name='vectors_v1')
+        store.find_ids_by_hashes.return_value = {}
+        store.insert_vectors.return_value = [7]
+        ollama = mock.Mock()
+        ollama.get_embedding.return_value = [0.1, 0.2]
+        # 活动集合已切换到v2，但请求开始时取得的是v1的向量存储
+        buffer = mock.Mock(store=mock.Mock())
+        models = {
+            'vectors_v1': {'model': 'model-v1', 'version': '1'},
+            'vectors_v2': {'model': 'model-v2', 'version': '2'}
+        }
+        with mock.patch('database.views._verify_signature_headers', return_value=None), \
+                mock.patch('database.views.get_vector_store', return_value=store), \
+                mock.patch('database.views.get_ollama_client', return_value=ollama), \
+                mock.patch('database.views.get_write_buffer', return_value=buffer), \
+                mock.patch('database.views.collection_model_info', side_effect=models.__getitem__):
+            response = self.client.post(
+                '/database/insert-text/', data=json.dumps({'text': 'hello'}), content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        ollama.get_embedding.assert_called_once_with('hello', model='model-v1', version='1')
+        # 写后缓冲属于新集合，直接写入请求开始时的集合
+        buffer.submit.assert_not_called()
+        store.insert_vectors.assert_called_once()
+
+
+class ModelRegistryLockTests(SimpleTestCase):
+    """多个登记实例（模拟多个进程）并发写入不丢失数据"""
+
+    def test_concurrent_updates_are_not_lost(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'model_registry.json')
+
+        def register(prefix):
+            registry = ModelRegistry(path)
+            for index in range(30):
+                registry.register(f'{prefix}_{index}', 'model', '1', 4)
+
+        threads = [threading.Thread(target=register, args=(prefix,)) for prefix in ('a', 'b', 'c')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(ModelRegistry(path).snapshot()['collections']), 90)
+        self.assertEqual(sorted(os.listdir(directory.name)), ['model_registry.json', 'model_registry.json.lock'])
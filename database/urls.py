@@ -3,7 +3,13 @@ from . import views
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
+    path('ready/', views.readiness_check, name='readiness_check'),
     path('insert-text/', views.insert_text_with_auth, name='insert_text_with_auth'),
+    path('insert-texts/', views.insert_texts_with_auth, name='insert_texts_with_auth'),
+    path('insert-document/', views.insert_document_with_auth, name='insert_document_with_auth'),
     path('search-text/', views.search_text_with_auth, name='search_text_with_auth'),
+    path('search-texts/', views.search_texts_with_auth, name='search_texts_with_auth'),
+    path('async/insert-text/', views.insert_text_with_auth_async, name='insert_text_with_auth_async'),
+    path('async/search-text/', views.search_text_with_auth_async, name='search_text_with_auth_async'),
     path('export-csv/', views.export_to_csv, name='export_to_csv'),
 ]
@@ -1,15 +1,448 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from asgiref.sync import sync_to_async
 import json
 import numpy as np
 import csv
+import datetime
 import os
-from utils.milvus_client import get_milvus_client
-from utils.auth_utils import get_auth_utils
-from utils.ollama_client import get_ollama_client
-from utils.auth import require_auth, get_openid_from_request
+import zlib
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from utils.vector_store import get_vector_store
+from utils.auth_utils import get_auth_utils, NonceStoreFullError
+from utils.ollama_client import get_ollama_client, get_async_ollama_client
+from utils.embedding_cache import get_embedding_cache, text_hash
+from utils.auth import require_auth, get_openid_from_request, TokenAuth
+from utils.env_config import get_env_config
+from utils.write_buffer import get_write_buffer, BufferFullError
+from utils.text_chunker import chunk_text, collapse_by_document
+from utils.lexical_index import get_lexical_index, submit_lexical_search, reciprocal_rank_fusion
+from utils.metadata_fields import STRUCTURED_FIELDS, MissingFieldError, parse_attributes, parse_filter, community_ids
+from utils.diversify import diversify_results
+from utils.model_registry import active_model_info, collection_model_info
+
+
+def _verify_signature_headers(request):
+    """
+    校验请求头中的签名（按 X-Auth-Key-Id 选择公钥，含时间戳窗口和nonce防重放）
+    
+    Returns:
+        JsonResponse: 校验失败时返回错误响应，成功返回None
+    """
+    auth_data = request.headers.get('X-Auth-Data')
+    auth_signature = request.headers.get('X-Auth-Signature')
+    auth_key_id = request.headers.get('X-Auth-Key-Id')
+    
+    if not auth_data or not auth_signature:
+        return JsonResponse({
+            'code': 401,
+            'message': '认证失败: 缺少认证头信息',
+            'data': None
+        }, status=401)
+    
+    auth_utils = get_auth_utils()
+    try:
+        error = auth_utils.authenticate(auth_data, auth_signature, auth_key_id)
+    except NonceStoreFullError:
+        return JsonResponse({
+            'code': 503,
+            'message': '认证繁忙: nonce记录已满，请稍后重试',
+            'data': None
+        }, status=503)
+    if error:
+        return JsonResponse({
+            'code': 401,
+            'message': f'认证失败: {error}',
+            'data': None
+        }, status=401)
+    
+    return None
+
+
+def _check_embedding(embedding, vector_store):
+    """
+    校验嵌入向量是否获取成功且维度正确
+    
+    Returns:
+        JsonResponse: 校验失败时返回错误响应，成功返回None
+    """
+    if not embedding:
+        return JsonResponse({
+            'code': 500,
+            'message': '获取嵌入向量失败',
+            'data': None
+        }, status=500)
+    
+    if len(embedding) != vector_store.vector_dim:
+        return JsonResponse({
+            'code': 500,
+            'message': f'向量维度不匹配: 期望 {vector_store.vector_dim}, 实际 {len(embedding)}',
+            'data': None
+        }, status=500)
+    
+    return None
+
+
+def _parse_request_attributes(data):
+    """
+    提取请求中的结构化元数据字段
+    
+    Returns:
+        tuple: (结构化字段字典, 参数错误时的JsonResponse或None)
+    """
+    try:
+        return parse_attributes(data), None
+    except ValueError as e:
+        return None, JsonResponse({
+            'code': 400,
+            'message': f'参数错误: {e}',
+            'data': None
+        }, status=400)
+
+
+def _parse_request_filter(data):
+    """
+    解析搜索请求中的filter参数（在调用Ollama之前校验）
+    
+    Returns:
+        tuple: (过滤条件列表, 参数错误时的JsonResponse或None)
+    """
+    try:
+        return parse_filter(data.get('filter')), None
+    except ValueError as e:
+        return None, JsonResponse({
+            'code': 400,
+            'message': f'参数错误: {e}',
+            'data': None
+        }, status=400)
+
+
+def _store_model(vector_store):
+    """
+    向量存储所属集合登记的嵌入模型和版本（get_embedding/get_embeddings的model、version参数）
+    请求开始时取一次向量存储，嵌入和写入/搜索都以它为准，活动集合切换期间不会把旧模型的向量写入新集合；
+    版本参与嵌入缓存的键，同名模型重新嵌入后不会命中旧权重的缓存向量
+    """
+    info = collection_model_info(vector_store.collection_name)
+    return {'model': info['model'], 'version': info['version']}
+
+
+def _find_duplicate(vector_store, text, metadata, attributes=None):
+    """
+    按内容哈希检查文本是否已入库（在调用Ollama之前执行）
+    update策略下同时更新元数据和请求中提供的结构化字段
+    
+    Returns:
+        JsonResponse: 命中重复且按策略处理完毕时返回响应，否则返回None
+    """
+    policy = get_env_config().dedup_policy
+    if policy == 'insert':
+        return None
+    
+    content_hash = text_hash(text)
+    vector_id = vector_store.find_ids_by_hashes([content_hash]).get(content_hash)
+    if vector_id is None:
+        return None
+    
+    if policy == 'update' and not vector_store.update_metadata(vector_id, metadata, attributes):
+        return JsonResponse({
+            'code': 500,
+            'message': '更新元数据失败',
+            'data': None
+        }, status=500)
+    
+    return JsonResponse({
+        'code': 200,
+        'message': '内容已存在' if policy == 'skip' else '内容已存在，已更新元数据',
+        'data': {
+            'id': vector_id,
+            'text': text,
+            'metadata': metadata,
+            **(attributes or {}),
+            'duplicate': True
+        }
+    })
+
+
+def _insert_with_embedding(vector_store, text, metadata, embedding, attributes=None):
+    """
+    使用已获取的嵌入向量插入文本（同步/异步视图共用）
+    
+    Args:
+        vector_store: 请求开始时取得的向量存储（嵌入向量由该集合的模型生成）
+        attributes: 结构化元数据字段，可选
+    
+    Returns:
+        JsonResponse: 插入结果响应
+    """
+    # 验证向量
+    embedding_error = _check_embedding(embedding, vector_store)
+    if embedding_error:
+        return embedding_error
+    
+    # 插入向量数据（启用写后缓冲时与并发请求合并为一次批量写入）
+    write_buffer = get_write_buffer()
+    if write_buffer is not None and write_buffer.store is not vector_store:
+        # 请求期间活动集合已切换，直接写入请求开始时的集合（由重新嵌入的追平步骤迁移）
+        write_buffer = None
+    if write_buffer is not None:
+        try:
+            future = write_buffer.submit(
+                embedding, text, metadata,
+                timeout=get_env_config().write_behind_submit_timeout,
+                attributes=attributes
+            )
+        except BufferFullError:
+            return JsonResponse({
+                'code': 503,
+                'message': '写入繁忙，请稍后重试',
+                'data': None
+            }, status=503)
+        try:
+            vector_id = future.result(timeout=get_env_config().write_behind_result_timeout)
+        except FutureTimeoutError:
+            # 数据已入队且随后仍会写入，返回202避免客户端重试造成重复
+            return JsonResponse({
+                'code': 202,
+                'message': '已受理，等待写入',
+                'data': {
+                    'status': 'pending',
+                    'text': text,
+                    'metadata': metadata,
+                    **(attributes or {}),
+                    'embedding_dim': len(embedding),
+                    'duplicate': False
+                }
+            }, status=202)
+        except Exception as e:
+            print(f"❌ 写后缓冲插入失败: {e}")
+            vector_id = None
+    else:
+        ids = vector_store.insert_vectors([embedding], [text], [metadata], attributes=[attributes])
+        vector_id = ids[0] if ids else None
+    
+    if vector_id:
+        return JsonResponse({
+            'code': 200,
+            'message': '插入成功',
+            'data': {
+                'id': vector_id,
+                'text': text,
+                'metadata': metadata,
+                **(attributes or {}),
+                'embedding_dim': len(embedding),
+                'duplicate': False
+            }
+        })
+    else:
+        return JsonResponse({
+            'code': 500,
+            'message': '插入失败',
+            'data': None
+        }, status=500)
+
+
+def _parse_search_window(data):
+    """
+    解析分页、范围搜索和结果多样化参数，limit超过上限时截断
+    
+    Returns:
+        tuple: ({'limit', 'offset', 'radius', 'diversify'}, 参数错误时的JsonResponse或None)
+        diversify未启用时为None，启用时为 {'lambda', 'threshold'}
+    """
+    env_config = get_env_config()
+    limit = data.get('limit', 10)
+    offset = data.get('offset', 0)
+    radius = data.get('radius')
+    diversify = data.get('diversify', env_config.search_diversify)
+    mmr_lambda = data.get('mmr_lambda', env_config.mmr_lambda)
+    threshold = data.get('duplicate_threshold', env_config.near_duplicate_threshold)
+    
+    error = None
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        error = 'limit必须为正整数'
+    elif isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        error = 'offset必须为非负整数'
+    elif radius is not None and (isinstance(radius, bool) or not isinstance(radius, (int, float))):
+        error = 'radius必须为数字'
+    elif not isinstance(diversify, bool):
+        error = 'diversify必须为布尔值'
+    elif isinstance(mmr_lambda, bool) or not isinstance(mmr_lambda, (int, float)) or not 0 <= mmr_lambda <= 1:
+        error = 'mmr_lambda必须为0~1之间的数字'
+    elif threshold is not None and (isinstance(threshold, bool) or not isinstance(threshold, (int, float))):
+        error = 'duplicate_threshold必须为数字或null'
+    else:
+        limit = min(limit, env_config.search_max_limit)
+        if offset + limit > env_config.search_max_window:
+            error = f'offset + limit 不能超过 {env_config.search_max_window}'
+    
+    if error:
+        return None, JsonResponse({
+            'code': 400,
+            'message': f'参数错误: {error}',
+            'data': None
+        }, status=400)
+    
+    return {
+        'limit': limit,
+        'offset': offset,
+        'radius': radius,
+        'diversify': {'lambda': float(mmr_lambda), 'threshold': threshold} if diversify else None
+    }, None
+
+
+def _fetch_size(window):
+    """分页窗口需要召回的数量（按文档折叠前超额召回）"""
+    return (window['offset'] + window['limit']) * get_env_config().chunk_search_overfetch
+
+
+def _diversify(embedding, results, window):
+    """
+    MMR重排并折叠近重复结果（先按文档折叠，多保留一条用于判断是否还有下一页）
+    
+    Args:
+        embedding: 查询向量
+        results: 带向量的搜索结果
+        window: _parse_search_window解析后的参数
+    """
+    options = window['diversify']
+    count = window['offset'] + window['limit'] + 1
+    collapsed = collapse_by_document(results, len(results))
+    return diversify_results(embedding, collapsed, count, options['lambda'], options['threshold'])
+
+
+def _paginate(results, window):
+    """
+    按文档折叠后截取当前页
+    
+    Returns:
+        tuple: (当前页结果, 下一页的offset，没有更多结果时为None)
+    """
+    end = window['offset'] + window['limit']
+    # 多保留一条用于判断是否还有下一页
+    collapsed = collapse_by_document(results, end + 1)
+    has_more = len(collapsed) > end and end < get_env_config().search_max_window
+    return collapsed[window['offset']:end], end if has_more else None
+
+
+def _format_search_item(item):
+    """单条搜索结果的返回格式（仅由词法检索命中的结果distance为None）"""
+    formatted = {
+        'id': item['id'],
+        'distance': item.get('distance'),
+        'content': item['content'],
+        'metadata': item.get('metadata'),
+        'doc_id': item.get('doc_id') or None,
+        'chunk_index': item.get('chunk_index')
+    }
+    formatted.update({name: item.get(name) for name in STRUCTURED_FIELDS})
+    if 'rrf_score' in item:
+        formatted['rrf_score'] = item['rrf_score']
+    return formatted
+
+
+def _start_lexical_search(data, text, window, filters=None, collection_name=None):
+    """
+    混合搜索模式下在后台线程启动词法检索，与嵌入和向量检索并行执行
+    
+    Returns:
+        tuple: (词法检索Future或None, 参数错误时的JsonResponse或None)
+    """
+    env_config = get_env_config()
+    mode = data.get('mode') or env_config.search_mode
+    if mode not in ('vector', 'hybrid'):
+        return None, JsonResponse({
+            'code': 400,
+            'message': '参数错误: mode必须为vector或hybrid',
+            'data': None
+        }, status=400)
+    
+    if mode == 'vector':
+        return None, None
+    
+    future = submit_lexical_search(text, _fetch_size(window), filters, collection_name)
+    if future is None:
+        return None, JsonResponse({
+            'code': 400,
+            'message': '混合搜索需要启用词法索引（LEXICAL_INDEX_ENABLED）',
+            'data': None
+        }, status=400)
+    return future, None
+
+
+def _missing_field_response(error):
+    """过滤字段在旧集合中不存在时的响应（不能当作空结果返回）"""
+    return JsonResponse({
+        'code': 409,
+        'message': f'搜索失败: {error}',
+        'data': {'missing_fields': error.fields}
+    }, status=409)
+
+
+def _search_with_embedding(vector_store, window, embedding, openid, lexical_future=None, filters=None):
+    """
+    使用已获取的查询向量执行搜索（同步/异步视图共用）
+    
+    Args:
+        vector_store: 请求开始时取得的向量存储（查询向量由该集合的模型生成）
+        window: _parse_search_window解析后的分页和范围搜索参数
+        embedding: 查询文本的嵌入向量
+        openid: 已验证的用户openid
+        lexical_future: 混合搜索时并行执行的词法检索，可选
+        filters: 解析后的过滤条件，下推到向量存储在top-k之前过滤
+        
+    Returns:
+        JsonResponse: 搜索结果响应
+    """
+    env_config = get_env_config()
+    
+    # 验证向量
+    embedding_error = _check_embedding(embedding, vector_store)
+    if embedding_error:
+        return embedding_error
+    
+    # 搜索相似向量（超额召回后按文档折叠，同一长文档只返回最相关的分块）
+    diversify = window['diversify'] is not None
+    # 按社区过滤时只搜索对应社区的分区
+    try:
+        results = vector_store.search_vectors(
+            embedding, _fetch_size(window), filters, window['radius'], with_vectors=diversify,
+            partitions=community_ids(filters or [])
+        )
+    except MissingFieldError as e:
+        return _missing_field_response(e)
+    
+    # 结果多样化: 在向量候选上做MMR重排和近重复折叠（混合搜索时在融合前执行）
+    if diversify:
+        results = _diversify(embedding, results, window)
+    
+    # 混合搜索: 与词法检索结果做倒数排名融合
+    if lexical_future is not None:
+        results = reciprocal_rank_fusion([results, lexical_future.result()], k=env_config.rrf_k)
+        if window['radius'] is not None:
+            # 仅由词法检索命中的结果没有向量距离，无法判断是否在范围内
+            results = [item for item in results if item.get('distance') is not None]
+    
+    page, next_offset = _paginate(results, window)
+    
+    # 提取content内容
+    contents = [item['content'] for item in page]
+    
+    return JsonResponse({
+        'code': 200,
+        'message': '搜索成功',
+        'data': {
+            'results': contents,
+            'items': [_format_search_item(item) for item in page],
+            'total': len(contents),
+            'offset': window['offset'],
+            'limit': window['limit'],
+            'next_offset': next_offset,
+            'openid': openid  # 返回验证的用户openid
+        }
+    })
 
 
 @require_http_methods(["GET"])
@@ -19,8 +452,11 @@ def health_check(request):
     检查Milvus连接状态
     """
     try:
-        milvus_client = get_milvus_client()
-        connected = milvus_client.connect()
+        vector_store = get_vector_store()
+        connected = vector_store.connect()
+        embedding_cache = get_embedding_cache()
+        write_buffer = get_write_buffer()
+        lexical_index = get_lexical_index()
         
         if connected:
             return JsonResponse({
@@ -28,8 +464,17 @@ def health_check(request):
                 'message': '服务正常',
                 'data': {
                     'milvus_connected': True,
-                    'collection_name': milvus_client.collection_name,
-                    'vector_dimension': milvus_client.vector_dim
+                    'milvus_ready': vector_store.is_ready,
+                    'vector_backend': get_env_config().vector_backend,
+                    'collection_name': vector_store.collection_name,
+                    'vector_dimension': vector_store.vector_dim,
+                    'embedding_model': active_model_info(),
+                    'embedding_cache': embedding_cache.stats() if embedding_cache else None,
+                    'search_cache': vector_store.search_cache.stats() if vector_store.search_cache else None,
+                    'lexical_index': lexical_index.stats() if lexical_index else None,
+                    'write_buffer': write_buffer.stats() if write_buffer else None,
+                    'auth': get_auth_utils().stats(),
+                    'token_cache': TokenAuth.cache_stats()
                 }
             })
         else:
@@ -49,6 +494,24 @@ def health_check(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+def readiness_check(request):
+    """
+    就绪检查接口
+    Milvus集合已加载时返回200，否则返回503（可用于负载均衡探针）
+    """
+    vector_store = get_vector_store()
+    ready = vector_store.is_ready
+    
+    return JsonResponse({
+        'code': 200 if ready else 503,
+        'message': '服务就绪' if ready else '服务未就绪',
+        'data': {
+            'milvus_ready': ready
+        }
+    }, status=200 if ready else 503)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def insert_text_with_auth(request):
@@ -61,33 +524,276 @@ def insert_text_with_auth(request):
     POST请求参数:
     {
         "text": "要嵌入的文本内容",      # 必填，要嵌入的文本
-        "metadata": "额外元数据"         # 可选，额外元数据信息
+        "metadata": "额外元数据",        # 可选，额外元数据信息
+        "category": "通知",             # 可选，结构化字段（带标量索引，可用于搜索过滤）
+        "community_id": "社区ID",       # 可选
+        "source": "来源",               # 可选
+        "created_at": 1700000000        # 可选，Unix时间戳（秒），默认为写入时间
     }
     """
     try:
         # 认证验证
-        auth_data = request.headers.get('X-Auth-Data')
-        auth_signature = request.headers.get('X-Auth-Signature')
+        auth_error = _verify_signature_headers(request)
+        if auth_error:
+            return auth_error
         
-        if not auth_data or not auth_signature:
+        # 解析请求数据
+        data = json.loads(request.body)
+        text = data.get('text')
+        metadata = data.get('metadata')
+        
+        # 参数验证
+        if not text:
             return JsonResponse({
-                'code': 401,
-                'message': '认证失败: 缺少认证头信息',
+                'code': 400,
+                'message': '参数错误: text为必填项',
                 'data': None
-            }, status=401)
+            }, status=400)
+        
+        attributes, attributes_error = _parse_request_attributes(data)
+        if attributes_error:
+            return attributes_error
+        
+        # 重复文本直接返回已有ID，不调用Ollama
+        vector_store = get_vector_store()
+        duplicate = _find_duplicate(vector_store, text, metadata, attributes)
+        if duplicate:
+            return duplicate
+        
+        # 获取文本嵌入向量（使用目标集合的模型）
+        ollama_client = get_ollama_client()
+        embedding = ollama_client.get_embedding(text, **_store_model(vector_store))
         
-        auth_utils = get_auth_utils()
-        if not auth_utils.verify_signature(auth_data, auth_signature):
+        return _insert_with_embedding(vector_store, text, metadata, embedding, attributes)
+            
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'code': 400,
+            'message': 'JSON格式错误',
+            'data': None
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}',
+            'data': None
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def insert_texts_with_auth(request):
+    """
+    带认证的批量文本插入接口
+    认证方式与 insert-text 相同（X-Auth-Data / X-Auth-Signature）
+    
+    每批文本只调用一次Ollama批量嵌入接口，并做一次Milvus列式插入
+    
+    POST请求参数:
+    {
+        "items": [
+            {"text": "文本1", "metadata": "元数据1", "category": "通知"},
+            {"text": "文本2"}
+        ]
+    }
+    
+    返回:
+    {
+        "code": 200,
+        "message": "批量插入完成",
+        "data": {
+            "results": [
+                {"index": 0, "id": 123, "error": null},
+                {"index": 1, "id": null, "error": "错误原因"}
+            ],
+            "inserted": 1,
+            "failed": 1
+        }
+    }
+    """
+    try:
+        # 认证验证
+        auth_error = _verify_signature_headers(request)
+        if auth_error:
+            return auth_error
+        
+        # 解析请求数据
+        data = json.loads(request.body)
+        items = data.get('items')
+        
+        # 参数验证
+        if not isinstance(items, list) or not items:
             return JsonResponse({
-                'code': 401,
-                'message': '认证失败: 签名验证失败',
+                'code': 400,
+                'message': '参数错误: items必须为非空列表',
                 'data': None
-            }, status=401)
+            }, status=400)
+        
+        env_config = get_env_config()
+        if len(items) > env_config.bulk_insert_max_items:
+            return JsonResponse({
+                'code': 400,
+                'message': f'参数错误: 单次最多插入 {env_config.bulk_insert_max_items} 条',
+                'data': None
+            }, status=400)
+        
+        results = [
+            {'index': index, 'id': None, 'error': None, 'duplicate': False}
+            for index in range(len(items))
+        ]
+        
+        # 过滤无效条目
+        valid = []
+        attributes = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('text'):
+                results[index]['error'] = 'text为必填项'
+                continue
+            try:
+                attributes[index] = parse_attributes(item)
+            except ValueError as e:
+                results[index]['error'] = str(e)
+                continue
+            valid.append((index, item['text'], item.get('metadata')))
+        
+        ollama_client = get_ollama_client()
+        vector_store = get_vector_store()
+        model = _store_model(vector_store)
+        batch_size = env_config.embedding_batch_size
+        
+        # 按内容哈希去重: 已存在的文本和同批次内重复的文本都不再嵌入
+        policy = env_config.dedup_policy
+        repeats = []
+        if policy != 'insert':
+            hashes = {index: text_hash(text) for index, text, _ in valid}
+            existing = vector_store.find_ids_by_hashes(list(hashes.values()))
+            first_by_hash = {}
+            pending = []
+            for index, text, metadata in valid:
+                content_hash = hashes[index]
+                if content_hash in existing:
+                    vector_id = existing[content_hash]
+                    if policy == 'update' and not vector_store.update_metadata(vector_id, metadata, attributes[index]):
+                        results[index]['error'] = '更新元数据失败'
+                        continue
+                    results[index]['id'] = vector_id
+                    results[index]['duplicate'] = True
+                elif content_hash in first_by_hash:
+                    repeats.append((index, first_by_hash[content_hash]))
+                else:
+                    first_by_hash[content_hash] = index
+                    pending.append((index, text, metadata))
+            valid = pending
+        
+        # 分批嵌入并插入
+        for start in range(0, len(valid), batch_size):
+            chunk = valid[start:start + batch_size]
+            embeddings = ollama_client.get_embeddings([text for _, text, _ in chunk], **model)
+            
+            if not embeddings:
+                for index, _, _ in chunk:
+                    results[index]['error'] = '获取嵌入向量失败'
+                continue
+            
+            # 验证向量维度
+            rows = []
+            for (index, text, metadata), embedding in zip(chunk, embeddings):
+                if len(embedding) != vector_store.vector_dim:
+                    results[index]['error'] = f'向量维度不匹配: 期望 {vector_store.vector_dim}, 实际 {len(embedding)}'
+                    continue
+                rows.append((index, embedding, text, metadata))
+            
+            if not rows:
+                continue
+            
+            ids = vector_store.insert_vectors(
+                [embedding for _, embedding, _, _ in rows],
+                [text for _, _, text, _ in rows],
+                [metadata for _, _, _, metadata in rows],
+                attributes=[attributes[index] for index, _, _, _ in rows]
+            )
+            
+            if ids is None:
+                for index, _, _, _ in rows:
+                    results[index]['error'] = '插入失败'
+                continue
+            
+            for (index, _, _, _), vector_id in zip(rows, ids):
+                results[index]['id'] = vector_id
+        
+        # 同批次内的重复文本复用首次出现的结果
+        for index, first_index in repeats:
+            results[index]['id'] = results[first_index]['id']
+            results[index]['error'] = results[first_index]['error']
+            results[index]['duplicate'] = True
+        
+        inserted = sum(1 for item in results if item['id'] is not None)
+        
+        return JsonResponse({
+            'code': 200,
+            'message': '批量插入完成',
+            'data': {
+                'results': results,
+                'inserted': inserted,
+                'failed': len(results) - inserted
+            }
+        })
+            
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'code': 400,
+            'message': 'JSON格式错误',
+            'data': None
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}',
+            'data': None
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def insert_document_with_auth(request):
+    """
+    带认证的长文档插入接口
+    认证方式与 insert-text 相同（X-Auth-Data / X-Auth-Signature）
+    
+    长文本按句子边界切分为带重叠的分块，每块单独嵌入并记录所属文档ID和块序号，
+    搜索时同一文档只返回最相关的分块
+    
+    POST请求参数:
+    {
+        "text": "长文档内容",            # 必填
+        "doc_id": "文档ID",             # 可选，默认使用全文内容哈希
+        "metadata": "额外元数据",        # 可选，所有分块共用
+        "category": "通知"              # 可选，结构化字段同 insert-text，所有分块共用
+    }
+    
+    返回:
+    {
+        "code": 200,
+        "message": "文档插入成功",
+        "data": {
+            "doc_id": "文档ID",
+            "ids": [123, 124],
+            "chunks": 2,
+            "duplicate": false
+        }
+    }
+    """
+    try:
+        # 认证验证
+        auth_error = _verify_signature_headers(request)
+        if auth_error:
+            return auth_error
         
         # 解析请求数据
         data = json.loads(request.body)
         text = data.get('text')
         metadata = data.get('metadata')
+        doc_id = data.get('doc_id') or (text_hash(text) if text else None)
         
         # 参数验证
         if not text:
@@ -97,46 +803,100 @@ def insert_text_with_auth(request):
                 'data': None
             }, status=400)
         
-        # 获取文本嵌入向量
-        ollama_client = get_ollama_client()
-        embedding = ollama_client.get_embedding(text)
-        
-        if not embedding:
+        if not isinstance(doc_id, str) or len(doc_id) > 64:
             return JsonResponse({
-                'code': 500,
-                'message': '获取嵌入向量失败',
+                'code': 400,
+                'message': '参数错误: doc_id必须为不超过64个字符的字符串',
                 'data': None
-            }, status=500)
+            }, status=400)
         
-        # 验证向量维度
-        milvus_client = get_milvus_client()
-        if len(embedding) != milvus_client.vector_dim:
+        attributes, attributes_error = _parse_request_attributes(data)
+        if attributes_error:
+            return attributes_error
+        
+        env_config = get_env_config()
+        vector_store = get_vector_store()
+        
+        # 文档已存在时按去重策略处理，不调用Ollama
+        policy = env_config.dedup_policy
+        if policy != 'insert':
+            existing_ids = vector_store.find_ids_by_doc(doc_id)
+            if existing_ids:
+                if policy == 'update' and not all(
+                    vector_store.update_metadata(vector_id, metadata, attributes) for vector_id in existing_ids
+                ):
+                    return JsonResponse({
+                        'code': 500,
+                        'message': '更新元数据失败',
+                        'data': None
+                    }, status=500)
+                
+                return JsonResponse({
+                    'code': 200,
+                    'message': '文档已存在' if policy == 'skip' else '文档已存在，已更新元数据',
+                    'data': {
+                        'doc_id': doc_id,
+                        'ids': existing_ids,
+                        'chunks': len(existing_ids),
+                        'duplicate': True
+                    }
+                })
+        
+        chunks = chunk_text(text, env_config.chunk_max_chars, env_config.chunk_overlap_chars)
+        if len(chunks) > env_config.bulk_insert_max_items:
             return JsonResponse({
-                'code': 500,
-                'message': f'向量维度不匹配: 期望 {milvus_client.vector_dim}, 实际 {len(embedding)}',
+                'code': 400,
+                'message': f'参数错误: 文档过长，最多 {env_config.bulk_insert_max_items} 个分块',
                 'data': None
-            }, status=500)
+            }, status=400)
         
-        # 插入向量数据
-        vector_id = milvus_client.insert_vector(embedding, text, metadata)
+        # 分批嵌入全部分块（使用目标集合的模型），任一批失败则整篇文档不入库
+        ollama_client = get_ollama_client()
+        model = _store_model(vector_store)
+        batch_size = env_config.embedding_batch_size
+        embeddings = []
+        for start in range(0, len(chunks), batch_size):
+            batch = ollama_client.get_embeddings(chunks[start:start + batch_size], **model)
+            if not batch:
+                return JsonResponse({
+                    'code': 500,
+                    'message': '获取嵌入向量失败',
+                    'data': None
+                }, status=500)
+            embeddings.extend(batch)
         
-        if vector_id:
-            return JsonResponse({
-                'code': 200,
-                'message': '插入成功',
-                'data': {
-                    'id': vector_id,
-                    'text': text,
-                    'metadata': metadata,
-                    'embedding_dim': len(embedding)
-                }
-            })
-        else:
+        for embedding in embeddings:
+            embedding_error = _check_embedding(embedding, vector_store)
+            if embedding_error:
+                return embedding_error
+        
+        # 一次列式插入所有分块
+        ids = vector_store.insert_vectors(
+            embeddings,
+            chunks,
+            [metadata] * len(chunks),
+            [doc_id] * len(chunks),
+            list(range(len(chunks))),
+            [attributes] * len(chunks)
+        )
+        
+        if ids is None:
             return JsonResponse({
                 'code': 500,
                 'message': '插入失败',
                 'data': None
             }, status=500)
+        
+        return JsonResponse({
+            'code': 200,
+            'message': '文档插入成功',
+            'data': {
+                'doc_id': doc_id,
+                'ids': ids,
+                'chunks': len(chunks),
+                'duplicate': False
+            }
+        })
             
     except json.JSONDecodeError:
         return JsonResponse({
@@ -163,14 +923,21 @@ def search_text_with_auth(request, openid=None):
     POST请求参数:
     {
         "text": "查询文本",      # 必填，要搜索的文本
-        "limit": 10             # 可选，返回结果数量，默认10
+        "limit": 10,            # 可选，每页返回数量，默认10，超过SEARCH_MAX_LIMIT时截断
+        "offset": 0,            # 可选，分页偏移，取上一页返回的next_offset
+        "radius": 0.8,          # 可选，范围搜索阈值: L2下只返回距离小于该值的结果，IP/COSINE下只返回相似度大于该值的结果
+        "mode": "hybrid",       # 可选，vector（仅向量）或 hybrid（词法+向量融合），默认取SEARCH_MODE
+        "filter": {             # 可选，结构化字段过滤（在引擎内先过滤再取top-k）
+            "category": "通知",
+            "community_id": ["c1", "c2"],
+            "created_at": {"gte": 1700000000}
+        }
     }
     """
     try:
         # 解析请求数据
         data = json.loads(request.body)
         text = data.get('text')
-        limit = data.get('limit', 10)
         
         # 参数验证
         if not text:
@@ -180,11 +947,105 @@ def search_text_with_auth(request, openid=None):
                 'data': None
             }, status=400)
         
-        # 获取文本嵌入向量
+        window, window_error = _parse_search_window(data)
+        if window_error:
+            return window_error
+        
+        filters, filter_error = _parse_request_filter(data)
+        if filter_error:
+            return filter_error
+        
+        vector_store = get_vector_store()
+        lexical_future, mode_error = _start_lexical_search(
+            data, text, window, filters, vector_store.collection_name
+        )
+        if mode_error:
+            return mode_error
+        
+        # 获取文本嵌入向量（使用所搜索集合的模型）
+        ollama_client = get_ollama_client()
+        embedding = ollama_client.get_embedding(text, **_store_model(vector_store))
+        
+        return _search_with_embedding(vector_store, window, embedding, openid, lexical_future, filters)
+            
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'code': 400,
+            'message': 'JSON格式错误',
+            'data': None
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}',
+            'data': None
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@require_auth
+def search_texts_with_auth(request, openid=None):
+    """
+    带token鉴权的批量文本搜索接口
+    多个查询只做一次Ollama批量嵌入和一次Milvus多向量搜索
+    需要Authorization头: Bearer <token>
+    
+    POST请求参数:
+    {
+        "texts": ["查询文本1", "查询文本2"],   # 必填，查询文本列表
+        "limit": 10,                          # 可选，每个查询返回结果数量，默认10，offset/radius同 search-text
+        "filter": {"category": "通知"}        # 可选，格式同 search-text，对所有查询生效
+    }
+    
+    返回:
+    {
+        "code": 200,
+        "message": "搜索成功",
+        "data": {
+            "results": [
+                {"text": "查询文本1", "results": ["内容1", "内容2"], "items": [{"id": 1, "distance": 0.1, ...}], "total": 2, "next_offset": null},
+                {"text": "查询文本2", "results": [], "items": [], "total": 0, "next_offset": null}
+            ],
+            "openid": "用户openid"
+        }
+    }
+    """
+    try:
+        # 解析请求数据
+        data = json.loads(request.body)
+        texts = data.get('texts')
+        
+        # 参数验证
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) and text for text in texts):
+            return JsonResponse({
+                'code': 400,
+                'message': '参数错误: texts必须为非空字符串列表',
+                'data': None
+            }, status=400)
+        
+        max_queries = get_env_config().search_batch_max_queries
+        if len(texts) > max_queries:
+            return JsonResponse({
+                'code': 400,
+                'message': f'参数错误: 单次最多 {max_queries} 个查询',
+                'data': None
+            }, status=400)
+        
+        window, window_error = _parse_search_window(data)
+        if window_error:
+            return window_error
+        
+        filters, filter_error = _parse_request_filter(data)
+        if filter_error:
+            return filter_error
+        
+        # 批量获取文本嵌入向量（使用所搜索集合的模型）
+        vector_store = get_vector_store()
         ollama_client = get_ollama_client()
-        embedding = ollama_client.get_embedding(text)
+        embeddings = ollama_client.get_embeddings(texts, **_store_model(vector_store))
         
-        if not embedding:
+        if not embeddings:
             return JsonResponse({
                 'code': 500,
                 'message': '获取嵌入向量失败',
@@ -192,27 +1053,47 @@ def search_text_with_auth(request, openid=None):
             }, status=500)
         
         # 验证向量维度
-        milvus_client = get_milvus_client()
-        if len(embedding) != milvus_client.vector_dim:
+        for embedding in embeddings:
+            embedding_error = _check_embedding(embedding, vector_store)
+            if embedding_error:
+                return embedding_error
+        
+        # 一次搜索多个向量
+        diversify = window['diversify'] is not None
+        try:
+            grouped = vector_store.search_vectors_batch(
+                embeddings, _fetch_size(window), filters, window['radius'], with_vectors=diversify,
+                partitions=community_ids(filters or [])
+            )
+        except MissingFieldError as e:
+            return _missing_field_response(e)
+        
+        if grouped is None:
             return JsonResponse({
                 'code': 500,
-                'message': f'向量维度不匹配: 期望 {milvus_client.vector_dim}, 实际 {len(embedding)}',
+                'message': '搜索失败',
                 'data': None
             }, status=500)
         
-        # 搜索相似向量
-        results = milvus_client.search_vectors(embedding, limit)
-        
-        # 提取content内容
-        contents = [item['content'] for item in results]
+        results = []
+        for text, embedding, items in zip(texts, embeddings, grouped):
+            if diversify:
+                items = _diversify(embedding, items, window)
+            page, next_offset = _paginate(items, window)
+            results.append({
+                'text': text,
+                'results': [item['content'] for item in page],
+                'items': [_format_search_item(item) for item in page],
+                'total': len(page),
+                'next_offset': next_offset
+            })
         
         return JsonResponse({
             'code': 200,
             'message': '搜索成功',
             'data': {
-                'results': contents,
-                'total': len(contents),
-                'openid': openid  # 返回验证的用户openid
+                'results': results,
+                'openid': openid
             }
         })
             
@@ -230,82 +1111,214 @@ def search_text_with_auth(request, openid=None):
         }, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+async def insert_text_with_auth_async(request):
+    """
+    带认证的文本插入接口（异步版本，需在ASGI下部署）
+    请求头和参数与 insert-text 相同
+    嵌入请求走异步Ollama客户端，Milvus写入放到线程池执行
+    """
+    try:
+        # 认证验证（验签和nonce存储的SQLite读写放到线程池执行）
+        auth_error = await sync_to_async(_verify_signature_headers, thread_sensitive=False)(request)
+        if auth_error:
+            return auth_error
+        
+        # 解析请求数据
+        data = json.loads(request.body)
+        text = data.get('text')
+        metadata = data.get('metadata')
+        
+        # 参数验证
+        if not text:
+            return JsonResponse({
+                'code': 400,
+                'message': '参数错误: text为必填项',
+                'data': None
+            }, status=400)
+        
+        attributes, attributes_error = _parse_request_attributes(data)
+        if attributes_error:
+            return attributes_error
+        
+        # 重复文本直接返回已有ID，不调用Ollama
+        vector_store = get_vector_store()
+        duplicate = await sync_to_async(_find_duplicate, thread_sensitive=False)(
+            vector_store, text, metadata, attributes
+        )
+        if duplicate:
+            return duplicate
+        
+        # 获取文本嵌入向量（使用目标集合的模型）
+        embedding = await get_async_ollama_client().get_embedding(text, **_store_model(vector_store))
+        
+        return await sync_to_async(_insert_with_embedding, thread_sensitive=False)(
+            vector_store, text, metadata, embedding, attributes
+        )
+            
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'code': 400,
+            'message': 'JSON格式错误',
+            'data': None
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}',
+            'data': None
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@require_auth
+async def search_text_with_auth_async(request, openid=None):
+    """
+    带token鉴权的文本搜索接口（异步版本，需在ASGI下部署）
+    请求头和参数与 search-text 相同
+    嵌入请求走异步Ollama客户端，Milvus搜索放到线程池执行
+    """
+    try:
+        # 解析请求数据
+        data = json.loads(request.body)
+        text = data.get('text')
+        
+        # 参数验证
+        if not text:
+            return JsonResponse({
+                'code': 400,
+                'message': '参数错误: text为必填项',
+                'data': None
+            }, status=400)
+        
+        window, window_error = _parse_search_window(data)
+        if window_error:
+            return window_error
+        
+        filters, filter_error = _parse_request_filter(data)
+        if filter_error:
+            return filter_error
+        
+        vector_store = get_vector_store()
+        lexical_future, mode_error = _start_lexical_search(
+            data, text, window, filters, vector_store.collection_name
+        )
+        if mode_error:
+            return mode_error
+        
+        # 获取文本嵌入向量（使用所搜索集合的模型）
+        embedding = await get_async_ollama_client().get_embedding(text, **_store_model(vector_store))
+        
+        return await sync_to_async(_search_with_embedding, thread_sensitive=False)(
+            vector_store, window, embedding, openid, lexical_future, filters
+        )
+            
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'code': 400,
+            'message': 'JSON格式错误',
+            'data': None
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'code': 500,
+            'message': f'服务器错误: {str(e)}',
+            'data': None
+        }, status=500)
+
+
+class _Echo:
+    """csv.writer使用的伪文件对象，write直接返回写入的内容"""
+    
+    def write(self, value):
+        return value
+
+
+def _stream_csv_rows(vector_store, after_id, batch_size, compress):
+    """
+    逐批生成CSV内容
+    
+    Args:
+        vector_store: 向量存储
+        after_id: 断点续传的起始主键（不含）
+        batch_size: 每批读取的条数
+        compress: 是否gzip压缩输出
+    """
+    writer = csv.writer(_Echo())
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    
+    def emit(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+    
+    # 写入UTF-8 BOM，方便Excel识别中文
+    chunk = emit('\ufeff' + writer.writerow(['id', 'content', 'metadata']))
+    if chunk:
+        yield chunk
+    
+    for batch in vector_store.iterate_rows(
+        output_fields=["id", "content", "metadata"],
+        after_id=after_id,
+        batch_size=batch_size
+    ):
+        chunk = emit(''.join(
+            writer.writerow([item['id'], item['content'], item.get('metadata', '')])
+            for item in batch
+        ))
+        if chunk:
+            yield chunk
+    
+    if compressor:
+        yield compressor.flush()
+
+
 @require_http_methods(["GET"])
 def export_to_csv(request):
     """
-    导出向量数据库所有内容到CSV文件
+    流式导出向量数据库所有内容为CSV文件（直接下载，不落盘）
+    按主键顺序分批读取，内存占用与数据量无关
     无需认证，任何人都可以导出
     
-    返回:
-    {
-        "code": 200,
-        "message": "导出成功",
-        "data": {
-            "file_path": "/file/vectors_export.csv",
-            "total_records": 100
-        }
-    }
+    GET参数:
+        after_id: 可选，只导出主键大于该值的数据（断点续传）
+        gzip: 可选，为1/true时返回gzip压缩的 .csv.gz
+        batch_size: 可选，每批读取条数，默认1000，最大10000
     """
     try:
-        milvus_client = get_milvus_client()
-        
-        # 连接到Milvus并创建集合（如果不存在）
-        if not milvus_client.connect() or not milvus_client.create_collection():
+        # 解析参数
+        after_id = request.GET.get('after_id')
+        try:
+            after_id = int(after_id) if after_id not in (None, '') else None
+            batch_size = min(max(int(request.GET.get('batch_size', 1000)), 1), 10000)
+        except ValueError:
             return JsonResponse({
-                'code': 503,
-                'message': 'Milvus连接或集合创建失败',
+                'code': 400,
+                'message': '参数错误: after_id和batch_size必须为整数',
                 'data': None
-            }, status=503)
+            }, status=400)
+        compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
         
-        # 确保集合已加载
-        if not milvus_client.collection:
+        vector_store = get_vector_store()
+        
+        # 确保集合已连接并加载（只在首次调用时付出开销）
+        if not vector_store.ensure_ready():
             return JsonResponse({
                 'code': 503,
-                'message': 'Milvus集合未初始化',
+                'message': 'Milvus连接或集合初始化失败',
                 'data': None
             }, status=503)
         
-        # 加载集合到内存
-        milvus_client.collection.load()
-        
-        # 查询所有数据
-        results = milvus_client.collection.query(
-            expr="",  # 空表达式表示查询所有
-            output_fields=["id", "content", "metadata"],
-            limit=10000  # 设置一个较大的限制，确保获取所有数据
-        )
-        
-        # 创建文件目录
-        file_dir = "file"
-        if not os.path.exists(file_dir):
-            os.makedirs(file_dir)
-        
-        # 生成CSV文件路径（使用时间戳作为文件名）
-        import datetime
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = os.path.join(file_dir, f"vectors_export_{timestamp}.csv")
-        
-        # 写入CSV文件
-        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['id', 'content', 'metadata']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for item in results:
-                writer.writerow({
-                    'id': item['id'],
-                    'content': item['content'],
-                    'metadata': item.get('metadata', '')
-                })
+        filename = f"vectors_export_{timestamp}.csv" + (".gz" if compress else "")
         
-        return JsonResponse({
-            'code': 200,
-            'message': '导出成功',
-            'data': {
-                'file_path': file_path,
-                'total_records': len(results)
-            }
-        })
+        response = StreamingHttpResponse(
+            _stream_csv_rows(vector_store, after_id, batch_size, compress),
+            content_type='application/gzip' if compress else 'text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
             
     except Exception as e:
         return JsonResponse({
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User
+from .models import RefreshToken, User
 
 
 @admin.register(User)
@@ -24,3 +24,12 @@ class UserAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+
+@admin.register(RefreshToken)
+class RefreshTokenAdmin(admin.ModelAdmin):
+    list_display = ('user', 'created_at', 'expires_at', 'revoked_at')
+    list_filter = ('created_at', 'revoked_at')
+    search_fields = ('user__nickname', 'user__openid')
+    readonly_fields = ('user', 'token_hash', 'created_at', 'expires_at')
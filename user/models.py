@@ -1,6 +1,11 @@
-from django.db import models
+import hashlib
+import secrets
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
 from imagekit.models import ProcessedImageField
 from imagekit.processors import ResizeToFill
+from utils.auth import TokenAuth
 from utils.file_utils import generate_random_avatar_filename
 
 
@@ -30,3 +35,98 @@ class User(models.Model):
 
     def __str__(self):
         return f"{self.nickname} ({self.name})"
+
+
+class RefreshToken(models.Model):
+    """
+    refresh token模型
+    访问token过期后客户端凭refresh token换取新的访问token，无需再调用微信jscode2session；
+    数据库只保存token的SHA-256摘要，每次刷新轮换为新token并重新计算有效期（滑动会话）
+    """
+    # 已轮换的token在该时长内再次使用视为并发刷新，超过则视为泄露并吊销该用户全部token
+    REUSE_GRACE = timedelta(seconds=30)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens', verbose_name="用户")
+    token_hash = models.CharField(max_length=64, unique=True, verbose_name="token摘要")
+    expires_at = models.DateTimeField(verbose_name="过期时间")
+    revoked_at = models.DateTimeField(blank=True, null=True, verbose_name="吊销时间")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = "刷新令牌"
+        verbose_name_plural = "刷新令牌"
+        db_table = "user_refresh_token"
+
+    def __str__(self):
+        return f"{self.user_id} ({self.expires_at:%Y-%m-%d %H:%M})"
+
+    @staticmethod
+    def hash_token(raw_token):
+        """计算token摘要"""
+        return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """
+        为用户签发新的refresh token（顺带清理该用户已过期的token）
+
+        Returns:
+            str: refresh token明文，只在签发时返回给客户端
+        """
+        now = timezone.now()
+        cls.objects.filter(user=user, expires_at__lte=now).delete()
+
+        raw_token = secrets.token_urlsafe(32)
+        cls.objects.create(
+            user=user,
+            token_hash=cls.hash_token(raw_token),
+            expires_at=now + TokenAuth.get_refresh_expire_delta()
+        )
+        return raw_token
+
+    @classmethod
+    def rotate(cls, raw_token):
+        """
+        校验refresh token并轮换为新token（旧token立即失效）
+
+        Returns:
+            tuple: (User对象, 新的refresh token明文, None) 或 (None, None, 错误信息)
+        """
+        if not raw_token:
+            return None, None, '缺少refresh_token'
+
+        now = timezone.now()
+        with transaction.atomic():
+            record = cls.objects.select_related('user').filter(token_hash=cls.hash_token(raw_token)).first()
+            if record is None:
+                return None, None, 'refresh token无效'
+
+            if record.revoked_at is not None:
+                if now - record.revoked_at > cls.REUSE_GRACE:
+                    # 已轮换的token被重放，可能已泄露，吊销该用户的全部会话
+                    revoked = cls.revoke_all(record.user)
+                    print(f"⚠️ refresh token重放，已吊销用户 {record.user_id} 的 {revoked} 个会话")
+                return None, None, 'refresh token已失效'
+
+            if record.expires_at <= now:
+                return None, None, 'refresh token已过期'
+
+            # 条件更新保证并发刷新时只有一个请求能轮换成功
+            if not cls.objects.filter(pk=record.pk, revoked_at__isnull=True).update(revoked_at=now):
+                return None, None, 'refresh token已失效'
+
+            return record.user, cls.issue(record.user), None
+
+    @classmethod
+    def revoke(cls, raw_token):
+        """吊销refresh token（退出登录），返回是否吊销了有效token"""
+        if not raw_token:
+            return False
+        return cls.objects.filter(
+            token_hash=cls.hash_token(raw_token), revoked_at__isnull=True
+        ).update(revoked_at=timezone.now()) > 0
+
+    @classmethod
+    def revoke_all(cls, user):
+        """吊销用户的全部refresh token，返回吊销数量"""
+        return cls.objects.filter(user=user, revoked_at__isnull=True).update(revoked_at=timezone.now())
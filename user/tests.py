@@ -1,3 +1,198 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from utils.auth import TokenAuth, TokenCache
+from .models import RefreshToken, User
+from .views import WxLoginView
+
+
+class TokenAuthMiddlewareTests(SimpleTestCase):
+    """Token鉴权中间件: 每个请求验证一次token、最多查询一次用户"""
+
+    def setUp(self):
+        self.user = User(id=1, openid='openid-1', nickname='测试用户')
+        self.headers = {'HTTP_AUTHORIZATION': 'Bearer ' + TokenAuth.generate_token('openid-1')}
+        patcher = mock.patch('utils.auth._load_user', side_effect=self._load_user)
+        self.load_user = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _load_user(self, openid):
+        return self.user if openid == 'openid-1' else None
+
+    def test_profile_verifies_token_once_and_loads_user_once(self):
+        with mock.patch.object(TokenAuth, 'verify_token', wraps=TokenAuth.verify_token) as verify_token:
+            response = self.client.get('/user/profile/', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['nickname'], '测试用户')
+        self.assertEqual(verify_token.call_count, 1)
+        self.assertEqual(self.load_user.call_count, 1)
+
+    def test_profile_update_uses_request_user(self):
+        with mock.patch.object(User, 'save') as save:
+            response = self.client.put(
+                '/user/profile/', data='{"nickname": "新昵称"}', content_type='application/json', **self.headers
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user.nickname, '新昵称')
+        save.assert_called_once()
+
+    def test_missing_or_invalid_token_returns_401(self):
+        response = self.client.get('/user/profile/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['message'], '未提供授权信息')
+        self.assertEqual(self.client.get('/user/wx-login/').json()['message'], '未提供授权信息')
+        response = self.client.get('/user/wx-login/', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get('/user/wx-login/', **self.headers).status_code, 200)
+
+    def test_unknown_user_returns_404(self):
+        headers = {'HTTP_AUTHORIZATION': 'Bearer ' + TokenAuth.generate_token('openid-2')}
+        self.assertEqual(self.client.get('/user/profile/', **headers).status_code, 404)
+
+    def test_user_is_not_loaded_unless_accessed(self):
+        self.client.get('/user/wx-login/', **self.headers)
+        self.load_user.assert_not_called()
+
+
+class TokenCacheTests(SimpleTestCase):
+    """已验证JWT缓存"""
+
+    def setUp(self):
+        TokenAuth.reset_config()
+        self.addCleanup(TokenAuth.reset_config)
+
+    def test_repeated_token_is_decoded_once(self):
+        token = TokenAuth.generate_token('openid-1')
+        with mock.patch('utils.auth.jwt.decode', wraps=jwt.decode) as decode:
+            self.assertEqual(TokenAuth.get_openid_from_token(token), 'openid-1')
+            self.assertEqual(TokenAuth.get_openid_from_token(token), 'openid-1')
+            self.assertEqual(decode.call_count, 1)
+        self.assertEqual(TokenAuth.cache_stats()['hits'], 1)
+
+    def test_entry_is_evicted_at_exp(self):
+        cache = TokenCache(max_size=16)
+        cache.set('token', {'openid': 'o', 'exp': 1000})
+        with mock.patch('utils.auth.time.time', return_value=999.0):
+            self.assertEqual(cache.get('token')['openid'], 'o')
+        with mock.patch('utils.auth.time.time', return_value=1000.0):
+            self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_size_is_bounded_and_invalid_tokens_are_not_cached(self):
+        cache = TokenCache(max_size=2)
+        for index in range(3):
+            cache.set(f'token-{index}', {'exp': time.time() + 60})
+        cache.set('no-exp', {'openid': 'o'})
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertIsNone(cache.get('token-0'))
+
+        with self.assertRaises(Exception):
+            TokenAuth.verify_token(TokenAuth.generate_token('openid-1') + 'x')
+        self.assertEqual(TokenAuth.cache_stats()['size'], 0)
+
+    def test_cached_payload_is_a_copy(self):
+        token = TokenAuth.generate_token('openid-1')
+        TokenAuth.verify_token(token)['openid'] = 'changed'
+        self.assertEqual(TokenAuth.verify_token(token)['openid'], 'openid-1')
+
+
+class RefreshTokenTests(TestCase):
+    """refresh token: 刷新不调用微信接口，轮换后旧token失效，重放时吊销全部会话"""
+
+    @classmethod
+    def setUpClass(cls):
+        # 仓库未提交迁移文件，测试库中直接建表
+        with connection.schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(RefreshToken)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(RefreshToken)
+            editor.delete_model(User)
+
+    def setUp(self):
+        self.user = User.objects.create(openid='openid-1', nickname='测试用户')
+
+    def _login(self):
+        with mock.patch.object(WxLoginView, '_get_openid_from_wx', return_value='openid-1') as wx:
+            response = self.client.post('/user/wx-login/', data={'code': 'c'}, content_type='application/json')
+        self.assertEqual(wx.call_count, 1)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def _refresh(self, refresh_token):
+        return self.client.post(
+            '/user/token/refresh/', data={'refresh_token': refresh_token}, content_type='application/json'
+        )
+
+    def test_login_returns_access_and_refresh_token(self):
+        data = self._login()
+        self.assertEqual(TokenAuth.get_openid_from_token(data['token']), 'openid-1')
+        self.assertEqual(data['expires_in'], TokenAuth.get_expires_in())
+        record = RefreshToken.objects.get(user=self.user)
+        self.assertEqual(record.token_hash, RefreshToken.hash_token(data['refresh_token']))
+        self.assertNotEqual(record.token_hash, data['refresh_token'])
+
+    def test_refresh_rotates_without_wechat_call(self):
+        data = self._login()
+        with mock.patch.object(WxLoginView, '_get_openid_from_wx') as wx:
+            response = self._refresh(data['refresh_token'])
+        wx.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        refreshed = response.json()['data']
+        self.assertNotEqual(refreshed['refresh_token'], data['refresh_token'])
+        self.assertEqual(TokenAuth.get_openid_from_token(refreshed['token']), 'openid-1')
+
+        # 旧token在宽限期内重复使用只返回401，不影响新token
+        self.assertEqual(self._refresh(data['refresh_token']).status_code, 401)
+        self.assertEqual(self._refresh(refreshed['refresh_token']).status_code, 200)
+
+    def test_replayed_token_revokes_all_sessions(self):
+        data = self._login()
+        refreshed = self._refresh(data['refresh_token']).json()['data']
+        RefreshToken.objects.filter(token_hash=RefreshToken.hash_token(data['refresh_token'])).update(
+            revoked_at=timezone.now() - RefreshToken.REUSE_GRACE * 2
+        )
+        self.assertEqual(self._refresh(data['refresh_token']).status_code, 401)
+        self.assertEqual(self._refresh(refreshed['refresh_token']).status_code, 401)
+
+    def test_expired_and_unknown_tokens_are_rejected(self):
+        data = self._login()
+        RefreshToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._refresh(data['refresh_token']).status_code, 401)
+        self.assertEqual(self._refresh('unknown').status_code, 401)
+        self.assertEqual(self._refresh('').status_code, 401)
+
+    def _revoke(self, refresh_token):
+        return self.client.post(
+            '/user/token/revoke/', data={'refresh_token': refresh_token}, content_type='application/json'
+        )
+
+    def test_revoke_logs_out_without_issuing_tokens(self):
+        data = self._login()
+        response = self._revoke(data['refresh_token'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'revoked': True})
+        self.assertEqual(RefreshToken.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self._refresh(data['refresh_token']).status_code, 401)
+
+        # 重复吊销同样返回成功，缺少参数返回400
+        self.assertEqual(self._revoke(data['refresh_token']).status_code, 200)
+        response = self.client.post('/user/token/revoke/', data={}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_revoke_only_affects_the_given_session(self):
+        first, second = self._login(), self._login()
+        self.assertEqual(self._revoke(first['refresh_token']).status_code, 200)
+        self.assertEqual(self._refresh(first['refresh_token']).status_code, 401)
+        self.assertEqual(self._refresh(second['refresh_token']).status_code, 200)
@@ -7,6 +7,10 @@ urlpatterns = [
     # 微信登录接口
     path('wx-login/', views.WxLoginView.as_view(), name='wx_login'),
     
+    # token刷新和退出登录接口（不调用微信接口）
+    path('token/refresh/', views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/revoke/', views.TokenRevokeView.as_view(), name='token_revoke'),
+    
     # 用户资料接口
     path('profile/', views.UserProfileView.as_view(), name='user_profile'),
 ]
@@ -2,11 +2,58 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 import requests
-from .models import User
+from .models import RefreshToken, User
 from utils import generate_token
+from utils.auth import TokenAuth, authenticate_request
 from utils.env_config import get_wx_config
 
 
+def issue_tokens(user, refresh_token=None):
+    """
+    签发访问token和refresh token
+    
+    Args:
+        user: User对象
+        refresh_token: 已签发的refresh token明文，为None时新签发
+        
+    Returns:
+        dict: 包含token、refresh_token和expires_in的字典
+    """
+    return {
+        'token': generate_token(user.openid),
+        'refresh_token': refresh_token or RefreshToken.issue(user),
+        'expires_in': TokenAuth.get_expires_in()
+    }
+
+
+def get_refresh_token(request):
+    """
+    读取请求体中的refresh token（token刷新和退出登录接口共用）
+    
+    Returns:
+        str: refresh token明文，未提供时为None
+    """
+    return request.data.get('refresh_token') or None
+
+
+def token_success_response(message='操作成功', data=None):
+    """token接口统一成功响应格式"""
+    return Response({
+        'code': 200,
+        'message': message,
+        'data': data
+    }, status=status.HTTP_200_OK)
+
+
+def token_error_response(code, message):
+    """token接口统一错误响应格式"""
+    return Response({
+        'code': code,
+        'message': message,
+        'data': None
+    }, status=code)
+
+
 class WxLoginView(APIView):
     """
     微信小程序登录接口
@@ -28,7 +75,9 @@ class WxLoginView(APIView):
         "code": 200,
         "message": "登录成功",
         "data": {
-            "token": "生成的JWT token",
+            "token": "生成的JWT token（访问token，有效期较短）",
+            "refresh_token": "refresh token，访问token过期后调用 /api/user/token/refresh/ 换取新token",
+            "expires_in": 访问token有效期（秒）,
             "user_info": {
                 "openid": "用户openid",
                 "nickname": "用户昵称",
@@ -42,32 +91,27 @@ class WxLoginView(APIView):
     # 微信API接口
     WX_API_URL = "https://api.weixin.qq.com/sns/jscode2session"
     
+    # token由TokenAuthMiddleware验证，不使用DRF的Session/Basic认证
+    authentication_classes = []
+    
     def get(self, request):
         """验证登录状态 - 仅用于测试token是否有效"""
         try:
-            # 获取token
-            auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-            if not auth_header:
+            if not request.META.get('HTTP_AUTHORIZATION', ''):
                 return self._error_response(
                     code=401,
                     message='未提供授权信息',
                     status_code=status.HTTP_401_UNAUTHORIZED
                 )
             
-            # 提取token
-            token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
-            
-            # 验证token并获取openid
-            try:
-                from utils import verify_token
-                verify_token(token)  # 只验证token有效性，不关心内容
-                return self._success_response(message='登录状态有效')
-            except Exception as e:
+            # 中间件已验证token，只检查结果
+            if authenticate_request(request) is None:
                 return self._error_response(
                     code=401,
-                    message=f'无效的登录状态: {str(e)}',
+                    message=f'无效的登录状态: {request.auth_error}',
                     status_code=status.HTTP_401_UNAUTHORIZED
                 )
+            return self._success_response(message='登录状态有效')
                 
         except Exception as e:
             return self._error_response(
@@ -102,8 +146,8 @@ class WxLoginView(APIView):
             # 获取或创建用户
             user, is_new_user = self._get_or_create_user(openid)
             
-            # 生成token
-            token = generate_token(openid)
+            # 生成访问token和refresh token
+            tokens = issue_tokens(user)
             
             # 构造返回数据
             user_info = self._format_user_info(user, is_new_user)
@@ -111,7 +155,7 @@ class WxLoginView(APIView):
             return self._success_response(
                 message='登录成功',
                 data={
-                    'token': token,
+                    **tokens,
                     'user_info': user_info
                 }
             )
@@ -243,7 +287,6 @@ class WxLoginView(APIView):
         }, status=status_code)
 
 
-from utils.auth import get_openid_from_token
 from .serializers import UserSerializer
 
 
@@ -255,28 +298,15 @@ class UserProfileView(APIView):
     PUT /api/user/profile/ - 更新用户信息
     """
     
+    # token由TokenAuthMiddleware验证，不使用DRF的Session/Basic认证
+    authentication_classes = []
+    
     def get(self, request):
         """获取用户信息 - 需要token验证"""
         try:
-            # 获取token
-            auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-            if not auth_header:
-                return self._error_response(401, '未提供授权信息')
-            
-            # 提取token
-            token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
-            
-            # 验证token并获取openid
-            try:
-                openid = get_openid_from_token(token)
-            except Exception as e:
-                return self._error_response(401, f'无效的token: {str(e)}')
-            
-            # 获取用户
-            try:
-                user = User.objects.get(openid=openid)
-            except User.DoesNotExist:
-                return self._error_response(404, '用户不存在')
+            user, error_response = self._get_user(request)
+            if error_response:
+                return error_response
             
             # 序列化返回数据
             serializer = UserSerializer(user)
@@ -298,25 +328,9 @@ class UserProfileView(APIView):
         - avatar: 头像文件 (通过表单上传)
         """
         try:
-            # 获取token
-            auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-            if not auth_header:
-                return self._error_response(401, '未提供授权信息')
-            
-            # 提取token
-            token = auth_header.replace('Bearer ', '') if auth_header.startswith('Bearer ') else auth_header
-            
-            # 验证token并获取openid
-            try:
-                openid = get_openid_from_token(token)
-            except Exception as e:
-                return self._error_response(401, f'无效的token: {str(e)}')
-            
-            # 获取用户
-            try:
-                user = User.objects.get(openid=openid)
-            except User.DoesNotExist:
-                return self._error_response(404, '用户不存在')
+            user, error_response = self._get_user(request)
+            if error_response:
+                return error_response
             
             # 处理表单数据 (multipart/form-data)
             updated = False
@@ -355,6 +369,24 @@ class UserProfileView(APIView):
         except Exception as e:
             return self._error_response(500, f'服务器内部错误: {str(e)}')
     
+    def _get_user(self, request):
+        """
+        获取当前登录用户（token由中间件验证，用户在本次请求内只查询一次）
+        
+        Returns:
+            tuple: (User对象, None) 或 (None, 错误响应)
+        """
+        if not request.META.get('HTTP_AUTHORIZATION', ''):
+            return None, self._error_response(401, '未提供授权信息')
+        
+        if authenticate_request(request) is None:
+            return None, self._error_response(401, f'无效的token: {request.auth_error}')
+        
+        user = request.zhihui_user
+        if not user:
+            return None, self._error_response(404, '用户不存在')
+        return user, None
+    
     def _success_response(self, message='操作成功', data=None):
         """统一成功响应格式"""
         return Response({
@@ -375,6 +407,74 @@ class UserProfileView(APIView):
         }, status=status_code)
 
 
+class TokenRefreshView(APIView):
+    """
+    token刷新接口
+    
+    POST /api/user/token/refresh/ - 用refresh token换取新的访问token，不调用微信接口
+    
+    POST请求参数:
+    {
+        "refresh_token": "登录或上次刷新返回的refresh token"
+    }
+    
+    POST请求返回:
+    {
+        "code": 200,
+        "message": "刷新成功",
+        "data": {
+            "token": "新的访问token",
+            "refresh_token": "新的refresh token（旧的立即失效）",
+            "expires_in": 访问token有效期（秒）
+        }
+    }
+    """
+    
+    # 凭refresh token刷新，不需要访问token
+    authentication_classes = []
+    
+    def post(self, request):
+        """刷新token - refresh token轮换并重新计算有效期"""
+        try:
+            user, refresh_token, error = RefreshToken.rotate(get_refresh_token(request))
+            if error:
+                return token_error_response(401, f'刷新失败: {error}')
+            
+            return token_success_response('刷新成功', issue_tokens(user, refresh_token))
+        
+        except Exception as e:
+            return token_error_response(500, f'服务器内部错误: {str(e)}')
+
+
+class TokenRevokeView(APIView):
+    """
+    退出登录接口
+    
+    POST /api/user/token/revoke/ - 吊销refresh token，已签发的访问token在过期前仍然有效
+    
+    POST请求参数:
+    {
+        "refresh_token": "要吊销的refresh token"
+    }
+    """
+    
+    # 凭refresh token退出登录，访问token过期后也能调用
+    authentication_classes = []
+    
+    def post(self, request):
+        """吊销refresh token - 重复吊销同样返回成功"""
+        try:
+            refresh_token = get_refresh_token(request)
+            if not refresh_token:
+                return token_error_response(400, '缺少必要参数refresh_token')
+            
+            revoked = RefreshToken.revoke(refresh_token)
+            return token_success_response('已退出登录', {'revoked': revoked})
+        
+        except Exception as e:
+            return token_error_response(500, f'服务器内部错误: {str(e)}')
+
+
 # 保留原来的函数式视图作为备用
 def wx_login_function_view(request):
     """函数式视图版本的微信登录（备用）"""
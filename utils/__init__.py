@@ -6,7 +6,9 @@ from .auth import (
     generate_token,
     verify_token,
     get_openid_from_token,
-    get_openid_from_request
+    get_openid_from_request,
+    authenticate_request,
+    TokenAuthMiddleware
 )
 
 # 导出文件工具
@@ -28,6 +30,8 @@ __all__ = [
     'verify_token',
     'get_openid_from_token',
     'get_openid_from_request',
+    'authenticate_request',
+    'TokenAuthMiddleware',
     # 环境变量配置相关
     'get_env_config',
     'get_wx_config',
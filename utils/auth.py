@@ -1,22 +1,141 @@
 import jwt
 import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
+from typing import Optional
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
 from django.conf import settings
 from .env_config import get_jwt_config
 
 
+# JWT签名算法
+JWT_ALGORITHM = 'HS256'
+
+
+class TokenCache:
+    """
+    已验证token缓存类
+    容量上限的LRU，键为token、值为解码后的payload，条目在token的exp时刻过期，
+    同一会话反复携带的token只需完整解码验签一次
+    """
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, token: str) -> Optional[dict]:
+        """
+        查询缓存
+        
+        Returns:
+            dict: 命中且未过期时返回payload副本，否则返回None
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return dict(payload)
+                del self._entries[token]
+            
+            self.misses += 1
+            return None
+    
+    def set(self, token: str, payload: dict):
+        """写入已验证的payload（没有exp的token不缓存）"""
+        expires_at = payload.get('exp')
+        if not isinstance(expires_at, (int, float)):
+            return
+        
+        with self._lock:
+            self._entries[token] = (expires_at, dict(payload))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
 class TokenAuth:
     """
     简洁优美的Token鉴权系统
     支持openid编码/解码，可配置过期时间
     """
     
+    # 预先计算的JWT配置和已验证token缓存（首次使用时初始化）
+    _config = None
+    _token_cache = None
+    _token_cache_ready = False
+    
     @classmethod
     def _get_config(cls):
-        """获取JWT配置"""
-        return get_jwt_config()
+        """获取JWT配置（密钥、算法和过期时长只在首次调用时计算）"""
+        if cls._config is None:
+            config = get_jwt_config()
+            cls._config = {
+                **config,
+                'expire_delta': timedelta(minutes=config['access_expire_minutes']),
+                'refresh_expire_delta': timedelta(days=config['refresh_expire_days']),
+                'algorithm': JWT_ALGORITHM,
+                'algorithms': [JWT_ALGORITHM]
+            }
+        return cls._config
+    
+    @classmethod
+    def _get_token_cache(cls):
+        """获取已验证token缓存，JWT_CACHE_SIZE=0 时为None"""
+        if not cls._token_cache_ready:
+            cache_size = cls._get_config()['cache_size']
+            cls._token_cache = TokenCache(cache_size) if cache_size > 0 else None
+            cls._token_cache_ready = True
+        return cls._token_cache
+    
+    @classmethod
+    def reset_config(cls):
+        """重新读取JWT配置并清空token缓存（修改密钥等配置后调用）"""
+        cls._config = None
+        cls._token_cache = None
+        cls._token_cache_ready = False
+    
+    @classmethod
+    def cache_stats(cls):
+        """已验证token缓存的命中统计，未启用时返回None"""
+        cache = cls._get_token_cache()
+        return cache.stats() if cache else None
+    
+    @classmethod
+    def get_expires_in(cls) -> int:
+        """访问token有效期（秒），登录和刷新接口返回给客户端"""
+        return int(cls._get_config()['expire_delta'].total_seconds())
+    
+    @classmethod
+    def get_refresh_expire_delta(cls) -> timedelta:
+        """refresh token有效期"""
+        return cls._get_config()['refresh_expire_delta']
     
     @classmethod
     def generate_token(cls, openid: str) -> str:
@@ -34,7 +153,7 @@ class TokenAuth:
             config = cls._get_config()
             
             # 计算过期时间
-            expire_time = datetime.utcnow() + timedelta(hours=config['expire_hours'])
+            expire_time = datetime.utcnow() + config['expire_delta']
             
             # 构造payload
             payload = {
@@ -45,7 +164,7 @@ class TokenAuth:
             }
             
             # 生成token
-            token = jwt.encode(payload, config['secret_key'], algorithm='HS256')
+            token = jwt.encode(payload, config['secret_key'], algorithm=config['algorithm'])
             return token
             
         except Exception as e:
@@ -54,7 +173,7 @@ class TokenAuth:
     @classmethod
     def verify_token(cls, token: str) -> dict:
         """
-        验证token并返回解码后的信息
+        验证token并返回解码后的信息（验证通过的token缓存到其过期时刻）
         
         Args:
             token: 要验证的token字符串
@@ -65,12 +184,20 @@ class TokenAuth:
         Raises:
             Exception: token无效或过期时抛出异常
         """
+        token_cache = cls._get_token_cache()
+        if token_cache is not None:
+            payload = token_cache.get(token)
+            if payload is not None:
+                return payload
+        
         try:
             # 获取配置
             config = cls._get_config()
             
             # 解码token
-            payload = jwt.decode(token, config['secret_key'], algorithms=['HS256'])
+            payload = jwt.decode(token, config['secret_key'], algorithms=config['algorithms'])
+            if token_cache is not None:
+                token_cache.set(token, payload)
             return payload
             
         except jwt.ExpiredSignatureError:
@@ -126,35 +253,115 @@ class TokenAuth:
         return token
 
 
+def _load_user(openid):
+    """按openid查询用户，不存在时返回None"""
+    if not openid:
+        return None
+    from user.models import User
+    return User.objects.filter(openid=openid).first()
+
+
+def authenticate_request(request):
+    """
+    解析并验证请求携带的token，每个请求只执行一次，结果保存在请求对象上:
+    
+    - request.openid: 验证通过的openid，未携带token或token无效时为None
+    - request.auth_error: 验证失败的原因
+    - request.zhihui_user: openid对应的User，首次访问时才查询数据库并在本次请求内复用，
+      未登录或用户不存在时为假值（异步视图中需通过sync_to_async访问）
+    
+    Args:
+        request: Django请求对象（或DRF的Request）
+        
+    Returns:
+        str: 验证通过的openid，失败时返回None
+    """
+    if getattr(request, '_token_authenticated', False):
+        return request.openid
+    
+    openid, error = None, None
+    try:
+        token = TokenAuth.extract_token_from_request(request)
+        openid = TokenAuth.get_openid_from_token(token)
+        if not openid:
+            error = 'Token中缺少openid'
+    except Exception as e:
+        error = str(e)
+    
+    request.openid = openid or None
+    request.auth_error = error
+    request.zhihui_user = SimpleLazyObject(lambda: _load_user(openid))
+    request._token_authenticated = True
+    return request.openid
+
+
+class TokenAuthMiddleware:
+    """
+    Token鉴权中间件
+    每个请求解析一次Authorization头并附加 request.openid / request.zhihui_user，
+    require_auth等装饰器和各视图直接复用，不再重复解析token和查询用户
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        authenticate_request(request)
+        return self.get_response(request)
+    
+    async def __acall__(self, request):
+        authenticate_request(request)
+        return await self.get_response(request)
+
+
 def require_auth(func):
     """
     装饰器：要求请求必须携带有效的token
     使用方法：在视图函数上加上 @require_auth 装饰器
     
     装饰后的函数会自动获得一个额外的参数 openid
+    同时支持同步视图和异步视图
     """
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(request, *args, **kwargs):
+            openid = authenticate_request(request)
+            if openid is None:
+                return _auth_failed_response(request.auth_error)
+            
+            return await func(request, openid=openid, *args, **kwargs)
+        
+        return async_wrapper
+    
     @wraps(func)
     def wrapper(request, *args, **kwargs):
-        try:
-            # 提取token
-            token = TokenAuth.extract_token_from_request(request)
-            
-            # 验证token并获取openid
-            openid = TokenAuth.get_openid_from_token(token)
-            
-            # 将openid作为参数传递给原函数
-            return func(request, openid=openid, *args, **kwargs)
-            
-        except Exception as e:
-            return JsonResponse({
-                'code': 401,
-                'message': f'鉴权失败: {str(e)}',
-                'data': None
-            }, status=401)
+        # 验证token并获取openid（已由中间件验证时直接复用结果）
+        openid = authenticate_request(request)
+        if openid is None:
+            return _auth_failed_response(request.auth_error)
+        
+        # 将openid作为参数传递给原函数
+        return func(request, openid=openid, *args, **kwargs)
     
     return wrapper
 
 
+def _auth_failed_response(error):
+    """鉴权失败的统一响应"""
+    return JsonResponse({
+        'code': 401,
+        'message': f'鉴权失败: {str(error)}',
+        'data': None
+    }, status=401)
+
+
 def optional_auth(func):
     """
     装饰器：可选的身份验证
@@ -164,13 +371,8 @@ def optional_auth(func):
     """
     @wraps(func)
     def wrapper(request, *args, **kwargs):
-        try:
-            # 尝试提取token
-            token = TokenAuth.extract_token_from_request(request)
-            openid = TokenAuth.get_openid_from_token(token)
-        except:
-            # 如果获取失败，openid设为None
-            openid = None
+        # 获取失败时openid为None
+        openid = authenticate_request(request)
         
         # 将openid作为参数传递给原函数
         return func(request, openid=openid, *args, **kwargs)
@@ -195,6 +397,8 @@ def get_openid_from_token(token: str) -> str:
 
 
 def get_openid_from_request(request) -> str:
-    """从请求中获取openid的便捷函数"""
-    token = TokenAuth.extract_token_from_request(request)
-    return TokenAuth.get_openid_from_token(token)
\ No newline at end of file
+    """从请求中获取openid的便捷函数（token无效时抛出异常）"""
+    openid = authenticate_request(request)
+    if openid is None:
+        raise Exception(request.auth_error)
+    return openid
\ No newline at end of file
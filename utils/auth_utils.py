@@ -1,80 +1,370 @@
 """
 API鉴权工具
-使用RSA公私钥进行请求鉴权
+使用公私钥（RSA / Ed25519）进行请求鉴权，公钥由密钥环管理，请求通过 X-Auth-Key-Id 选择公钥
+
+认证数据（X-Auth-Data）格式为 "时间戳" 或 "时间戳:nonce":
+- AUTH_TIMESTAMP_WINDOW 大于0时时间戳必须在该秒数的有效窗口内，过期的认证头无法重放
+  （默认0不校验，兼容签名其他数据的旧客户端）
+- 带nonce的认证头在窗口内只能使用一次；不带nonce的认证头在窗口内可重复使用（批量导入），
+  AUTH_REQUIRE_NONCE=True 时必须带nonce
+- 验证通过/失败的结果按 (公钥, 数据, 签名) 的哈希缓存，窗口内重复使用的认证头不再做验签运算
 """
 import os
 import base64
 import hashlib
+import heapq
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives import hashes
 from cryptography.exceptions import InvalidSignature
+from utils.env_config import get_env_config
+from utils.keyring import DEFAULT_KEY_ID, Keyring, sign_with_key, verify_with_key
+
+
+# nonce最大长度
+MAX_NONCE_LENGTH = 128
+
+
+def make_auth_data(with_nonce: bool = True) -> str:
+    """生成认证数据: 当前时间戳，可附带随机nonce"""
+    timestamp = str(int(time.time()))
+    if not with_nonce:
+        return timestamp
+    return f"{timestamp}:{secrets.token_hex(16)}"
+
+
+def parse_auth_data(data: str):
+    """
+    解析认证数据
+
+    Returns:
+        tuple: (时间戳, nonce或None)，格式错误时返回None
+    """
+    timestamp, _, nonce = data.partition(':')
+    try:
+        timestamp = float(timestamp)
+    except ValueError:
+        return None
+    if timestamp != timestamp or len(nonce) > MAX_NONCE_LENGTH:
+        return None
+    return timestamp, nonce or None
+
+
+class SignatureCache:
+    """签名验证结果缓存类（带TTL和容量上限的LRU，键为 (公钥指纹, 数据, 签名) 的哈希）"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(data: str, signature: str, fingerprint: str = '') -> str:
+        """缓存键: SHA-256(公钥指纹 + 数据 + 签名，以分隔符连接)，轮换公钥后旧结果不再命中"""
+        return hashlib.sha256(f"{fingerprint}\0{data}\0{signature}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bool]:
+        """查询缓存，命中时返回验证结果，否则返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, valid = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return valid
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, valid: bool):
+        """写入验证结果"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, valid)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class NonceStoreFullError(Exception):
+    """进程内存中的nonce记录已满且均未过期，拒绝新的nonce（淘汰未过期的记录会放行重放请求）"""
+
+
+class NonceStore:
+    """
+    已使用nonce记录类
+    每个nonce记录到其认证数据过期为止（过期后时间戳校验已能拒绝重放）；
+    配置了SQLite路径时记录在数据库中，供同一主机上的多个进程共享
+    """
+
+    def __init__(self, max_size: int = 100000, db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.replays = 0
+        self.rejected = 0
+        self._memory = {}
+        self._expiry = []
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        """打开nonce数据库"""
+        try:
+            directory = os.path.dirname(db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS nonces (nonce TEXT PRIMARY KEY, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS idx_nonces_expires_at ON nonces (expires_at)')
+            self._db.commit()
+            print(f"✅ nonce存储已启用: {db_path}")
+        except Exception as e:
+            print(f"❌ nonce存储初始化失败，改用进程内存记录: {e}")
+            self._db = None
+
+    def add(self, nonce: str, expires_at: float) -> bool:
+        """
+        记录nonce
+
+        Args:
+            nonce: 认证数据中的nonce
+            expires_at: 记录的过期时间（Unix时间戳）
+
+        Returns:
+            bool: 首次使用返回True，窗口内重复使用（重放）返回False
+
+        Raises:
+            NonceStoreFullError: 进程内存记录已满（清理过期记录后仍达到max_size）
+        """
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                try:
+                    self._db.execute('DELETE FROM nonces WHERE expires_at <= ?', (now,))
+                    cursor = self._db.execute(
+                        'INSERT OR IGNORE INTO nonces (nonce, expires_at) VALUES (?, ?)', (nonce, expires_at)
+                    )
+                    self._db.commit()
+                    added = cursor.rowcount == 1
+                except Exception as e:
+                    # 无法确认是否重放时拒绝请求
+                    print(f"❌ 写入nonce存储失败: {e}")
+                    return False
+            else:
+                self._purge(now)
+                added = nonce not in self._memory
+                if added:
+                    # 记录均未过期，丢弃任何一条都会让对应的认证头在窗口内可被重放
+                    if len(self._memory) >= self.max_size:
+                        self.rejected += 1
+                        raise NonceStoreFullError(f"nonce记录已满（{self.max_size}条）")
+                    self._memory[nonce] = expires_at
+                    heapq.heappush(self._expiry, (expires_at, nonce))
+
+            if not added:
+                self.replays += 1
+            return added
+
+    def _purge(self, now):
+        """删除已过期的记录（调用方需持有锁）"""
+        while self._expiry and self._expiry[0][0] <= now:
+            _, nonce = heapq.heappop(self._expiry)
+            self._memory.pop(nonce, None)
+
+    def stats(self) -> dict:
+        """获取nonce存储统计信息"""
+        with self._lock:
+            return {
+                'backend': 'sqlite' if self._db is not None else 'memory',
+                'size': len(self._memory) if self._db is None else None,
+                'max_size': self.max_size,
+                'replays': self.replays,
+                'rejected': self.rejected
+            }
 
 
 class AuthUtils:
     """API鉴权工具类"""
     
-    def __init__(self):
-        # 加载公钥
-        public_key_path = os.path.join(os.path.dirname(__file__), 'api_keys.pub')
-        with open(public_key_path, 'r') as f:
-            self.public_key = serialization.load_ssh_public_key(f.read().encode())
+    def __init__(self, public_key=None, timestamp_window=None, require_nonce=None,
+                 signature_cache=None, nonce_store=None, keyring=None):
+        config = get_env_config()
+        
+        # 加载公钥: AUTH_KEYS_DIR 目录中的公钥，以及兼容的 utils/api_keys.pub（密钥ID为default）
+        if keyring is None:
+            if public_key is not None:
+                keyring = Keyring(keys={DEFAULT_KEY_ID: public_key})
+            else:
+                keyring = Keyring(
+                    config.auth_keys_dir,
+                    legacy_path=os.path.join(os.path.dirname(__file__), 'api_keys.pub'),
+                    reload_interval=config.auth_keys_reload_interval
+                )
+        self.keyring = keyring
+        self.default_key_id = config.auth_default_key_id
+        
+        self.timestamp_window = config.auth_timestamp_window if timestamp_window is None else timestamp_window
+        self.require_nonce = config.auth_require_nonce if require_nonce is None else require_nonce
+        
+        if signature_cache is None and config.signature_cache_size > 0:
+            signature_cache = SignatureCache(config.signature_cache_size, config.signature_cache_ttl)
+        self.signature_cache = signature_cache
+        
+        if nonce_store is None:
+            nonce_store = NonceStore(config.auth_nonce_store_size, config.auth_nonce_store_path)
+        self.nonce_store = nonce_store
     
-    def verify_signature(self, data, signature):
+    def verify_signature(self, data, signature, key_id=None):
         """
-        验证签名
+        验证签名（结果按 (公钥, 数据, 签名) 缓存）
         
         Args:
             data: 原始数据字符串
             signature: base64编码的签名
+            key_id: 密钥ID，为空时使用AUTH_DEFAULT_KEY_ID
             
         Returns:
             bool: 验证是否成功
         """
+        entry = self.keyring.get(key_id or self.default_key_id)
+        if entry is None:
+            return False
+        
+        key = None
+        if self.signature_cache is not None:
+            key = SignatureCache.make_key(data, signature, entry['fingerprint'])
+            cached = self.signature_cache.get(key)
+            if cached is not None:
+                return cached
+        
         try:
             # 解码签名
             signature_bytes = base64.b64decode(signature)
             
             # 验证签名
-            self.public_key.verify(
-                signature_bytes,
-                data.encode('utf-8'),
-                padding.PKCS1v15(),
-                hashes.SHA256()
-            )
-            return True
+            verify_with_key(entry['key'], signature_bytes, data.encode('utf-8'))
+            valid = True
         except (InvalidSignature, ValueError, TypeError):
-            return False
+            valid = False
+        
+        if key is not None:
+            self.signature_cache.set(key, valid)
+        return valid
     
-    def generate_auth_headers(self, data, private_key_path):
+    def authenticate(self, data, signature, key_id=None):
+        """
+        校验认证数据: 时间戳窗口 -> 签名 -> nonce（签名通过后才记录nonce，伪造请求无法占用nonce）
+        
+        Args:
+            data: 认证数据（X-Auth-Data）
+            signature: base64编码的签名（X-Auth-Signature）
+            key_id: 密钥ID（X-Auth-Key-Id），为空时使用AUTH_DEFAULT_KEY_ID
+        
+        Returns:
+            str: 校验失败的原因，成功返回None
+
+        Raises:
+            NonceStoreFullError: nonce记录已满，无法确认是否重放
+        """
+        parsed = parse_auth_data(data)
+        if self.timestamp_window > 0:
+            if parsed is None:
+                return '认证数据格式错误，应为 "时间戳" 或 "时间戳:nonce"'
+            if abs(time.time() - parsed[0]) > self.timestamp_window:
+                return '认证数据已过期，请使用当前时间戳重新签名'
+        
+        nonce = parsed[1] if parsed else None
+        if self.require_nonce and nonce is None:
+            return '认证数据缺少nonce'
+        
+        if self.keyring.get(key_id or self.default_key_id) is None:
+            return '未知的密钥ID'
+        if not self.verify_signature(data, signature, key_id):
+            return '签名验证失败'
+        
+        if nonce is not None:
+            # 记录到时间戳过期为止；不校验时间戳时永久记录
+            expires_at = parsed[0] + self.timestamp_window if self.timestamp_window > 0 else float('inf')
+            if not self.nonce_store.add(nonce, expires_at):
+                return '认证数据已使用（重放请求）'
+        
+        return None
+    
+    def stats(self) -> dict:
+        """获取鉴权统计信息"""
+        return {
+            'timestamp_window': self.timestamp_window,
+            'require_nonce': self.require_nonce,
+            'signature_cache': self.signature_cache.stats() if self.signature_cache else None,
+            'nonce_store': self.nonce_store.stats(),
+            'keyring': self.keyring.stats()
+        }
+    
+    def generate_auth_headers(self, data, private_key_path, key_id=None):
         """
         生成认证头（用于客户端测试）
         
         Args:
-            data: 要签名的数据
-            private_key_path: 私钥路径
-            
+            data: 要签名的数据，为None时使用当前时间戳和随机nonce
+            private_key_path: 私钥路径（OpenSSH格式的RSA或Ed25519私钥）
+            key_id: 密钥ID，为空时不带 X-Auth-Key-Id（使用服务器的默认密钥）
+        
         Returns:
             dict: 包含认证头的字典
         """
+        if data is None:
+            data = make_auth_data()
+        
         # 加载私钥
         with open(private_key_path, 'rb') as f:
             private_key = serialization.load_ssh_private_key(f.read(), password=None)
         
         # 生成签名
-        signature = private_key.sign(
-            data.encode('utf-8'),
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
+        signature = sign_with_key(private_key, data.encode('utf-8'))
         
         # Base64编码签名
         signature_b64 = base64.b64encode(signature).decode('utf-8')
         
-        return {
+        headers = {
             'X-Auth-Data': data,
             'X-Auth-Signature': signature_b64
         }
+        if key_id:
+            headers['X-Auth-Key-Id'] = key_id
+        return headers
 
 
 # 全局认证工具实例
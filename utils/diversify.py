@@ -0,0 +1,78 @@
+"""
+搜索结果多样化
+对超额召回的候选向量做最大边际相关（MMR）重排，并折叠与已选结果过于相似的近重复候选，
+全部在候选矩阵上用NumPy向量化计算（相似度统一按余弦计算，与索引的度量类型无关）
+"""
+from typing import List, Optional
+import numpy as np
+
+
+def _normalize(matrix):
+    """按行归一化为单位向量"""
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+def mmr_select(query, vectors, count: int, lambda_mult: float = 0.7,
+               duplicate_threshold: Optional[float] = None) -> List[int]:
+    """
+    最大边际相关选择: score = λ·sim(q, d) - (1-λ)·max sim(d, 已选)
+
+    Args:
+        query: 查询向量
+        vectors: 候选向量矩阵 (n, dim)
+        count: 最多选出的数量
+        lambda_mult: 相关性权重，1为按相关性排序，0为只考虑多样性
+        duplicate_threshold: 与任一已选结果的余弦相似度超过该值的候选直接丢弃，None表示不折叠
+
+    Returns:
+        List[int]: 按选择顺序排列的候选下标
+    """
+    candidates = _normalize(np.asarray(vectors, dtype=np.float32))
+    total = len(candidates)
+    if total == 0 or count <= 0:
+        return []
+
+    relevance = candidates @ _normalize(np.asarray(query, dtype=np.float32))
+
+    # 只计算已选结果与全部候选的相似度（k次矩阵向量乘，不构造 n×n 相似度矩阵）
+    # 第一条直接取最相关的候选，之后逐条更新与已选集合的最大相似度
+    selected = [int(np.argmax(relevance))]
+    available = np.ones(total, dtype=bool)
+    similarity = candidates @ candidates[selected[0]]
+    max_similarity = similarity
+    relevance_part = lambda_mult * relevance
+    while True:
+        available[selected[-1]] = False
+        if duplicate_threshold is not None:
+            available &= similarity <= duplicate_threshold
+        if len(selected) >= count or not available.any():
+            break
+
+        scores = np.where(available, relevance_part - (1 - lambda_mult) * max_similarity, -np.inf)
+        index = int(np.argmax(scores))
+        selected.append(index)
+        similarity = candidates @ candidates[index]
+        max_similarity = np.maximum(max_similarity, similarity)
+
+    return selected
+
+
+def diversify_results(query, results: List[dict], count: int, lambda_mult: float = 0.7,
+                      duplicate_threshold: Optional[float] = None) -> List[dict]:
+    """
+    对带向量的搜索结果做MMR重排和近重复折叠
+
+    Args:
+        query: 查询向量
+        results: 搜索结果，条目需包含 vector（search_vectors的with_vectors参数）
+        count: 最多返回的数量
+        lambda_mult: 相关性权重
+        duplicate_threshold: 近重复阈值，None表示不折叠
+
+    Returns:
+        List[dict]: 重排后的结果
+    """
+    if not results:
+        return []
+    vectors = np.stack([item['vector'] for item in results])
+    return [results[index] for index in mmr_select(query, vectors, count, lambda_mult, duplicate_threshold)]
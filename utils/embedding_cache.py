@@ -0,0 +1,192 @@
+"""
+嵌入向量缓存
+内存LRU + 可选SQLite磁盘层，键为 (模型名@版本, 规范化文本的哈希)，多个模型及同一模型的不同版本互不影响
+"""
+import array
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+from utils.env_config import get_env_config
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本: NFKC + 去除首尾空白 + 合并连续空白"""
+    text = unicodedata.normalize('NFKC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def text_hash(text: str) -> str:
+    """计算规范化文本的SHA-256哈希"""
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def model_cache_key(model: str, version: Optional[str] = None) -> str:
+    """
+    缓存中的模型键: 模型名@版本
+    同名模型重新嵌入为新版本（reembed_collection --model-version）后，旧权重的向量不会被新集合的查询命中
+    """
+    return f"{model}@{version}" if version else model
+
+
+# 磁盘缓存格式: 向量来自 /api/embed（L2归一化），模型键带版本，格式不同的旧缓存在打开时清空
+CACHE_FORMAT = 'embed-versioned'
+
+
+class EmbeddingCache:
+    """嵌入向量缓存类"""
+
+    def __init__(self, max_size: int = 10000, db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        """打开磁盘缓存数据库"""
+        try:
+            directory = os.path.dirname(db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                'model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, '
+                'PRIMARY KEY (model, hash))'
+            )
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)'
+            )
+            self._db.commit()
+
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+            if (row[0] if row else None) != CACHE_FORMAT:
+                self._db.execute('DELETE FROM embeddings')
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('format', ?)", (CACHE_FORMAT,)
+                )
+                self._db.commit()
+            print(f"✅ 嵌入缓存磁盘层已启用: {db_path}")
+        except Exception as e:
+            print(f"❌ 嵌入缓存磁盘层初始化失败: {e}")
+            self._db = None
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        """
+        查询缓存
+
+        Args:
+            text: 原始文本
+            model: 模型键（model_cache_key）
+
+        Returns:
+            List[float]: 命中时返回嵌入向量，否则返回None
+        """
+        digest = text_hash(text)
+        key = (model, digest)
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return list(vector)
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        'SELECT vector FROM embeddings WHERE model = ? AND hash = ?', (model, digest)
+                    ).fetchone()
+                except Exception as e:
+                    print(f"❌ 读取嵌入缓存失败: {e}")
+                    row = None
+
+                if row:
+                    vector = array.array('f')
+                    vector.frombytes(row[0])
+                    self._put_memory(key, vector)
+                    self.hits += 1
+                    return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def set(self, text: str, model: str, embedding: List[float]):
+        """写入缓存"""
+        digest = text_hash(text)
+        vector = array.array('f', embedding)
+
+        with self._lock:
+            self._put_memory((model, digest), vector)
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)',
+                        (model, digest, vector.tobytes())
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"❌ 写入嵌入缓存失败: {e}")
+
+    def _put_memory(self, key, vector):
+        """写入内存层并按LRU淘汰（调用方需持有锁）"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """清空所有缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM embeddings')
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'memory_size': len(self._memory),
+                'max_size': self.max_size,
+                'disk_enabled': self._db is not None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# 全局嵌入缓存实例（延迟创建）
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """获取嵌入缓存实例，未启用时返回None"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                config = get_env_config()
+                if config.embedding_cache_size <= 0:
+                    return None
+                _embedding_cache = EmbeddingCache(
+                    max_size=config.embedding_cache_size,
+                    db_path=config.embedding_cache_path or None
+                )
+    return _embedding_cache
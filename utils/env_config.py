@@ -4,10 +4,46 @@
 """
 import os
 import sys
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 
 
+# 各向量索引类型的默认构建参数和搜索参数
+VECTOR_INDEX_DEFAULTS = {
+    'FLAT': ({}, {}),
+    'IVF_FLAT': ({'nlist': 128}, {'nprobe': 10}),
+    'IVF_SQ8': ({'nlist': 128}, {'nprobe': 10}),
+    'IVF_PQ': ({'nlist': 128, 'm': 8, 'nbits': 8}, {'nprobe': 10}),
+    'HNSW': ({'M': 16, 'efConstruction': 200}, {'ef': 64}),
+    'AUTOINDEX': ({}, {}),
+}
+
+VECTOR_METRIC_TYPES = ('L2', 'IP', 'COSINE')
+
+# 向量存储精度及每维字节数
+VECTOR_PRECISION_BYTES = {
+    'float32': 4,
+    'float16': 2,
+}
+
+
+def _load_json_dict(var_name):
+    """读取JSON对象格式的环境变量，未设置或格式错误时返回None"""
+    raw = os.getenv(var_name, '').strip()
+    if not raw:
+        return None
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        print(f"⚠️  环境变量 {var_name} 不是合法的JSON，使用默认值")
+        return None
+    if not isinstance(value, dict):
+        print(f"⚠️  环境变量 {var_name} 必须是JSON对象，使用默认值")
+        return None
+    return value
+
+
 class EnvConfig:
     """环境变量配置类"""
     
@@ -72,12 +108,91 @@ class EnvConfig:
         return os.getenv('JWT_SECRET_KEY', 'default_secret_key')
     
     @property
-    def jwt_expire_hours(self):
-        """JWT过期时间（小时）"""
+    def jwt_access_expire_minutes(self):
+        """访问token（JWT）过期时间（分钟），过期后客户端用refresh token换取新token"""
+        try:
+            return max(1, int(os.getenv('JWT_ACCESS_EXPIRE_MINUTES', '120')))
+        except ValueError:
+            return 120  # 默认2小时
+    
+    @property
+    def jwt_refresh_expire_days(self):
+        """refresh token过期时间（天），每次刷新重新计时，活跃用户无需重新走微信登录"""
+        try:
+            return max(1, int(os.getenv('JWT_REFRESH_EXPIRE_DAYS', '30')))
+        except ValueError:
+            return 30
+    
+    @property
+    def jwt_cache_size(self):
+        """已验证JWT缓存最大条目数（条目在token过期时刻失效），0表示禁用"""
+        try:
+            return max(0, int(os.getenv('JWT_CACHE_SIZE', '10000')))
+        except ValueError:
+            return 10000
+    
+    @property
+    def auth_keys_dir(self):
+        """API签名公钥目录（*.pub / *.pem，文件名即密钥ID），为空表示只使用 utils/api_keys.pub"""
+        return os.getenv('AUTH_KEYS_DIR', '').strip() or None
+    
+    @property
+    def auth_default_key_id(self):
+        """请求未携带 X-Auth-Key-Id 时使用的密钥ID（utils/api_keys.pub 的密钥ID为default）"""
+        return os.getenv('AUTH_DEFAULT_KEY_ID', 'default').strip() or 'default'
+    
+    @property
+    def auth_keys_reload_interval(self):
+        """检查公钥目录变化的间隔（秒），0表示每次验签前都检查"""
+        try:
+            return max(0.0, float(os.getenv('AUTH_KEYS_RELOAD_INTERVAL', '5')))
+        except ValueError:
+            return 5.0
+    
+    @property
+    def auth_timestamp_window(self):
+        """
+        签名认证数据中时间戳的有效窗口（秒），0表示不校验时间戳（默认，兼容签名其他数据的旧客户端）
+        客户端都改为签名 "时间戳:nonce" 后再开启
+        """
+        try:
+            return max(0, int(os.getenv('AUTH_TIMESTAMP_WINDOW', '0')))
+        except ValueError:
+            return 0
+    
+    @property
+    def auth_require_nonce(self):
+        """签名认证数据是否必须带一次性nonce（不带nonce的认证头在有效窗口内可重复使用）"""
+        return os.getenv('AUTH_REQUIRE_NONCE', 'False').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def auth_nonce_store_path(self):
+        """已使用nonce的SQLite存储路径（多进程部署共享），为空表示只在进程内存中记录"""
+        return os.getenv('AUTH_NONCE_STORE_PATH', '').strip() or None
+    
+    @property
+    def auth_nonce_store_size(self):
+        """进程内存中最多记录的nonce数（应大于有效窗口内的请求数，记录满时拒绝新的nonce）"""
+        try:
+            return max(1, int(os.getenv('AUTH_NONCE_STORE_SIZE', '100000')))
+        except ValueError:
+            return 100000
+    
+    @property
+    def signature_cache_size(self):
+        """签名验证结果缓存最大条目数，0表示禁用"""
         try:
-            return int(os.getenv('JWT_EXPIRE_HOURS', '168'))
+            return max(0, int(os.getenv('SIGNATURE_CACHE_SIZE', '1024')))
         except ValueError:
-            return 168  # 默认7天
+            return 1024
+    
+    @property
+    def signature_cache_ttl(self):
+        """签名验证结果缓存有效期（秒）"""
+        try:
+            return max(0.0, float(os.getenv('SIGNATURE_CACHE_TTL', '300')))
+        except ValueError:
+            return 300.0
     
     @property
     def django_secret_key(self):
@@ -95,13 +210,379 @@ class EnvConfig:
         hosts_str = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1')
         return [host.strip() for host in hosts_str.split(',') if host.strip()]
     
+    @property
+    def embedding_batch_size(self):
+        """批量嵌入/插入时每批的文本数量"""
+        try:
+            return max(1, int(os.getenv('EMBEDDING_BATCH_SIZE', '64')))
+        except ValueError:
+            return 64
+    
+    @property
+    def bulk_insert_max_items(self):
+        """批量插入接口单次请求允许的最大文本数量"""
+        try:
+            return max(1, int(os.getenv('BULK_INSERT_MAX_ITEMS', '5000')))
+        except ValueError:
+            return 5000
+    
+    @property
+    def embedding_model(self):
+        """嵌入模型名称（新建集合时使用，已有集合以模型登记中记录的模型为准）"""
+        return os.getenv('EMBEDDING_MODEL', 'chroma/all-minilm-l6-v2-f32').strip()
+    
+    @property
+    def embedding_model_version(self):
+        """嵌入模型版本标识（同名模型更新权重后修改，用于区分需要重新嵌入的数据）"""
+        return os.getenv('EMBEDDING_MODEL_VERSION', '1').strip()
+    
+    @property
+    def model_registry_path(self):
+        """模型登记文件路径（记录各集合的嵌入模型及当前活动集合）"""
+        return os.getenv('MODEL_REGISTRY_PATH', './milvus_data/model_registry.json')
+    
+    @property
+    def reembed_rate(self):
+        """重新嵌入任务的速率上限（条/秒），避免占满Ollama"""
+        try:
+            return max(0.1, float(os.getenv('REEMBED_RATE', '20')))
+        except ValueError:
+            return 20.0
+    
+    @property
+    def embedding_cache_size(self):
+        """嵌入缓存内存层最大条目数，0表示禁用缓存"""
+        try:
+            return max(0, int(os.getenv('EMBEDDING_CACHE_SIZE', '10000')))
+        except ValueError:
+            return 10000
+    
+    @property
+    def embedding_cache_path(self):
+        """嵌入缓存磁盘层SQLite文件路径，为空表示只使用内存层"""
+        return os.getenv('EMBEDDING_CACHE_PATH', '').strip()
+    
+    @property
+    def ollama_base_url(self):
+        """Ollama服务地址"""
+        return os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+    
+    @property
+    def ollama_connect_timeout(self):
+        """Ollama连接超时（秒）"""
+        try:
+            return float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3'))
+        except ValueError:
+            return 3.0
+    
+    @property
+    def ollama_read_timeout(self):
+        """Ollama读取超时（秒）"""
+        try:
+            return float(os.getenv('OLLAMA_READ_TIMEOUT', '30'))
+        except ValueError:
+            return 30.0
+    
+    @property
+    def ollama_max_retries(self):
+        """Ollama连接错误/5xx时的最大重试次数"""
+        try:
+            return max(0, int(os.getenv('OLLAMA_MAX_RETRIES', '2')))
+        except ValueError:
+            return 2
+    
+    @property
+    def ollama_backoff_base(self):
+        """Ollama重试退避基准时间（秒）"""
+        try:
+            return max(0.0, float(os.getenv('OLLAMA_BACKOFF_BASE', '0.2')))
+        except ValueError:
+            return 0.2
+    
+    @property
+    def ollama_pool_size(self):
+        """Ollama keep-alive连接池大小"""
+        try:
+            return max(1, int(os.getenv('OLLAMA_POOL_SIZE', '16')))
+        except ValueError:
+            return 16
+    
+    @property
+    def ollama_max_concurrency(self):
+        """同时在途的Ollama请求上限"""
+        try:
+            return max(1, int(os.getenv('OLLAMA_MAX_CONCURRENCY', '8')))
+        except ValueError:
+            return 8
+    
+    @property
+    def ollama_acquire_timeout(self):
+        """等待Ollama并发名额的超时时间（秒）"""
+        try:
+            return max(0.0, float(os.getenv('OLLAMA_ACQUIRE_TIMEOUT', '10')))
+        except ValueError:
+            return 10.0
+    
+    @property
+    def search_cache_size(self):
+        """搜索结果缓存最大条目数，0表示禁用"""
+        try:
+            return max(0, int(os.getenv('SEARCH_CACHE_SIZE', '2000')))
+        except ValueError:
+            return 2000
+    
+    @property
+    def search_cache_ttl(self):
+        """搜索结果缓存有效期（秒）"""
+        try:
+            return max(0.0, float(os.getenv('SEARCH_CACHE_TTL', '300')))
+        except ValueError:
+            return 300.0
+    
+    @property
+    def milvus_warmup(self):
+        """服务启动时是否在后台预热Milvus集合"""
+        return os.getenv('MILVUS_WARMUP', 'True').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def milvus_index_type(self):
+        """向量索引类型（FLAT / IVF_FLAT / IVF_SQ8 / IVF_PQ / HNSW / AUTOINDEX）"""
+        index_type = os.getenv('MILVUS_INDEX_TYPE', 'IVF_FLAT').strip().upper()
+        if index_type not in VECTOR_INDEX_DEFAULTS:
+            print(f"⚠️  不支持的索引类型 {index_type}，使用 IVF_FLAT")
+            return 'IVF_FLAT'
+        return index_type
+    
+    @property
+    def milvus_metric_type(self):
+        """向量距离度量（L2 / IP / COSINE）"""
+        metric_type = os.getenv('MILVUS_METRIC_TYPE', 'L2').strip().upper()
+        if metric_type not in VECTOR_METRIC_TYPES:
+            print(f"⚠️  不支持的度量类型 {metric_type}，使用 L2")
+            return 'L2'
+        return metric_type
+    
+    @property
+    def milvus_index_params(self):
+        """索引构建参数（JSON），未配置时使用索引类型的默认值"""
+        params = _load_json_dict('MILVUS_INDEX_PARAMS')
+        if params is None:
+            params = dict(VECTOR_INDEX_DEFAULTS[self.milvus_index_type][0])
+        return params
+    
+    @property
+    def milvus_search_params(self):
+        """搜索参数（JSON），未配置时使用索引类型的默认值"""
+        params = _load_json_dict('MILVUS_SEARCH_PARAMS')
+        if params is None:
+            params = dict(VECTOR_INDEX_DEFAULTS[self.milvus_index_type][1])
+        return params
+    
+    @property
+    def milvus_partition_by_community(self):
+        """是否按社区ID分区存储（需独立部署的Milvus，Milvus Lite不支持分区时自动改用标量过滤）"""
+        return os.getenv('MILVUS_PARTITION_BY_COMMUNITY', 'False').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def milvus_preload_partitions(self):
+        """启动时加载的社区ID列表（逗号分隔），为空表示加载全部分区；其余分区在搜索时按需加载"""
+        value = os.getenv('MILVUS_PRELOAD_PARTITIONS', '')
+        return [item.strip() for item in value.split(',') if item.strip()]
+    
+    @property
+    def milvus_max_partitions(self):
+        """每个集合最多创建的分区数（含默认分区，Milvus默认上限1024），达到后新社区写入默认分区"""
+        try:
+            return max(1, int(os.getenv('MILVUS_MAX_PARTITIONS', '1024')))
+        except ValueError:
+            return 1024
+    
+    @property
+    def search_batch_max_queries(self):
+        """批量搜索接口单次请求允许的最大查询数"""
+        try:
+            return max(1, int(os.getenv('SEARCH_BATCH_MAX_QUERIES', '20')))
+        except ValueError:
+            return 20
+    
+    @property
+    def vector_backend(self):
+        """向量存储后端: milvus（默认）或 numpy（进程内精确搜索）"""
+        backend = os.getenv('VECTOR_BACKEND', 'milvus').strip().lower()
+        if backend not in ('milvus', 'numpy'):
+            print(f"⚠️  不支持的向量后端 {backend}，使用 milvus")
+            return 'milvus'
+        return backend
+    
+    @property
+    def vector_fallback(self):
+        """Milvus不可用时是否自动使用NumPy存储兜底（写入会同时镜像到NumPy存储）"""
+        return os.getenv('VECTOR_FALLBACK', 'False').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def numpy_store_dir(self):
+        """NumPy向量存储的数据目录"""
+        return os.getenv('NUMPY_STORE_DIR', './numpy_data')
+    
+    @property
+    def write_behind_enabled(self):
+        """是否启用写后缓冲（插入先入队，由后台线程批量写入）"""
+        return os.getenv('WRITE_BEHIND_ENABLED', 'False').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def write_behind_max_rows(self):
+        """写后缓冲攒够多少条立即刷新"""
+        try:
+            return max(1, int(os.getenv('WRITE_BEHIND_MAX_ROWS', '256')))
+        except ValueError:
+            return 256
+    
+    @property
+    def write_behind_max_delay_ms(self):
+        """写后缓冲最长等待时间（毫秒）"""
+        try:
+            return max(1, int(os.getenv('WRITE_BEHIND_MAX_DELAY_MS', '50')))
+        except ValueError:
+            return 50
+    
+    @property
+    def write_behind_capacity(self):
+        """写后缓冲容量，满时新的插入请求阻塞等待"""
+        try:
+            return max(1, int(os.getenv('WRITE_BEHIND_CAPACITY', '10000')))
+        except ValueError:
+            return 10000
+    
+    @property
+    def write_behind_submit_timeout(self):
+        """缓冲区满时插入请求最多等待的秒数"""
+        try:
+            return max(0.0, float(os.getenv('WRITE_BEHIND_SUBMIT_TIMEOUT', '5')))
+        except ValueError:
+            return 5.0
+    
+    @property
+    def write_behind_result_timeout(self):
+        """插入请求等待缓冲刷新的最长秒数，超时返回202（数据仍会写入）"""
+        try:
+            return max(0.0, float(os.getenv('WRITE_BEHIND_RESULT_TIMEOUT', '2')))
+        except ValueError:
+            return 2.0
+    
+    @property
+    def dedup_policy(self):
+        """
+        重复文本的插入策略
+        skip: 直接返回已有ID（默认）；update: 更新已有数据的元数据；insert: 总是插入
+        """
+        policy = os.getenv('DEDUP_POLICY', 'skip').strip().lower()
+        if policy not in ('skip', 'update', 'insert'):
+            print(f"⚠️  不支持的去重策略 {policy}，使用 skip")
+            return 'skip'
+        return policy
+    
+    @property
+    def chunk_max_chars(self):
+        """长文档分块时每块的最大字符数（不能超过content字段的1000字符上限）"""
+        try:
+            return min(1000, max(50, int(os.getenv('CHUNK_MAX_CHARS', '500'))))
+        except ValueError:
+            return 500
+    
+    @property
+    def chunk_overlap_chars(self):
+        """相邻分块之间的最大重叠字符数"""
+        try:
+            return max(0, int(os.getenv('CHUNK_OVERLAP_CHARS', '80')))
+        except ValueError:
+            return 80
+    
+    @property
+    def chunk_search_overfetch(self):
+        """搜索时按文档折叠前的超额召回倍数"""
+        try:
+            return max(1, int(os.getenv('CHUNK_SEARCH_OVERFETCH', '3')))
+        except ValueError:
+            return 3
+    
+    @property
+    def lexical_index_enabled(self):
+        """是否维护词法索引（混合搜索需要）"""
+        return os.getenv('LEXICAL_INDEX_ENABLED', 'True').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def lexical_index_path(self):
+        """词法索引SQLite文件路径"""
+        return os.getenv('LEXICAL_INDEX_PATH', './milvus_data/lexical.db')
+    
+    @property
+    def search_mode(self):
+        """默认搜索模式: vector（仅向量）或 hybrid（词法+向量，RRF融合）"""
+        mode = os.getenv('SEARCH_MODE', 'vector').strip().lower()
+        return mode if mode in ('vector', 'hybrid') else 'vector'
+    
+    @property
+    def rrf_k(self):
+        """倒数排名融合的平滑常数k"""
+        try:
+            return max(1, int(os.getenv('RRF_K', '60')))
+        except ValueError:
+            return 60
+    
+    @property
+    def vector_precision(self):
+        """向量存储精度（float32 / float16），float16内存占用减半"""
+        precision = os.getenv('VECTOR_PRECISION', 'float32').strip().lower()
+        if precision not in VECTOR_PRECISION_BYTES:
+            print(f"⚠️  不支持的向量精度 {precision}，使用 float32")
+            return 'float32'
+        return precision
+    
+    @property
+    def search_max_limit(self):
+        """单次搜索返回数量上限（请求中的limit超过时被截断）"""
+        try:
+            return max(1, int(os.getenv('SEARCH_MAX_LIMIT', '50')))
+        except ValueError:
+            return 50
+    
+    @property
+    def search_max_window(self):
+        """分页搜索时 offset + limit 的上限（限制深翻页的召回开销）"""
+        try:
+            return max(1, int(os.getenv('SEARCH_MAX_WINDOW', '200')))
+        except ValueError:
+            return 200
+    
+    @property
+    def search_diversify(self):
+        """搜索结果是否默认做MMR多样化和近重复折叠（请求中的diversify参数优先）"""
+        return os.getenv('SEARCH_DIVERSIFY', 'False').lower() in ('true', '1', 'yes', 'on')
+    
+    @property
+    def mmr_lambda(self):
+        """MMR相关性权重（0~1，越大越偏向相关性，越小越偏向多样性）"""
+        try:
+            return min(1.0, max(0.0, float(os.getenv('MMR_LAMBDA', '0.7'))))
+        except ValueError:
+            return 0.7
+    
+    @property
+    def near_duplicate_threshold(self):
+        """近重复阈值：与已选结果的余弦相似度超过该值的候选被折叠"""
+        try:
+            return float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.95'))
+        except ValueError:
+            return 0.95
+    
     def get_env_info(self):
         """获取环境变量信息（用于调试）"""
         return {
             'wx_appid': self.wx_appid[:10] + '...' if len(self.wx_appid) > 10 else self.wx_appid,
             'wx_secret': '***' if self.wx_secret else '',
             'jwt_secret_key': '***' if self.jwt_secret_key else '',
-            'jwt_expire_hours': self.jwt_expire_hours,
+            'jwt_access_expire_minutes': self.jwt_access_expire_minutes,
+            'jwt_refresh_expire_days': self.jwt_refresh_expire_days,
             'debug': self.debug,
             'allowed_hosts': self.allowed_hosts
         }
@@ -130,5 +611,7 @@ def get_jwt_config():
     config = get_env_config()
     return {
         'secret_key': config.jwt_secret_key,
-        'expire_hours': config.jwt_expire_hours
+        'access_expire_minutes': config.jwt_access_expire_minutes,
+        'refresh_expire_days': config.jwt_refresh_expire_days,
+        'cache_size': config.jwt_cache_size
     }
@@ -0,0 +1,208 @@
+"""
+API签名公钥密钥环
+从目录加载多把公钥（RSA / Ed25519，OpenSSH或PEM格式），文件名（去掉 .pub / .pem）即密钥ID，
+请求通过 X-Auth-Key-Id 选择验签公钥。按间隔检查目录，只重新解析新增或修改过的文件，
+收到 SIGHUP 时在下一次验签前重新解析全部文件，轮换密钥无需重启
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, padding, rsa
+
+
+# 未指定密钥ID的请求使用的密钥（兼容单个 utils/api_keys.pub 的部署）
+DEFAULT_KEY_ID = 'default'
+
+# 密钥文件扩展名和密钥ID格式
+KEY_FILE_SUFFIXES = ('.pub', '.pem')
+KEY_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+
+def load_public_key(content: bytes):
+    """
+    解析公钥文件内容（OpenSSH单行格式或PEM格式）
+
+    Raises:
+        ValueError: 格式错误或密钥类型不受支持
+    """
+    content = content.strip()
+    if content.startswith(b'-----BEGIN'):
+        key = serialization.load_pem_public_key(content)
+    else:
+        key = serialization.load_ssh_public_key(content.split(b'\n', 1)[0])
+    if not isinstance(key, (rsa.RSAPublicKey, ed25519.Ed25519PublicKey)):
+        raise ValueError(f'不支持的密钥类型 {type(key).__name__}，只支持RSA和Ed25519')
+    return key
+
+
+def key_type(key) -> str:
+    """密钥类型名称（rsa-2048 / ed25519）"""
+    if isinstance(key, ed25519.Ed25519PublicKey):
+        return 'ed25519'
+    return f'rsa-{key.key_size}'
+
+
+def key_fingerprint(key) -> str:
+    """公钥指纹（SubjectPublicKeyInfo的SHA-256前16位），密钥文件内容变化时随之变化"""
+    der = key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+def verify_with_key(key, signature: bytes, data: bytes):
+    """
+    按密钥类型验签: RSA使用PKCS1v15 + SHA-256，Ed25519直接验签
+
+    Raises:
+        InvalidSignature: 签名无效
+    """
+    if isinstance(key, ed25519.Ed25519PublicKey):
+        key.verify(signature, data)
+    else:
+        key.verify(signature, data, padding.PKCS1v15(), hashes.SHA256())
+
+
+def sign_with_key(private_key, data: bytes) -> bytes:
+    """按私钥类型签名（客户端测试和基准测试使用）"""
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return private_key.sign(data)
+    return private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+
+class Keyring:
+    """
+    公钥密钥环类
+
+    每个条目为 {'key': 公钥, 'type': 类型, 'fingerprint': 指纹, 'path': 文件路径, 'file_key': 文件状态}，
+    文件状态 (inode, mtime, size) 不变的文件不会重新解析
+    """
+
+    def __init__(self, keys_dir: Optional[str] = None, legacy_path: Optional[str] = None,
+                 reload_interval: float = 5.0, keys: Optional[Dict[str, object]] = None):
+        """
+        Args:
+            keys_dir: 公钥目录
+            legacy_path: 单个公钥文件（密钥ID为default，目录中有同名密钥时以目录为准）
+            reload_interval: 检查目录变化的间隔（秒），0表示每次验签前都检查
+            keys: 固定的 {密钥ID: 公钥}（不从文件加载，用于测试）
+        """
+        self.keys_dir = keys_dir
+        self.legacy_path = legacy_path
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._reload_requested = False
+        self._static = keys is not None
+
+        if self._static:
+            self._entries = {
+                key_id: {'key': key, 'type': key_type(key), 'fingerprint': key_fingerprint(key),
+                         'path': None, 'file_key': None}
+                for key_id, key in keys.items()
+            }
+        elif not self.reload():
+            print("⚠️  未加载任何API签名公钥，签名认证将全部失败")
+
+    def request_reload(self):
+        """请求在下一次查询密钥前重新解析全部密钥文件（只设置标志，可在信号处理函数中调用）"""
+        self._reload_requested = True
+
+    def get(self, key_id: str) -> Optional[dict]:
+        """按密钥ID获取条目，不存在时返回None"""
+        if not self._static and self._reload_due():
+            with self._lock:
+                # 等待锁期间其他线程可能已完成检查
+                if self._reload_due():
+                    self._reload_locked(force=self._reload_requested)
+        return self._entries.get(key_id)
+
+    def _reload_due(self) -> bool:
+        """是否需要重新检查密钥文件"""
+        return self._reload_requested or time.monotonic() - self._checked_at >= self.reload_interval
+
+    def _key_files(self):
+        """当前应加载的 {密钥ID: 文件路径}"""
+        files = {}
+        if self.legacy_path and os.path.isfile(self.legacy_path):
+            files[DEFAULT_KEY_ID] = self.legacy_path
+        if self.keys_dir and os.path.isdir(self.keys_dir):
+            for entry in os.scandir(self.keys_dir):
+                key_id, suffix = os.path.splitext(entry.name)
+                if suffix in KEY_FILE_SUFFIXES and KEY_ID_PATTERN.fullmatch(key_id) and entry.is_file():
+                    files[key_id] = entry.path
+        return files
+
+    def reload(self, force: bool = True) -> int:
+        """
+        检查密钥文件: 新增或修改的文件（force时为全部文件）重新解析，删除的文件移除对应密钥；
+        解析失败的文件保留原有密钥（可能正在写入），下一次检查时重试
+
+        Returns:
+            int: 当前密钥数量
+        """
+        if self._static:
+            return len(self._entries)
+        with self._lock:
+            return self._reload_locked(force)
+
+    def _reload_locked(self, force=False) -> int:
+        """重新检查密钥文件（调用方需持有锁）"""
+        self._reload_requested = False
+        self._checked_at = time.monotonic()
+
+        entries = {}
+        changed = False
+        for key_id, path in self._key_files().items():
+            old = self._entries.get(key_id)
+            try:
+                stat = os.stat(path)
+                file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if not force and old is not None and old['path'] == path and old['file_key'] == file_key:
+                    entries[key_id] = old
+                    continue
+                with open(path, 'rb') as f:
+                    key = load_public_key(f.read())
+            except (OSError, ValueError) as e:
+                print(f"❌ 加载公钥 {path} 失败: {e}")
+                if old is not None:
+                    entries[key_id] = old
+                continue
+
+            entries[key_id] = {
+                'key': key, 'type': key_type(key), 'fingerprint': key_fingerprint(key),
+                'path': path, 'file_key': file_key
+            }
+            if old is not None and old['fingerprint'] == entries[key_id]['fingerprint']:
+                continue
+            changed = True
+            action = '更新' if old is not None else '加载'
+            print(f"🔑 {action}公钥 {key_id} ({entries[key_id]['type']}, {entries[key_id]['fingerprint']})")
+
+        for key_id in self._entries.keys() - entries.keys():
+            changed = True
+            print(f"🔑 移除公钥 {key_id}")
+        if changed:
+            self.reloads += 1
+            if not entries:
+                print("⚠️  未加载任何API签名公钥，签名认证将全部失败")
+
+        self._entries = entries
+        return len(entries)
+
+    def stats(self) -> dict:
+        """获取密钥环信息（不含公钥内容）"""
+        with self._lock:
+            return {
+                'keys_dir': self.keys_dir,
+                'reload_interval': self.reload_interval,
+                'reloads': self.reloads,
+                'keys': [
+                    {'id': key_id, 'type': entry['type'], 'fingerprint': entry['fingerprint']}
+                    for key_id, entry in sorted(self._entries.items())
+                ]
+            }
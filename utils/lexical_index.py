@@ -0,0 +1,258 @@
+"""
+词法索引（SQLite FTS5）
+中文按相邻字符二元组切分，英文/数字连续串作为整体词元，
+用于补足向量搜索对楼号、电话号码、人名等精确词元不敏感的问题
+"""
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from utils.embedding_cache import normalize_text
+from utils.env_config import get_env_config
+from utils.model_registry import base_collection_name, get_model_registry
+from utils.metadata_fields import STRUCTURED_FIELDS, attribute_columns, to_sql_where
+
+# 英文/数字连续串作为一个单元，其余每个文字字符各为一个单元；标点和空白作为分隔
+_UNIT_PATTERN = re.compile(r'[0-9a-z]+|[^\W\d_a-z]|\W+|_+', re.IGNORECASE)
+
+
+def ngram_tokens(text: str) -> List[str]:
+    """
+    将文本切分为词元：相邻两个单元组成二元组，被分隔开的单个单元单独作为词元
+
+    例如 "3号楼 A座" -> ["3号", "号楼", "3", "a座", "a"]
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        List[str]: 词元列表（可能重复）
+    """
+    tokens = []
+    run = []
+    for match in _UNIT_PATTERN.finditer(normalize_text(text).lower()):
+        unit = match.group()
+        if unit[0].isalnum():
+            run.append(unit)
+            continue
+        tokens.extend(_run_tokens(run))
+        run = []
+    tokens.extend(_run_tokens(run))
+    return tokens
+
+
+def _run_tokens(run):
+    """连续单元序列的二元组，英文/数字串另外单独作为词元（保证单独检索号码时可命中）"""
+    if len(run) == 1:
+        return run
+    tokens = [run[index] + run[index + 1] for index in range(len(run) - 1)]
+    tokens.extend(unit for unit in run if len(unit) > 1 or unit.isascii())
+    return tokens
+
+
+def reciprocal_rank_fusion(result_lists, k: int = 60) -> List[dict]:
+    """
+    倒数排名融合（RRF）：score = Σ 1 / (k + rank)
+
+    Args:
+        result_lists: 多路检索结果，每路按相关度排序，条目需包含 id
+        k: 平滑常数，越大越弱化头部排名的优势
+
+    Returns:
+        List[dict]: 按融合得分排序的结果，条目取首次出现的版本并附加 rrf_score
+    """
+    scores = {}
+    items = {}
+    for results in result_lists:
+        for rank, item in enumerate(results, start=1):
+            scores[item['id']] = scores.get(item['id'], 0.0) + 1.0 / (k + rank)
+            items.setdefault(item['id'], item)
+
+    fused = []
+    for vector_id in sorted(scores, key=scores.get, reverse=True):
+        item = dict(items[vector_id])
+        item['rrf_score'] = scores[vector_id]
+        fused.append(item)
+    return fused
+
+
+class LexicalIndex:
+    """词法索引类，主键与向量存储一致"""
+
+    # 表结构: 分词后的词元 + 原文、文档ID和结构化字段（后者不参与全文检索，仅用于返回和过滤）
+    COLUMNS = ('tokens', 'content', 'doc_id') + STRUCTURED_FIELDS
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            # FTS5虚拟表不支持新增列，旧版本的表直接重建（需执行 rebuild_lexical_index 回填）
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(lexical)')]
+            if columns and columns != list(self.COLUMNS):
+                print("⚠️  词法索引结构已变化，已清空重建，请执行 python manage.py rebuild_lexical_index")
+                self._db.execute('DROP TABLE lexical')
+
+            self._db.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS lexical USING fts5(tokens, '
+                f'{", ".join(f"{name} UNINDEXED" for name in self.COLUMNS[1:])}, '
+                "tokenize = 'unicode61')"
+            )
+
+    def add(self, ids, contents, doc_ids=None, attributes=None) -> bool:
+        """
+        写入或覆盖索引条目
+
+        Args:
+            ids: 向量存储中的主键列表
+            contents: 内容列表
+            doc_ids: 所属文档ID列表，可选
+            attributes: 结构化元数据字典列表，可选
+        """
+        if doc_ids is None:
+            doc_ids = [""] * len(ids)
+        columns = attribute_columns(attributes, len(ids))
+
+        try:
+            rows = [
+                (
+                    int(vector_id), ' '.join(ngram_tokens(content)), content, doc_id or "",
+                    *(columns[name][offset] for name in STRUCTURED_FIELDS)
+                )
+                for offset, (vector_id, content, doc_id) in enumerate(zip(ids, contents, doc_ids))
+            ]
+            with self._lock, self._db:
+                self._db.executemany('DELETE FROM lexical WHERE rowid = ?', [(row[0],) for row in rows])
+                self._db.executemany(
+                    f'INSERT INTO lexical (rowid, {", ".join(self.COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * (len(self.COLUMNS) + 1))})',
+                    rows
+                )
+            return True
+        except Exception as e:
+            print(f"❌ 写入词法索引失败: {e}")
+            return False
+
+    def update_attributes(self, vector_id, attributes) -> bool:
+        """更新索引条目的结构化字段（只更新attributes中出现的字段）"""
+        attributes = {name: value for name, value in attributes.items() if name in STRUCTURED_FIELDS}
+        if not attributes:
+            return True
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    f'UPDATE lexical SET {", ".join(f"{name} = ?" for name in attributes)} WHERE rowid = ?',
+                    (*attributes.values(), int(vector_id))
+                )
+            return True
+        except Exception as e:
+            print(f"❌ 更新词法索引条目失败: {e}")
+            return False
+
+    def remove(self, ids) -> bool:
+        """删除索引条目"""
+        try:
+            with self._lock, self._db:
+                self._db.executemany('DELETE FROM lexical WHERE rowid = ?', [(int(vector_id),) for vector_id in ids])
+            return True
+        except Exception as e:
+            print(f"❌ 删除词法索引条目失败: {e}")
+            return False
+
+    def search(self, text: str, limit: int = 10, filters=None) -> List[dict]:
+        """
+        BM25排序的词法检索，任一词元命中即召回
+
+        Args:
+            text: 查询文本
+            limit: 返回数量
+            filters: parse_filter解析后的过滤条件，与全文匹配在同一条SQL中执行
+
+        Returns:
+            List[dict]: 包含 id、score（BM25，越小越相关）、content、doc_id 和结构化字段的结果列表
+        """
+        tokens = list(dict.fromkeys(ngram_tokens(text)))
+        if not tokens:
+            return []
+
+        query = ' OR '.join('"' + token.replace('"', '""') + '"' for token in tokens)
+        where, params = to_sql_where(filters or [])
+        fields = self.COLUMNS[1:]
+        try:
+            with self._lock:
+                rows = self._db.execute(
+                    f'SELECT rowid, bm25(lexical), {", ".join(fields)} FROM lexical '
+                    f'WHERE lexical MATCH ? {"AND " + where if where else ""} '
+                    'ORDER BY bm25(lexical) LIMIT ?',
+                    (query, *params, limit)
+                ).fetchall()
+        except Exception as e:
+            print(f"❌ 词法检索失败: {e}")
+            return []
+
+        return [
+            {"id": row[0], "score": row[1], **dict(zip(fields, row[2:]))}
+            for row in rows
+        ]
+
+    def clear(self):
+        """清空索引"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM lexical')
+
+    def count(self) -> int:
+        """索引条目数"""
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM lexical').fetchone()[0]
+
+    def stats(self) -> dict:
+        """获取索引统计信息"""
+        return {
+            'path': self.path,
+            'rows': self.count()
+        }
+
+
+_lexical_indexes = {}
+_lexical_index_lock = threading.Lock()
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='lexical-search')
+
+
+def lexical_index_path(collection_name: str) -> str:
+    """集合对应的词法索引文件路径（影子集合在文件名后加集合名，主键与各自的集合一致）"""
+    path = get_env_config().lexical_index_path
+    if collection_name == base_collection_name():
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{collection_name}{ext}"
+
+
+def get_lexical_index(collection_name=None):
+    """获取集合（默认为活动集合）的词法索引实例，未启用时返回None"""
+    config = get_env_config()
+    if not config.lexical_index_enabled:
+        return None
+
+    collection_name = collection_name or get_model_registry().active_collection()
+    lexical_index = _lexical_indexes.get(collection_name)
+    if lexical_index is None:
+        with _lexical_index_lock:
+            lexical_index = _lexical_indexes.get(collection_name)
+            if lexical_index is None:
+                lexical_index = LexicalIndex(lexical_index_path(collection_name))
+                _lexical_indexes[collection_name] = lexical_index
+    return lexical_index
+
+
+def submit_lexical_search(text: str, limit: int, filters=None, collection_name=None):
+    """在后台线程执行集合（默认为活动集合）的词法检索，与向量检索并行；未启用时返回None"""
+    lexical_index = get_lexical_index(collection_name)
+    if lexical_index is None:
+        return None
+    return _search_executor.submit(lexical_index.search, text, limit, filters)
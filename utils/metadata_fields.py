@@ -0,0 +1,220 @@
+"""
+结构化元数据字段与搜索过滤
+常用元数据（分类、社区ID、创建时间、来源）作为独立的标量字段存储，
+搜索过滤条件翻译为Milvus expr / SQLite WHERE 子句，在引擎内先过滤再取top-k
+"""
+import json
+import time
+
+# 字符串字段及最大长度
+STRING_FIELDS = {
+    "category": 64,
+    "community_id": 64,
+    "source": 64,
+}
+
+# 整数字段（created_at 为Unix时间戳，秒）
+INT_FIELDS = ("created_at",)
+
+STRUCTURED_FIELDS = tuple(STRING_FIELDS) + INT_FIELDS
+
+# 单个字段 in 查询的最大取值个数
+MAX_FILTER_VALUES = 100
+
+# 范围比较运算符
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class MissingFieldError(Exception):
+    """集合缺少过滤条件引用的字段（升级前创建的集合，需重建）"""
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        super().__init__(
+            f"集合缺少字段 {', '.join(self.fields)}，请先执行 python manage.py backfill_content_hash 重建集合"
+        )
+
+
+def parse_attributes(data):
+    """
+    从请求参数中提取结构化字段
+
+    Args:
+        data: 请求参数字典
+
+    Returns:
+        dict: 仅包含请求中出现的结构化字段
+
+    Raises:
+        ValueError: 字段类型或长度不合法
+    """
+    attributes = {}
+    for name, max_length in STRING_FIELDS.items():
+        value = data.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, str) or len(value) > max_length:
+            raise ValueError(f"{name}必须为不超过{max_length}个字符的字符串")
+        attributes[name] = value
+
+    for name in INT_FIELDS:
+        value = data.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{name}必须为非负整数")
+        attributes[name] = value
+
+    return attributes
+
+
+def attributes_from_metadata(metadata):
+    """从JSON格式的旧metadata中提取结构化字段（回填旧数据时使用），无法解析时返回空字典"""
+    try:
+        data = json.loads(metadata) if metadata else None
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    try:
+        return parse_attributes(data)
+    except ValueError:
+        return {}
+
+
+def attribute_columns(attributes, count):
+    """
+    将逐行的结构化字段转换为列数据，缺失字段补默认值（created_at默认为当前时间）
+
+    Args:
+        attributes: 结构化字段字典列表，可为None
+        count: 行数
+
+    Returns:
+        dict: {字段名: 列数据}
+    """
+    if attributes is None:
+        attributes = [None] * count
+
+    now = int(time.time())
+    columns = {name: [] for name in STRUCTURED_FIELDS}
+    for item in attributes:
+        item = item or {}
+        for name in STRING_FIELDS:
+            columns[name].append(item.get(name) or "")
+        created_at = item.get("created_at")
+        columns["created_at"].append(int(now if created_at is None else created_at))
+    return columns
+
+
+def with_created_at(attributes, count):
+    """
+    返回补齐created_at的结构化字段列表（同一批数据写入多个存储前调用，保证时间戳一致）
+    """
+    now = int(time.time())
+    filled = []
+    for item in attributes or [None] * count:
+        item = dict(item or {})
+        if item.get("created_at") is None:
+            item["created_at"] = now
+        filled.append(item)
+    return filled
+
+
+def parse_filter(raw):
+    """
+    解析并校验搜索过滤条件
+
+    格式:
+        {
+            "category": "通知",                    # 等值
+            "community_id": ["c1", "c2"],          # 任一取值
+            "created_at": {"gte": 1700000000}      # 范围（gt/gte/lt/lte）
+        }
+
+    Returns:
+        list: [(字段名, 运算符, 取值)]，运算符为 ==、in、>、>=、<、<=；未传过滤条件时返回空列表
+
+    Raises:
+        ValueError: 过滤条件不合法
+    """
+    if raw is None:
+        return []
+    if not isinstance(raw, dict):
+        raise ValueError("filter必须为对象")
+
+    conditions = []
+    for name, value in raw.items():
+        if name in STRING_FIELDS:
+            if isinstance(value, str):
+                conditions.append((name, "==", value))
+            elif (
+                isinstance(value, list) and 0 < len(value) <= MAX_FILTER_VALUES
+                and all(isinstance(item, str) for item in value)
+            ):
+                conditions.append((name, "in", list(value)))
+            else:
+                raise ValueError(f"filter.{name}必须为字符串或不超过{MAX_FILTER_VALUES}个字符串的列表")
+
+        elif name in INT_FIELDS:
+            if isinstance(value, int) and not isinstance(value, bool):
+                conditions.append((name, "==", value))
+            elif isinstance(value, dict) and value and set(value) <= set(RANGE_OPERATORS):
+                for operator, bound in value.items():
+                    if isinstance(bound, bool) or not isinstance(bound, int):
+                        raise ValueError(f"filter.{name}.{operator}必须为整数")
+                    conditions.append((name, RANGE_OPERATORS[operator], bound))
+            else:
+                raise ValueError(f"filter.{name}必须为整数或包含gt/gte/lt/lte的对象")
+
+        else:
+            raise ValueError(f"不支持的过滤字段: {name}")
+
+    return conditions
+
+
+def to_milvus_expr(conditions):
+    """将过滤条件转换为Milvus布尔表达式，无条件时返回空字符串"""
+    clauses = []
+    for name, operator, value in conditions:
+        if operator == "in":
+            clauses.append(f"{name} in {json.dumps(value, ensure_ascii=False)}")
+        else:
+            clauses.append(f"{name} {operator} {json.dumps(value, ensure_ascii=False)}")
+    return " and ".join(clauses)
+
+
+def to_sql_where(conditions):
+    """
+    将过滤条件转换为SQLite WHERE子句（参数化）
+
+    Returns:
+        tuple: (子句, 参数列表)，无条件时子句为空字符串
+    """
+    clauses = []
+    params = []
+    for name, operator, value in conditions:
+        if operator == "in":
+            clauses.append(f"{name} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{name} {operator} ?")
+            params.append(value)
+    return " AND ".join(clauses), params
+
+
+def community_ids(conditions):
+    """
+    过滤条件限定的社区ID列表（用于只搜索对应的分区），未按社区等值/in过滤时返回None
+    """
+    for name, operator, value in conditions:
+        if name == "community_id" and operator == "==":
+            return [value]
+        if name == "community_id" and operator == "in":
+            return list(value)
+    return None
+
+
+def filter_fields(conditions):
+    """过滤条件涉及的字段集合"""
+    return {name for name, _, _ in conditions}
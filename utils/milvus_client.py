@@ -3,165 +3,978 @@ Milvus向量数据库客户端工具
 使用Milvus Lite嵌入式版本
 """
 import os
-from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
+import re
+import json
+import hashlib
+import threading
+import time
+import numpy as np
+from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, Partition, utility
 from django.conf import settings
-from utils.env_config import get_env_config
+from utils.env_config import get_env_config, VECTOR_PRECISION_BYTES
+from utils.search_cache import SearchResultCache, make_search_key
+from utils.embedding_cache import text_hash
+from utils.model_registry import get_model_registry, register_store
+from utils.metadata_fields import (
+    STRING_FIELDS, INT_FIELDS, STRUCTURED_FIELDS,
+    attribute_columns, attributes_from_metadata, to_milvus_expr, filter_fields, MissingFieldError
+)
 
 
 class MilvusClient:
     """Milvus客户端类 - 使用Milvus Lite"""
     
-    def __init__(self):
+    # 需要建立标量索引的字段
+    SCALAR_INDEX_FIELDS = ("content_hash", "doc_id") + STRUCTURED_FIELDS
+    
+    # 向量存储精度对应的字段类型
+    VECTOR_DTYPES = {
+        "float32": DataType.FLOAT_VECTOR,
+        "float16": DataType.FLOAT16_VECTOR,
+    }
+    
+    # 搜索结果中返回的标量字段（旧集合中不存在的字段会被跳过）
+    SEARCH_OUTPUT_FIELDS = ("content", "metadata", "doc_id", "chunk_index") + STRUCTURED_FIELDS
+    
+    # 未指定社区的数据所在的默认分区
+    DEFAULT_PARTITION = "_default"
+    # 分区缺失时从服务端刷新分区列表的最小间隔（秒）
+    PARTITION_REFRESH_INTERVAL = 5
+    # 搜索缓存代数文件超过该大小后替换为新文件
+    GENERATION_FILE_MAX_BYTES = 1 << 20
+    
+    def __init__(self, collection_name=None, vector_dim=None):
+        """
+        Args:
+            collection_name: 集合名，默认为模型登记中的活动集合
+            vector_dim: 向量维度，默认取集合登记的维度，未登记时取 VECTOR_DIMENSION
+        """
         self.env_config = get_env_config()
-        self.collection_name = os.getenv('MILVUS_COLLECTION_NAME', 'zhihui_vectors')
-        self.vector_dim = int(os.getenv('VECTOR_DIMENSION', '384'))
+        registry = get_model_registry()
+        self.collection_name = collection_name or registry.active_collection()
+        info = registry.collection_info(self.collection_name)
+        self.vector_dim = int(vector_dim or (info and info.get('dim')) or os.getenv('VECTOR_DIMENSION', '384'))
         self.collection = None
         self.connected = False
         
-    def connect(self):
-        """连接到Milvus Lite嵌入式数据库"""
+        # 向量索引与搜索配置
+        self.vector_precision = self.env_config.vector_precision
+        self.index_type = self.env_config.milvus_index_type
+        self.metric_type = self.env_config.milvus_metric_type
+        self.index_params = {
+            "metric_type": self.metric_type,
+            "index_type": self.index_type,
+            "params": self.env_config.milvus_index_params
+        }
+        self.search_params = {
+            "metric_type": self.metric_type,
+            "params": self.env_config.milvus_search_params
+        }
+        
+        # 按社区分区: 服务端不支持分区时（Milvus Lite）在ensure_ready中关闭，改用community_id标量过滤
+        self.partitioned = self.env_config.milvus_partition_by_community
+        self._partitions = set()
+        self._partitions_refreshed_at = None
+        self._loaded_partitions = set()
+        self._partition_lock = threading.Lock()
+        
+        # 生命周期状态: 连接/建集合/加载只做一次
+        self._lifecycle_lock = threading.RLock()
+        self._ready = threading.Event()
+        
+        # 搜索结果缓存，写入代数在每次成功插入后递增；同时追加写代数文件，
+        # 同一台机器上其他worker写入后本进程缓存的结果同样失效（跨机器部署时以TTL为准）
+        self._generation = 0
+        self._generation_lock = threading.Lock()
+        self.generation_path = os.path.join(
+            os.path.dirname(self.env_config.model_registry_path) or '.', f"{self.collection_name}.generation"
+        )
+        cache_size = self.env_config.search_cache_size
+        self.search_cache = SearchResultCache(
+            max_size=cache_size,
+            ttl=self.env_config.search_cache_ttl
+        ) if cache_size > 0 else None
+    
+    @property
+    def generation(self):
+        """当前写入代数: (本进程写入次数, 代数文件的inode和大小)"""
         try:
-            # 首先检查是否已经连接
+            stat = os.stat(self.generation_path)
+            shared = (stat.st_ino, stat.st_size)
+        except OSError:
+            shared = None
+        return self._generation, shared
+    
+    def _bump_generation(self):
+        """
+        写入后递增代数，使之前缓存的搜索结果全部失效
+        代数文件以追加方式写入一个字节（追加写在进程间是原子的），文件大小即为各进程共享的写入计数
+        """
+        with self._generation_lock:
+            self._generation += 1
+        try:
+            fd = os.open(self.generation_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
             try:
-                connections.get_connection("default")
-                print("✅ 已经连接到Milvus Lite")
-                self.connected = True
+                os.write(fd, b"+")
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if size >= self.GENERATION_FILE_MAX_BYTES:
+                # 替换为新文件（inode不同，其他进程缓存的结果同样失效）
+                tmp_path = f"{self.generation_path}.{os.getpid()}.tmp"
+                open(tmp_path, "wb").close()
+                os.replace(tmp_path, self.generation_path)
+        except OSError as e:
+            print(f"⚠️  更新搜索缓存代数文件失败: {e}")
+        
+    def connect(self):
+        """连接到Milvus Lite嵌入式数据库（已连接时直接返回）"""
+        if self.connected:
+            return True
+        
+        with self._lifecycle_lock:
+            if self.connected:
                 return True
-            except:
-                pass
             
-            # 使用Milvus Lite嵌入式模式 - 使用文件URI
-            connections.connect(
-                alias="default", 
-                uri="./milvus_data/milvus.db"
-            )
-            print("✅ 成功连接到Milvus Lite嵌入式数据库")
-            self.connected = True
-            return True
-        except Exception as e:
-            print(f"❌ 连接Milvus Lite失败: {e}")
-            # 尝试不同的连接方式
             try:
-                # 尝试使用默认嵌入式连接
-                connections.connect("default")
-                print("✅ 使用默认嵌入式连接成功")
+                # 首先检查是否已经连接
+                if connections.has_connection("default"):
+                    self.connected = True
+                    return True
+                
+                # 使用Milvus Lite嵌入式模式 - 使用文件URI
+                connections.connect(
+                    alias="default", 
+                    uri="./milvus_data/milvus.db"
+                )
+                print("✅ 成功连接到Milvus Lite嵌入式数据库")
                 self.connected = True
                 return True
-            except Exception as e2:
-                print(f"❌ 默认连接也失败: {e2}")
-                return False
+            except Exception as e:
+                print(f"❌ 连接Milvus Lite失败: {e}")
+                # 尝试不同的连接方式
+                try:
+                    # 尝试使用默认嵌入式连接
+                    connections.connect("default")
+                    print("✅ 使用默认嵌入式连接成功")
+                    self.connected = True
+                    return True
+                except Exception as e2:
+                    print(f"❌ 默认连接也失败: {e2}")
+                    return False
+    
+    def is_lite(self):
+        """当前连接是否为Milvus Lite（本地文件，通过unix socket连接）"""
+        try:
+            address = connections.get_connection_addr("default").get("address") or ""
+        except Exception:
+            return False
+        return address.startswith("unix:")
+    
+    def _apply_lite_index_fallback(self, collection):
+        """Milvus Lite 的 FLOAT16_VECTOR 只支持 FLAT 索引，standalone服务端保留配置的索引"""
+        if self._precision_of(collection) != "float16" or self.index_type == "FLAT" or not self.is_lite():
+            return
+        print(f"⚠️  float16向量在Milvus Lite中只支持FLAT索引，忽略 {self.index_type}")
+        self.index_type = "FLAT"
+        self.index_params = {"metric_type": self.metric_type, "index_type": "FLAT", "params": {}}
     
     def create_collection(self):
-        """创建向量集合"""
+        """创建向量集合（已存在时复用，并确保向量索引存在）"""
+        if self.collection is not None:
+            return self._ensure_index()
+        
         if utility.has_collection(self.collection_name):
             print(f"✅ 集合 {self.collection_name} 已存在")
             self.collection = Collection(self.collection_name)
-            return True
+            return self._ensure_index()
             
+        schema = self.build_schema()
+        
+        try:
+            self.collection = Collection(self.collection_name, schema)
+            print(f"✅ 成功创建集合: {self.collection_name}")
+            return self._ensure_index()
+            
+        except Exception as e:
+            print(f"❌ 创建集合失败: {e}")
+            return False
+    
+    def build_schema(self, auto_id=True):
+        """
+        构建集合schema
+        
+        Args:
+            auto_id: 主键是否自动分配（重建时的临时集合需保留原主键）
+        """
         # 定义字段
         fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=self.vector_dim),
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=auto_id),
+            FieldSchema(name="vector", dtype=self.VECTOR_DTYPES[self.vector_precision], dim=self.vector_dim),
             FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=1000),
-            FieldSchema(name="metadata", dtype=DataType.VARCHAR, max_length=500)
+            FieldSchema(name="metadata", dtype=DataType.VARCHAR, max_length=500),
+            FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="chunk_index", dtype=DataType.INT64)
         ]
         
-        # 创建集合schema
-        schema = CollectionSchema(fields, "智慧社区向量数据集合")
+        # 结构化元数据字段
+        for name, max_length in STRING_FIELDS.items():
+            fields.append(FieldSchema(name=name, dtype=DataType.VARCHAR, max_length=max_length))
+        for name in INT_FIELDS:
+            fields.append(FieldSchema(name=name, dtype=DataType.INT64))
         
+        # 创建集合schema
+        return CollectionSchema(fields, "智慧社区向量数据集合")
+    
+    def has_field(self, name):
+        """当前集合是否包含指定字段（旧集合可能缺少新增字段）"""
+        if self.collection is None:
+            return False
+        return any(field.name == name for field in self.collection.schema.fields)
+    
+    @property
+    def collection_precision(self):
+        """当前集合实际的向量存储精度（可能与配置不同，需执行迁移）"""
+        if self.collection is None:
+            return self.vector_precision
+        return self._precision_of(self.collection)
+    
+    def vector_memory_bytes(self, count=None, precision=None):
+        """估算向量数据的内存占用（不含索引和标量字段）"""
+        if count is None:
+            count = self.collection.num_entities if self.collection is not None else 0
+        return count * self.vector_dim * VECTOR_PRECISION_BYTES[precision or self.collection_precision]
+    
+    def _encode_vectors(self, vectors, collection=None):
+        """按集合的向量字段类型转换写入/查询向量（float16字段需传入float16数组）"""
+        if self._precision_of(collection or self.collection) == "float16":
+            return [np.asarray(vector, dtype=np.float16) for vector in vectors]
+        return list(vectors)
+    
+    def _precision_of(self, collection):
+        """指定集合的向量存储精度"""
+        for field in collection.schema.fields:
+            if field.name == "vector":
+                for precision, dtype in self.VECTOR_DTYPES.items():
+                    if field.dtype == dtype:
+                        return precision
+        return "float32"
+    
+    @staticmethod
+    def _decode_vector(value):
+        """将查询返回的向量统一转换为float32（float16字段返回的是字节串）"""
+        if isinstance(value, list) and value and isinstance(value[0], bytes):
+            value = b"".join(value)
+        if isinstance(value, bytes):
+            return np.frombuffer(value, dtype=np.float16).astype(np.float32)
+        return np.asarray(value, dtype=np.float32)
+    
+    def missing_fields(self):
+        """当前集合缺少的schema字段（需重建集合补齐）"""
+        if self.collection is None:
+            return []
+        existing = {field.name for field in self.collection.schema.fields}
+        return [field.name for field in self.build_schema().fields if field.name not in existing]
+    
+    def _index_matches(self, params):
+        """已有向量索引的类型、度量和构建参数是否与配置一致（服务端返回的params为扁平的字符串值）"""
+        if params.get("index_type") != self.index_type or params.get("metric_type") != self.metric_type:
+            return False
+        return all(str(params.get(key)) == str(value) for key, value in self.index_params["params"].items())
+    
+    def _ensure_index(self):
+        """确保向量字段和标量字段已建立索引（向量索引与配置不一致时重建）"""
+        self._apply_lite_index_fallback(self.collection)
         try:
-            self.collection = Collection(self.collection_name, schema)
-            print(f"✅ 成功创建集合: {self.collection_name}")
+            # 不能使用 has_index()：存在多个索引时会抛出 AmbiguousIndexName
+            indexes = list(self.collection.indexes)
+            indexed = {index.field_name for index in indexes}
             
-            # 创建索引
-            index_params = {
-                "metric_type": "L2",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128}
-            }
-            self.collection.create_index("vector", index_params)
-            print("✅ 成功创建向量索引")
-            return True
+            vector_index = next((index for index in indexes if index.field_name == "vector"), None)
+            if vector_index is not None and not self._index_matches(vector_index.params):
+                # 修改 MILVUS_INDEX_TYPE / MILVUS_METRIC_TYPE 后旧索引与搜索参数不匹配，搜索会全部失败
+                print(
+                    f"⚠️  向量索引 {vector_index.params.get('index_type')}/{vector_index.params.get('metric_type')} "
+                    f"与配置 {self.index_type}/{self.metric_type} 不一致，释放集合并重建向量索引"
+                )
+                self.collection.release()
+                self._loaded_partitions = set()
+                self.collection.drop_index(index_name=vector_index.index_name)
+                indexed.discard("vector")
             
+            if "vector" not in indexed:
+                # 创建索引
+                self.collection.create_index("vector", self.index_params)
+                print(f"✅ 成功创建向量索引: {self.index_type} {self.index_params['params']}")
+            
+            for field_name in self.SCALAR_INDEX_FIELDS:
+                if field_name not in indexed and self.has_field(field_name):
+                    self.collection.create_index(
+                        field_name, {"index_type": "INVERTED"}, index_name=field_name
+                    )
+                    print(f"✅ 成功创建标量索引: {field_name}")
+            return True
         except Exception as e:
-            print(f"❌ 创建集合失败: {e}")
+            print(f"❌ 创建索引失败: {e}")
             return False
     
+    @property
+    def is_ready(self):
+        """是否已完成连接、建集合、建索引和加载（就绪信号）"""
+        return self._ready.is_set()
+    
+    def ensure_ready(self):
+        """
+        完成一次性的生命周期初始化: 连接 -> 确保集合和索引 -> 加载到内存
+        已就绪时直接返回，线程安全，只有第一次调用会付出加载开销
+        
+        Returns:
+            bool: 是否就绪
+        """
+        if self._ready.is_set():
+            return True
+        
+        if not self.connect():
+            return False
+        
+        with self._lifecycle_lock:
+            if self._ready.is_set():
+                return True
+            
+            if not self.create_collection():
+                return False
+            
+            try:
+                self._load_collection()
+            except Exception as e:
+                print(f"❌ 加载集合失败: {e}")
+                return False
+            
+            if self.collection_precision != self.vector_precision:
+                print(
+                    f"⚠️  集合向量精度为 {self.collection_precision}，配置为 {self.vector_precision}，"
+                    "请执行 python manage.py migrate_vector_precision"
+                )
+            
+            register_store(self.collection_name, self.vector_dim)
+            self._ready.set()
+            print(f"✅ Milvus集合 {self.collection_name} 已就绪")
+            return True
+    
+    def _load_collection(self):
+        """加载集合: 按社区分区且配置了预加载列表时只加载这些分区（及默认分区），否则全部加载"""
+        if self.partitioned and self.is_lite():
+            print("⚠️  Milvus Lite不支持分区，按社区搜索改用community_id标量过滤")
+            self.partitioned = False
+        if self.partitioned:
+            try:
+                self._refresh_partitions()
+            except Exception as e:
+                print(f"⚠️  当前Milvus不支持分区（{type(e).__name__}），改用community_id标量过滤")
+                self.partitioned = False
+        
+        preload = self.env_config.milvus_preload_partitions
+        if self.partitioned and preload:
+            names = {self.DEFAULT_PARTITION} | (
+                {self.partition_name(community_id) for community_id in preload} & self._partitions
+            )
+            self.collection.load(partition_names=sorted(names))
+            self._loaded_partitions = names
+        else:
+            self.collection.load()
+            self._loaded_partitions = set(self._partitions)
+    
+    @classmethod
+    def partition_name(cls, community_id):
+        """社区ID对应的分区名（分区名只允许字母、数字和下划线，其他社区ID取哈希）"""
+        if not community_id:
+            return cls.DEFAULT_PARTITION
+        if re.fullmatch(r"[A-Za-z0-9_]{1,64}", community_id):
+            return f"c_{community_id}"
+        return f"h_{hashlib.sha1(community_id.encode('utf-8')).hexdigest()[:16]}"
+    
+    def _refresh_partitions(self, force=True):
+        """从服务端重新读取分区列表（其他进程可能已创建新分区），非force时按最小间隔节流"""
+        now = time.monotonic()
+        if not force and self._partitions_refreshed_at is not None \
+                and now - self._partitions_refreshed_at < self.PARTITION_REFRESH_INTERVAL:
+            return
+        self._partitions = {partition.name for partition in self.collection.partitions}
+        self._partitions_refreshed_at = now
+    
+    def _existing_partitions(self, community_ids=None):
+        """
+        社区ID列表中已有分区的分区名，None表示全部分区
+        （本进程的分区列表中缺少时先刷新，避免漏掉其他进程创建的分区）
+        """
+        if community_ids is None:
+            return sorted(self._partitions)
+        names = {self.partition_name(community_id) for community_id in community_ids}
+        if not names <= self._partitions:
+            with self._partition_lock:
+                self._refresh_partitions(force=False)
+        return sorted(names & self._partitions)
+    
+    def _ensure_partitions(self, names):
+        """
+        确保社区分区存在，新建的分区加载后才能被搜索
+        
+        分区数达到 MILVUS_MAX_PARTITIONS 后不再新建，这些社区的数据写入默认分区
+        （按社区搜索时始终包含默认分区并带community_id过滤，结果不受影响）
+        
+        Returns:
+            dict: 分区名 -> 实际写入的分区名
+        """
+        targets = {}
+        with self._partition_lock:
+            if not set(names) <= self._partitions:
+                self._refresh_partitions(force=False)
+            for name in names:
+                if name not in self._partitions:
+                    if len(self._partitions) >= self.env_config.milvus_max_partitions:
+                        print(f"⚠️  分区数已达上限 {self.env_config.milvus_max_partitions}，{name} 的数据写入默认分区")
+                        targets[name] = self.DEFAULT_PARTITION
+                        continue
+                    try:
+                        self.collection.create_partition(name)
+                        print(f"✅ 创建分区 {name}")
+                    except Exception:
+                        # 其他进程可能同时创建了该分区
+                        if not self.collection.has_partition(name):
+                            raise
+                    Partition(self.collection, name).load()
+                    self._partitions.add(name)
+                    self._loaded_partitions.add(name)
+                targets[name] = name
+        return targets
+    
+    def _load_partition_names(self, names, force=False):
+        """加载尚未加载的分区（force时全部重新加载，用于其他进程释放分区后的重试）"""
+        with self._partition_lock:
+            for name in names:
+                if force or name not in self._loaded_partitions:
+                    Partition(self.collection, name).load()
+                    self._loaded_partitions.add(name)
+    
+    def load_partitions(self, community_ids=None):
+        """
+        将社区对应的分区加载到内存（热点社区常驻内存）
+        
+        Args:
+            community_ids: 社区ID列表，None表示全部分区
+            
+        Returns:
+            list: 加载的分区名，未启用分区时为空列表
+        """
+        if not self.ensure_ready() or not self.partitioned:
+            return []
+        names = self._existing_partitions(community_ids)
+        self._load_partition_names(names)
+        return names
+    
+    def release_partitions(self, community_ids):
+        """
+        从内存释放社区对应的分区（冷门社区），之后搜索该社区时自动重新加载
+        
+        Returns:
+            list: 释放的分区名，未启用分区时为空列表
+        """
+        if not self.ensure_ready() or not self.partitioned:
+            return []
+        names = self._existing_partitions(community_ids)
+        with self._partition_lock:
+            for name in names:
+                Partition(self.collection, name).release()
+                self._loaded_partitions.discard(name)
+        return names
+    
+    def partition_stats(self):
+        """各分区的数据量和服务端加载状态，未启用分区时为空列表"""
+        if not self.ensure_ready() or not self.partitioned:
+            return []
+        return [
+            {
+                "name": name,
+                "rows": Partition(self.collection, name).num_entities,
+                "loaded": utility.load_state(self.collection_name, partition_names=[name]).name == "Loaded"
+            }
+            for name in sorted(self._partitions)
+        ]
+    
+    def _insert_columns(self, columns):
+        """
+        列式插入，按社区分区时按分区分组插入
+        
+        Returns:
+            list: 与输入顺序一致的主键列表
+        """
+        if not self.partitioned:
+            return list(self.collection.insert(self._to_insert_data(columns)).primary_keys)
+        
+        names = [self.partition_name(community_id) for community_id in columns["community_id"]]
+        targets = self._ensure_partitions(set(names))
+        groups = {}
+        for position, name in enumerate(names):
+            groups.setdefault(targets[name], []).append(position)
+        
+        ids = [None] * len(columns["community_id"])
+        for name, positions in groups.items():
+            part = {field: [values[position] for position in positions] for field, values in columns.items()}
+            result = self.collection.insert(self._to_insert_data(part), partition_name=name)
+            for position, primary_key in zip(positions, result.primary_keys):
+                ids[position] = primary_key
+        return ids
+    
     def insert_vector(self, vector, content, metadata=None):
         """插入向量数据"""
-        if not self.collection:
-            if not self.connect() or not self.create_collection():
-                return None
+        ids = self.insert_vectors([vector], [content], [metadata])
+        if not ids:
+            return None
+        print(f"✅ 成功插入向量数据，ID: {ids[0]}")
+        return ids[0]
+    
+    def insert_vectors(self, vectors, contents, metadatas=None, doc_ids=None, chunk_indexes=None, attributes=None):
+        """
+        批量插入向量数据（一次列式插入）
+        
+        Args:
+            vectors: 向量列表
+            contents: 内容列表，与vectors一一对应
+            metadatas: 元数据列表，可选
+            doc_ids: 所属文档ID列表（长文档分块时使用），可选
+            chunk_indexes: 块序号列表，可选
+            attributes: 结构化元数据字典列表（category/community_id/created_at/source），可选
+            
+        Returns:
+            list: 插入后的ID列表，失败返回None
+        """
+        if not vectors:
+            return []
+        
+        if not self.ensure_ready():
+            return None
         
         try:
-            # 准备数据
-            data = [
-                [vector],  # 向量数据
-                [content],  # 内容
-                [metadata or ""]  # 元数据
-            ]
-            
-            # 插入数据
-            result = self.collection.insert(data)
-            print(f"✅ 成功插入向量数据，ID: {result.primary_keys[0]}")
-            return result.primary_keys[0]
+            if metadatas is None:
+                metadatas = [None] * len(vectors)
+            
+            # 列式数据: 每个字段一列
+            columns = {
+                "vector": self._encode_vectors(vectors),
+                "content": list(contents),
+                "metadata": [metadata or "" for metadata in metadatas],
+                "content_hash": [text_hash(content) for content in contents],
+                "doc_id": list(doc_ids) if doc_ids is not None else [""] * len(vectors),
+                "chunk_index": list(chunk_indexes) if chunk_indexes is not None else [0] * len(vectors)
+            }
+            columns.update(attribute_columns(attributes, len(vectors)))
+            
+            ids = self._insert_columns(columns)
+            self._bump_generation()
+            if len(vectors) > 1:
+                print(f"✅ 成功批量插入向量数据，共 {len(ids)} 条")
+            return ids
             
         except Exception as e:
-            print(f"❌ 插入向量数据失败: {e}")
+            print(f"❌ 批量插入向量数据失败: {e}")
             return None
     
-    def search_vectors(self, query_vector, limit=10):
-        """搜索相似向量"""
-        if not self.collection:
-            if not self.connect() or not self.create_collection():
-                return []
+    def _to_insert_data(self, columns):
+        """按集合schema的字段顺序排列列数据，跳过自增主键和集合中不存在的字段"""
+        data = []
+        for field in self.collection.schema.fields:
+            if field.auto_id:
+                continue
+            data.append(columns[field.name])
+        return data
+    
+    def find_ids_by_hashes(self, hashes):
+        """
+        按内容哈希查找已存在的数据
+        
+        Args:
+            hashes: 内容哈希列表
+            
+        Returns:
+            dict: {内容哈希: 主键}，集合不支持或失败时返回空字典
+        """
+        hashes = list(set(hashes))
+        if not hashes or not self.ensure_ready() or not self.has_field("content_hash"):
+            return {}
         
         try:
-            # 加载集合到内存
-            self.collection.load()
+            rows = self.collection.query(
+                expr=f"content_hash in {json.dumps(hashes)}",
+                output_fields=["id", "content_hash"],
+                consistency_level="Strong"
+            )
+            found = {}
+            for row in rows:
+                found.setdefault(row["content_hash"], row["id"])
+            return found
+        except Exception as e:
+            print(f"❌ 按内容哈希查询失败: {e}")
+            return {}
+    
+    def find_ids_by_doc(self, doc_id):
+        """
+        查找文档的所有分块
+        
+        Returns:
+            list: 按块序号排列的主键列表
+        """
+        if not doc_id or not self.ensure_ready() or not self.has_field("doc_id"):
+            return []
+        
+        try:
+            rows = self.collection.query(
+                expr=f"doc_id == {json.dumps(doc_id)}",
+                output_fields=["id", "chunk_index"],
+                consistency_level="Strong"
+            )
+            return [row["id"] for row in sorted(rows, key=lambda row: row["chunk_index"])]
+        except Exception as e:
+            print(f"❌ 按文档ID查询失败: {e}")
+            return []
+    
+    def update_metadata(self, vector_id, metadata, attributes=None):
+        """
+        更新已有数据的元数据和请求中提供的结构化字段（复用已存储的向量，不重新嵌入）
+        
+        Args:
+            vector_id: 主键
+            metadata: 新的元数据
+            attributes: 需要更新的结构化字段字典，可选（未提供的字段保持不变）
+        
+        Returns:
+            bool: 是否更新成功
+        """
+        if not self.ensure_ready():
+            return False
+        
+        try:
+            field_names = [field.name for field in self.collection.schema.fields]
+            rows = self.collection.query(
+                expr=f"id == {int(vector_id)}",
+                output_fields=field_names,
+                consistency_level="Strong"
+            )
+            if not rows:
+                return False
             
-            # 搜索参数
-            search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+            row = dict(rows[0])
+            row["metadata"] = metadata or ""
+            # float16字段查询返回的是字节串，需转换回写入格式
+            row["vector"] = self._encode_vectors([self._decode_vector(row["vector"])])[0]
+            old_partition = self.partition_name(row.get("community_id"))
+            row.update({name: value for name, value in (attributes or {}).items() if name in field_names})
+            if self.partitioned:
+                self._upsert_partitioned(row, old_partition)
+            else:
+                self.collection.upsert([row])
+            self._bump_generation()
+            return True
+        except Exception as e:
+            print(f"❌ 更新元数据失败: {e}")
+            return False
+    
+    def _upsert_partitioned(self, row, old_partition):
+        """
+        按行的community_id写入对应分区，并从原先可能所在的分区删除旧行
+        （upsert只替换目标分区内的同主键行；社区变更或旧数据在默认分区时需另行删除）
+        """
+        name = self.partition_name(row.get("community_id"))
+        target = self._ensure_partitions([name])[name]
+        self.collection.upsert([row], partition_name=target)
+        stale = {old_partition, self.DEFAULT_PARTITION} & self._partitions - {target}
+        for partition in sorted(stale):
+            self.collection.delete(f"id == {int(row['id'])}", partition_name=partition)
+    
+    def search_vectors(self, query_vector, limit=10, filters=None, radius=None, with_vectors=False, partitions=None):
+        """搜索相似向量"""
+        results = self.search_vectors_batch([query_vector], limit, filters, radius, with_vectors, partitions)
+        return results[0] if results else []
+    
+    def search_vectors_batch(self, query_vectors, limit=10, filters=None, radius=None, with_vectors=False,
+                             partitions=None):
+        """
+        批量搜索相似向量（一次Milvus搜索携带多个查询向量）
+        
+        Args:
+            query_vectors: 查询向量列表
+            limit: 每个查询返回的结果数量
+            filters: parse_filter解析后的过滤条件，作为expr在引擎内先过滤再取top-k
+            radius: 范围搜索阈值（L2下只返回距离小于该值的结果，IP/COSINE下只返回相似度大于该值的结果）
+            with_vectors: 是否在结果中附带float32向量（vector字段，用于结果多样化）
+            partitions: 只搜索这些社区ID的数据，None表示搜索全部已加载数据；按社区分区时只搜索
+                对应分区和默认分区（未加载的分区按需加载），同时附加community_id过滤条件
             
+        Returns:
+            list: 与query_vectors一一对应的结果列表，失败返回None
+        
+        Raises:
+            MissingFieldError: 集合缺少过滤条件引用的字段
+        """
+        if not query_vectors:
+            return []
+        
+        if not self.ensure_ready():
+            return None
+        
+        # 限定分区
+        partition_names = None
+        if partitions is not None:
+            if not partitions:
+                return [[] for _ in query_vectors]
+            # 默认分区中有开启分区前写入和超出分区上限的社区数据，需一并搜索并按社区过滤
+            filters = list(filters or []) + [("community_id", "in", list(partitions))]
+            if self.partitioned:
+                try:
+                    partition_names = sorted(set(self._existing_partitions(partitions)) | {self.DEFAULT_PARTITION})
+                    self._load_partition_names(partition_names)
+                except Exception as e:
+                    print(f"❌ 加载分区失败: {e}")
+                    return None
+        
+        # 搜索参数（指定radius时使用Milvus范围搜索）
+        search_params = self.search_params
+        if radius is not None:
+            search_params = {
+                **search_params,
+                "params": {**search_params["params"], "radius": float(radius)}
+            }
+        expr = to_milvus_expr(filters or [])
+        if expr:
+            missing = [name for name in filter_fields(filters) if not self.has_field(name)]
+            if missing:
+                raise MissingFieldError(sorted(missing))
+        
+        # 查询结果缓存（代数需在搜索前读取，避免缓存与并发写入交错的结果）
+        generation = self.generation
+        grouped = [None] * len(query_vectors)
+        cache_keys = [None] * len(query_vectors)
+        if self.search_cache is not None:
+            for index, query_vector in enumerate(query_vectors):
+                cache_keys[index] = make_search_key(
+                    query_vector, limit, search_params, expr=expr, with_vectors=with_vectors,
+                    partitions=partition_names
+                )
+                grouped[index] = self.search_cache.get(cache_keys[index], generation)
+        
+        # 只搜索未命中缓存的查询
+        pending = [index for index, results in enumerate(grouped) if results is None]
+        if not pending:
+            return grouped
+        
+        try:
             # 执行搜索
-            results = self.collection.search(
-                data=[query_vector],
+            output_fields = [name for name in self.SEARCH_OUTPUT_FIELDS if self.has_field(name)]
+            if with_vectors:
+                output_fields.append("vector")
+            search_kwargs = dict(
+                data=self._encode_vectors([query_vectors[index] for index in pending]),
                 anns_field="vector",
                 param=search_params,
                 limit=limit,
-                output_fields=["content", "metadata"]
+                expr=expr or None,
+                output_fields=output_fields,
+                partition_names=partition_names
             )
+            try:
+                results = self.collection.search(**search_kwargs)
+            except Exception:
+                if not partition_names:
+                    raise
+                # 分区可能已被其他进程释放，重新加载后重试一次
+                self._load_partition_names(partition_names, force=True)
+                results = self.collection.search(**search_kwargs)
             
             # 格式化结果
-            search_results = []
-            for hits in results:
+            for index, hits in zip(pending, results):
+                search_results = []
                 for hit in hits:
                     search_results.append({
                         "id": hit.id,
                         "distance": hit.distance,
                         "content": hit.entity.get("content", ""),
-                        "metadata": hit.entity.get("metadata", "")
+                        "metadata": hit.entity.get("metadata", ""),
+                        "doc_id": hit.entity.get("doc_id") or "",
+                        "chunk_index": hit.entity.get("chunk_index") or 0,
+                        **{name: hit.entity.get(name) for name in STRUCTURED_FIELDS}
                     })
+                    if with_vectors:
+                        search_results[-1]["vector"] = self._decode_vector(hit.entity.get("vector"))
+                grouped[index] = search_results
+                
+                if cache_keys[index] is not None:
+                    self.search_cache.set(cache_keys[index], generation, search_results)
             
-            return search_results
+            return grouped
             
         except Exception as e:
             print(f"❌ 搜索向量失败: {e}")
-            return []
+            return None
+    
+    def iterate_rows(self, output_fields, after_id=None, batch_size=1000):
+        """
+        按主键顺序分批遍历集合中的所有数据（基于query_iterator，内存占用恒定）
+        
+        Args:
+            output_fields: 需要返回的字段
+            after_id: 只返回主键大于该值的数据，用于断点续传
+            batch_size: 每批读取的条数
+            
+        Yields:
+            list: 一批数据（字典列表）
+        """
+        if not self.ensure_ready():
+            raise RuntimeError("Milvus连接或集合初始化失败")
+        
+        # 查询只覆盖已加载的分区，全量遍历前加载全部分区
+        self.load_partitions()
+        
+        expr = f"id > {int(after_id)}" if after_id is not None else ""
+        iterator = self.collection.query_iterator(
+            batch_size=batch_size,
+            expr=expr,
+            output_fields=output_fields
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                yield batch
+        finally:
+            iterator.close()
+    
+    def fill_derived_fields(self, row):
+        """为旧数据补齐可推导的新字段（重建集合时使用）"""
+        if not row.get("content_hash"):
+            row["content_hash"] = text_hash(row.get("content", ""))
+        row.setdefault("doc_id", "")
+        row.setdefault("chunk_index", 0)
+        
+        # 结构化字段优先取自JSON格式的旧metadata
+        if any(name not in row for name in STRUCTURED_FIELDS):
+            derived = attributes_from_metadata(row.get("metadata"))
+            for name in STRING_FIELDS:
+                row.setdefault(name, derived.get(name, ""))
+            for name in INT_FIELDS:
+                row.setdefault(name, derived.get(name, 0))
+        return row
+    
+    def rebuild_collection(self, batch_size=1000, on_remap=None):
+        """
+        按当前schema重建集合（用于旧集合补齐新增字段）
+        先把数据连同原主键复制到临时集合，再删除并重建原集合后复制回来；
+        Milvus Lite不支持写入自增主键，复制回来的数据主键会重新分配
+        
+        Args:
+            batch_size: 每批复制的条数
+            on_remap: 每批复制回原集合后以 {原主键: 新主键} 调用，用于同步主键镜像（如NumPy兜底存储）
+        
+        Returns:
+            int: 迁移的数据条数
+        """
+        if not self.connect():
+            raise RuntimeError("Milvus连接失败")
+        
+        tmp_name = f"{self.collection_name}_rebuild_tmp"
+        if utility.has_collection(tmp_name):
+            raise RuntimeError(f"临时集合 {tmp_name} 已存在，可能有未完成的重建，请人工检查")
+        
+        with self._lifecycle_lock:
+            source = Collection(self.collection_name)
+            source.load()
+            tmp = Collection(tmp_name, self.build_schema(auto_id=False))
+            
+            total = self._copy_rows(source, tmp, batch_size)
+            print(f"✅ 已复制 {total} 条数据到临时集合 {tmp_name}")
+            
+            # 删除原集合并按新schema重建
+            self._ready.clear()
+            self.collection = None
+            utility.drop_collection(self.collection_name)
+            self._partitions = set()
+            self._loaded_partitions = set()
+            if not self.create_collection():
+                raise RuntimeError("重建集合失败，数据保留在临时集合中")
+            if self.partitioned:
+                self._refresh_partitions()
+            
+            tmp.load()
+            copied = self._copy_rows(tmp, self.collection, batch_size, on_remap)
+            if copied != total:
+                raise RuntimeError(f"复制回原集合的数量不一致: {copied}/{total}，数据保留在临时集合中")
+            
+            utility.drop_collection(tmp_name)
+            self._bump_generation()
+        
+        self.ensure_ready()
+        return total
+    
+    def _copy_rows(self, source, target, batch_size, on_remap=None):
+        """
+        分批复制数据，补齐新字段、转换向量精度并丢弃目标schema中不存在的字段
+        目标集合主键非自增时保留原主键，复制回原集合时以新旧主键映射调用on_remap
+        """
+        source_fields = [field.name for field in source.schema.fields]
+        target_fields = {field.name for field in target.schema.fields if not field.auto_id}
+        
+        iterator = source.query_iterator(batch_size=batch_size, expr="", output_fields=source_fields)
+        total = 0
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                rows = []
+                source_ids = [row["id"] for row in batch]
+                for row in batch:
+                    row = self.fill_derived_fields(dict(row))
+                    # 按目标集合的向量精度转换（精度迁移）
+                    row["vector"] = self._encode_vectors([self._decode_vector(row["vector"])], target)[0]
+                    rows.append({name: value for name, value in row.items() if name in target_fields})
+                if target is self.collection:
+                    # 复制回重建后的集合时按社区分区写入
+                    ids = self._insert_columns({name: [row.get(name) for row in rows] for name in target_fields})
+                    if on_remap is not None:
+                        on_remap(dict(zip(source_ids, ids)))
+                else:
+                    target.insert(rows)
+                total += len(rows)
+        finally:
+            iterator.close()
+        
+        target.flush()
+        return total
     
     def disconnect(self):
         """断开连接"""
         try:
             connections.disconnect("default")
+            self._ready.clear()
+            self.collection = None
+            self.connected = False
             print("✅ 已断开Milvus连接")
         except:
             pass
 
 
-# 全局Milvus客户端实例
+# 全局Milvus客户端实例（绑定活动集合）
 milvus_client = MilvusClient()
+_milvus_client_lock = threading.Lock()
 
 
 def get_milvus_client():
-    """获取Milvus客户端实例"""
+    """获取绑定活动集合的Milvus客户端实例，活动集合切换后创建新实例（进行中的请求继续使用旧实例）"""
+    global milvus_client
+    active = get_model_registry().active_collection()
+    if milvus_client.collection_name != active:
+        with _milvus_client_lock:
+            if milvus_client.collection_name != active:
+                print(f"🔄 活动集合已切换为 {active}")
+                milvus_client = MilvusClient(active)
     return milvus_client
@@ -0,0 +1,233 @@
+"""
+嵌入模型登记
+记录每个集合（Milvus集合 / 同名的NumPy存储目录和词法索引）使用的嵌入模型、版本和向量维度，
+以及每个逻辑集合当前对外服务的活动集合。重新嵌入任务写完影子集合后改写活动集合，
+各进程在下一次获取向量存储时检测到文件变化并切换，读写无需停机
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from utils.env_config import get_env_config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _file_lock(path: str):
+    """跨进程互斥锁（锁住单独的锁文件，登记文件本身会被原子替换）"""
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def base_collection_name() -> str:
+    """逻辑集合名（MILVUS_COLLECTION_NAME），影子集合以它为前缀"""
+    return os.getenv('MILVUS_COLLECTION_NAME', 'zhihui_vectors')
+
+
+class ModelRegistry:
+    """
+    模型登记类，数据保存在JSON文件中:
+
+        {
+            "active": {"zhihui_vectors": "zhihui_vectors_v2"},
+            "collections": {
+                "zhihui_vectors_v2": {"model": "...", "version": "1", "dim": 768,
+                                      "status": "ready", "created_at": 1700000000}
+            }
+        }
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {'active': {}, 'collections': {}}
+        self._file_key = None
+
+    def _load(self):
+        """文件变化（其他进程改写）时重新读取，返回当前数据"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._data
+
+        file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_key != self._file_key:
+            with self._lock:
+                self._read_file(file_key)
+        return self._data
+
+    def _read_file(self, file_key):
+        """读取登记文件到内存（调用方需持有_lock），读取失败时保留原数据"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"❌ 读取模型登记文件失败: {e}")
+            return
+        self._data = {
+            'active': data.get('active', {}),
+            'collections': data.get('collections', {})
+        }
+        self._file_key = file_key
+
+    def _update(self, apply):
+        """
+        在跨进程文件锁内读取最新数据、修改后写入唯一命名的临时文件再原子替换
+        服务进程的ensure_registered与管理命令的update/activate并发时不会丢失任一方的写入
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock, _file_lock(f"{self.path}.lock"):
+            self._read_file(None)
+            data = json.loads(json.dumps(self._data))
+            apply(data)
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(self.path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._data = data
+            stat = os.stat(self.path)
+            self._file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def active_collection(self, base_name: Optional[str] = None) -> str:
+        """逻辑集合当前的活动集合名，未切换过时为逻辑集合名本身"""
+        base_name = base_name or base_collection_name()
+        return self._load()['active'].get(base_name, base_name)
+
+    def collection_info(self, name: str) -> Optional[dict]:
+        """集合登记的模型信息，未登记时返回None"""
+        info = self._load()['collections'].get(name)
+        return dict(info) if info else None
+
+    def snapshot(self) -> dict:
+        """登记数据的副本"""
+        return json.loads(json.dumps(self._load()))
+
+    def register(self, name: str, model: str, version: str, dim: int, status: str = 'ready', **extra):
+        """登记集合使用的模型（已登记的集合覆盖），extra为附加字段（如影子集合的来源集合）"""
+        def apply(data):
+            data['collections'][name] = {
+                'model': model,
+                'version': version,
+                'dim': int(dim),
+                'status': status,
+                'created_at': int(time.time()),
+                **extra
+            }
+        self._update(apply)
+
+    def ensure_registered(self, name: str, dim: int) -> dict:
+        """
+        集合未登记时按当前配置的模型登记（升级前创建的集合）
+
+        Returns:
+            dict: 集合的模型信息
+        """
+        info = self.collection_info(name)
+        if info is None:
+            config = get_env_config()
+            self.register(name, config.embedding_model, config.embedding_model_version, dim)
+            info = self.collection_info(name)
+        return info
+
+    def update(self, name: str, **fields):
+        """更新已登记集合的字段（状态、重新嵌入进度等）"""
+        def apply(data):
+            data['collections'].setdefault(name, {}).update(fields)
+        self._update(apply)
+
+    def activate(self, name: str, base_name: Optional[str] = None):
+        """将逻辑集合的活动集合切换为name（原子替换登记文件）"""
+        base_name = base_name or base_collection_name()
+
+        def apply(data):
+            data['active'][base_name] = name
+            if name in data['collections']:
+                data['collections'][name]['status'] = 'ready'
+        self._update(apply)
+
+
+def register_store(name: str, dim: int) -> dict:
+    """
+    向量存储就绪时调用: 确保集合已登记，活动集合的模型与配置不一致时给出迁移提示
+
+    Returns:
+        dict: 集合的模型信息
+    """
+    registry = get_model_registry()
+    info = registry.ensure_registered(name, dim)
+    config = get_env_config()
+    configured = (config.embedding_model, config.embedding_model_version)
+    if name == registry.active_collection() and (info['model'], info['version']) != configured:
+        print(
+            f"⚠️  集合 {name} 使用的嵌入模型为 {info['model']} (v{info['version']})，"
+            f"配置为 {configured[0]} (v{configured[1]})，查询仍使用集合的模型；"
+            "请执行 python manage.py reembed_collection 迁移"
+        )
+    return info
+
+
+def default_model_info() -> dict:
+    """当前配置的嵌入模型信息（集合未登记时使用）"""
+    config = get_env_config()
+    return {
+        'model': config.embedding_model,
+        'version': config.embedding_model_version,
+        'dim': int(os.getenv('VECTOR_DIMENSION', '384'))
+    }
+
+
+def active_model_info() -> dict:
+    """活动集合使用的嵌入模型信息（查询和写入都必须使用该模型）"""
+    registry = get_model_registry()
+    return registry.collection_info(registry.active_collection()) or default_model_info()
+
+
+def collection_model_info(name: str) -> dict:
+    """集合使用的嵌入模型信息（已取得向量存储时按其集合取模型，避免与活动集合切换交错）"""
+    return get_model_registry().collection_info(name) or default_model_info()
+
+
+_model_registry = None
+_model_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """获取模型登记实例"""
+    global _model_registry
+    if _model_registry is None:
+        with _model_registry_lock:
+            if _model_registry is None:
+                _model_registry = ModelRegistry(get_env_config().model_registry_path)
+    return _model_registry
@@ -0,0 +1,716 @@
+"""
+NumPy向量存储
+进程内精确搜索后端，接口与MilvusClient一致，适用于小规模集合或Milvus不可用时的兜底
+向量保存在内存映射的float32连续矩阵中（按块追加），文本和元数据保存在SQLite中
+"""
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+from utils.env_config import get_env_config, VECTOR_PRECISION_BYTES
+from utils.embedding_cache import text_hash
+from utils.model_registry import get_model_registry, register_store
+from utils.metadata_fields import STRING_FIELDS, INT_FIELDS, STRUCTURED_FIELDS, attribute_columns, to_sql_where
+
+
+class NumpyVectorStore:
+    """NumPy向量存储类 - 精确top-k搜索"""
+
+    # 向量文件每次扩容的行数
+    CHUNK_ROWS = 4096
+
+    # 各精度的向量文件名（精度转换写入新文件，meta.json切换精度后删除旧文件，中断时不会按错误精度读取）
+    VECTOR_FILES = {'float32': 'vectors.f32', 'float16': 'vectors.f16'}
+
+    # 低精度存储时每次转换为float32参与计算的行数（限制临时内存）
+    COMPUTE_BLOCK_ROWS = 65536
+
+    # 可通过iterate_rows读取的字段
+    ROW_FIELDS = ('id', 'content', 'metadata', 'content_hash', 'doc_id', 'chunk_index') + STRUCTURED_FIELDS
+
+    # 后续版本新增的列及其定义
+    EXTRA_COLUMNS = (
+        ('content_hash', "TEXT NOT NULL DEFAULT ''"),
+        ('doc_id', "TEXT NOT NULL DEFAULT ''"),
+        ('chunk_index', 'INTEGER NOT NULL DEFAULT 0'),
+    ) + tuple(
+        (name, "TEXT NOT NULL DEFAULT ''") for name in STRING_FIELDS
+    ) + tuple(
+        (name, 'INTEGER NOT NULL DEFAULT 0') for name in INT_FIELDS
+    ) + (
+        # 兜底模式下Milvus不可用时只写入本地、尚未回放到Milvus的数据
+        ('pending', 'INTEGER NOT NULL DEFAULT 0'),
+    )
+
+    # 建立SQLite索引的列（去重、按文档查询和搜索过滤使用）
+    INDEXED_COLUMNS = ('content_hash', 'doc_id') + STRUCTURED_FIELDS
+
+    def __init__(self, data_dir=None, collection_name=None, vector_dim=None):
+        """
+        Args:
+            data_dir: 数据目录，默认为 NUMPY_STORE_DIR/集合名
+            collection_name: 集合名，默认为模型登记中的活动集合
+            vector_dim: 向量维度，默认取集合登记的维度，未登记时取 VECTOR_DIMENSION
+        """
+        self.env_config = get_env_config()
+        registry = get_model_registry()
+        self.collection_name = collection_name or registry.active_collection()
+        info = registry.collection_info(self.collection_name)
+        self.vector_dim = int(vector_dim or (info and info.get('dim')) or os.getenv('VECTOR_DIMENSION', '384'))
+        self.metric_type = self.env_config.milvus_metric_type
+        self.data_dir = data_dir or os.path.join(self.env_config.numpy_store_dir, self.collection_name)
+        self.search_cache = None
+
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._db = None
+        self._matrix = None
+        self._norms = None
+        self._count = 0
+        self._capacity = 0
+        self._next_id = 1
+        self._generation = 0
+        self.precision = self.env_config.vector_precision
+
+    @property
+    def generation(self):
+        """当前写入代数"""
+        return self._generation
+
+    @property
+    def is_ready(self):
+        """是否已加载完成"""
+        return self._ready.is_set()
+
+    @property
+    def _vector_path(self):
+        return self._vector_file(self.precision)
+
+    def _vector_file(self, precision):
+        return os.path.join(self.data_dir, self.VECTOR_FILES[precision])
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.data_dir, 'meta.json')
+
+    @property
+    def _row_bytes(self):
+        return VECTOR_PRECISION_BYTES[self.precision] * self.vector_dim
+
+    def connect(self):
+        """打开本地存储（与MilvusClient接口保持一致）"""
+        return self.ensure_ready()
+
+    def ensure_ready(self):
+        """
+        打开或创建本地存储并映射向量文件
+
+        Returns:
+            bool: 是否就绪
+        """
+        if self._ready.is_set():
+            return True
+
+        with self._lock:
+            if self._ready.is_set():
+                return True
+
+            try:
+                os.makedirs(self.data_dir, exist_ok=True)
+
+                self._db = sqlite3.connect(
+                    os.path.join(self.data_dir, 'rows.db'), check_same_thread=False
+                )
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS rows ('
+                    'pos INTEGER PRIMARY KEY, id INTEGER UNIQUE NOT NULL, '
+                    'content TEXT NOT NULL, metadata TEXT NOT NULL)'
+                )
+                # 新建或旧版本数据库补齐新增列
+                columns = {row[1] for row in self._db.execute('PRAGMA table_info(rows)')}
+                for column, definition in self.EXTRA_COLUMNS:
+                    if column not in columns:
+                        self._db.execute(f'ALTER TABLE rows ADD COLUMN {column} {definition}')
+                for column in self.INDEXED_COLUMNS:
+                    self._db.execute(f'CREATE INDEX IF NOT EXISTS rows_{column} ON rows ({column})')
+                self._db.execute('CREATE INDEX IF NOT EXISTS rows_pending ON rows (pos) WHERE pending = 1')
+                self._db.commit()
+
+                meta = {}
+                if os.path.exists(self._meta_path):
+                    with open(self._meta_path, 'r') as f:
+                        meta = json.load(f)
+                    if meta.get('dim') != self.vector_dim:
+                        print(f"❌ 本地向量维度 {meta.get('dim')} 与配置 {self.vector_dim} 不一致")
+                        return False
+                    # 以文件实际精度为准，旧版本文件为float32
+                    self.precision = meta.get('precision', 'float32')
+                    if self.precision != self.env_config.vector_precision:
+                        print(
+                            f"⚠️  NumPy向量精度为 {self.precision}，配置为 {self.env_config.vector_precision}，"
+                            "请执行 python manage.py migrate_vector_precision"
+                        )
+
+                self._cleanup_vector_files()
+
+                # 以SQLite中的行数为准，丢弃未提交的尾部向量
+                self._count = self._db.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+                max_id = self._db.execute('SELECT MAX(id) FROM rows').fetchone()[0] or 0
+                self._next_id = max(meta.get('next_id', 1), max_id + 1)
+
+                if not os.path.exists(self._vector_path):
+                    open(self._vector_path, 'wb').close()
+                self._capacity = os.path.getsize(self._vector_path) // self._row_bytes
+                self._ensure_capacity(self._count)
+                self._map()
+
+                register_store(self.collection_name, self.vector_dim)
+                self._ready.set()
+                print(f"✅ NumPy向量存储已就绪: {self.data_dir} ({self._count} 条)")
+                return True
+
+            except Exception as e:
+                print(f"❌ NumPy向量存储初始化失败: {e}")
+                return False
+
+    def _cleanup_vector_files(self):
+        """以meta.json记录的精度为准整理向量文件（调用方需持有锁）"""
+        legacy = self._vector_file('float32')
+        if self.precision != 'float32' and not os.path.exists(self._vector_path) and os.path.exists(legacy):
+            # 旧版本的低精度向量也保存在 vectors.f32 中
+            os.replace(legacy, self._vector_path)
+        for precision in self.VECTOR_FILES:
+            path = self._vector_file(precision)
+            if precision != self.precision and os.path.exists(path):
+                # 精度转换在切换meta.json之后、删除旧文件之前中断
+                print(f"⚠️  删除精度转换遗留的向量文件: {path}")
+                os.remove(path)
+
+    def _ensure_capacity(self, rows):
+        """按块扩容向量文件（调用方需持有锁）"""
+        if rows <= self._capacity and self._capacity > 0:
+            return False
+
+        chunks = max(1, -(-rows // self.CHUNK_ROWS))
+        capacity = chunks * self.CHUNK_ROWS
+        with open(self._vector_path, 'r+b') as f:
+            f.truncate(capacity * self._row_bytes)
+        self._capacity = capacity
+        return True
+
+    def _map(self):
+        """重新映射向量文件并计算范数（调用方需持有锁）"""
+        self._matrix = np.memmap(
+            self._vector_path, dtype=np.dtype(self.precision), mode='r+',
+            shape=(self._capacity, self.vector_dim)
+        )
+        norms = np.zeros(self._capacity, dtype=np.float32)
+        if self._norms is not None:
+            # 扩容时复用已计算的范数
+            norms[:self._count] = self._norms[:self._count]
+        elif self._count:
+            norms[:self._count] = self._row_norms(self._matrix[:self._count])
+        self._norms = norms
+
+    def _row_norms(self, matrix):
+        """按块计算每行的平方范数（低精度存储时按块转换为float32）"""
+        norms = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), self.COMPUTE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + self.COMPUTE_BLOCK_ROWS], dtype=np.float32)
+            norms[start:start + len(block)] = np.einsum('ij,ij->i', block, block)
+        return norms
+
+    def _dot(self, queries, matrix):
+        """计算查询与所有行的内积，低精度存储时按块转换，避免整体复制为float32"""
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), self.COMPUTE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + self.COMPUTE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def _sync_rows(self):
+        """
+        同步其他进程追加的行（多个worker共用同一数据目录）: 以SQLite中的最大行位置为准，
+        重新映射被其他进程扩容的向量文件并补算新增行的范数（调用方需持有锁）
+        """
+        count = self._db.execute('SELECT MAX(pos) FROM rows').fetchone()[0]
+        count = 0 if count is None else count + 1
+        if count <= self._count:
+            return
+
+        capacity = os.path.getsize(self._vector_path) // self._row_bytes
+        if capacity > self._capacity:
+            self._capacity = capacity
+            self._map()
+        self._norms[self._count:count] = self._row_norms(self._matrix[self._count:count])
+        self._count = count
+        self._generation += 1
+
+    def _save_meta(self):
+        """保存元信息（写入临时文件后原子替换，调用方需持有锁）"""
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'dim': self.vector_dim, 'next_id': self._next_id, 'precision': self.precision}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def insert_vector(self, vector, content, metadata=None):
+        """插入向量数据"""
+        ids = self.insert_vectors([vector], [content], [metadata])
+        return ids[0] if ids else None
+
+    def insert_vectors(self, vectors, contents, metadatas=None, doc_ids=None, chunk_indexes=None,
+                       attributes=None, ids=None, pending=False):
+        """
+        批量插入向量数据
+
+        Args:
+            vectors: 向量列表
+            contents: 内容列表
+            metadatas: 元数据列表，可选
+            doc_ids: 所属文档ID列表，可选
+            chunk_indexes: 块序号列表，可选
+            attributes: 结构化元数据字典列表，可选
+            ids: 指定主键列表（镜像Milvus写入时使用），可选
+            pending: 是否为Milvus不可用时只写入本地、待回放的数据
+
+        Returns:
+            list: 插入后的ID列表，失败返回None
+        """
+        if not vectors:
+            return []
+
+        if not self.ensure_ready():
+            return None
+
+        if metadatas is None:
+            metadatas = [None] * len(vectors)
+        if doc_ids is None:
+            doc_ids = [""] * len(vectors)
+        if chunk_indexes is None:
+            chunk_indexes = [0] * len(vectors)
+
+        try:
+            batch = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.vector_dim)
+
+            with self._lock:
+                # 先取得SQLite写锁再读取行数和最大主键，多个worker进程的追加按顺序执行，不会写入同一位置
+                self._db.execute('BEGIN IMMEDIATE')
+                try:
+                    self._sync_rows()
+                    max_id = self._db.execute('SELECT MAX(id) FROM rows').fetchone()[0] or 0
+                    self._next_id = max(self._next_id, max_id + 1)
+                    ids = self._append(batch, contents, metadatas, doc_ids, chunk_indexes, attributes, ids, pending)
+                    self._save_meta()
+                    self._db.commit()
+                except Exception:
+                    self._db.rollback()
+                    raise
+
+                self._count += len(batch)
+                self._generation += 1
+
+            return [int(vector_id) for vector_id in ids]
+
+        except Exception as e:
+            print(f"❌ NumPy向量存储插入失败: {e}")
+            return None
+
+    def _append(self, batch, contents, metadatas, doc_ids, chunk_indexes, attributes, ids, pending):
+        """
+        在已有行之后写入向量和行数据（调用方需持有锁并已开启写事务）
+
+        Returns:
+            list: 写入的主键列表
+        """
+        start = self._count
+        end = start + len(batch)
+
+        if ids is None:
+            ids = list(range(self._next_id, self._next_id + len(batch)))
+        self._next_id = max(self._next_id, max(ids) + 1)
+
+        if self._ensure_capacity(end):
+            self._map()
+
+        # 范数按存储后的（可能降低精度的）值计算，与搜索时使用的向量一致
+        stored = batch.astype(self._matrix.dtype)
+        self._matrix[start:end] = stored
+        self._matrix.flush()
+        self._norms[start:end] = self._row_norms(stored)
+
+        columns = attribute_columns(attributes, len(batch))
+        self._db.executemany(
+            'INSERT INTO rows (pos, id, content, metadata, content_hash, doc_id, chunk_index, pending, '
+            f'{", ".join(STRUCTURED_FIELDS)}) VALUES ({", ".join("?" * (8 + len(STRUCTURED_FIELDS)))})',
+            [
+                (
+                    start + offset, int(vector_id), content, metadata or "",
+                    text_hash(content), doc_id or "", int(chunk_index), int(pending),
+                    *(columns[name][offset] for name in STRUCTURED_FIELDS)
+                )
+                for offset, (vector_id, content, metadata, doc_id, chunk_index) in enumerate(
+                    zip(ids, contents, metadatas, doc_ids, chunk_indexes)
+                )
+            ]
+        )
+        return ids
+
+    def find_ids_by_hashes(self, hashes):
+        """
+        按内容哈希查找已存在的数据
+
+        Returns:
+            dict: {内容哈希: 主键}
+        """
+        hashes = list(set(hashes))
+        if not hashes or not self.ensure_ready():
+            return {}
+
+        placeholders = ','.join('?' * len(hashes))
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT content_hash, MIN(id) FROM rows WHERE content_hash IN ({placeholders}) '
+                'GROUP BY content_hash',
+                hashes
+            ).fetchall()
+        return dict(rows)
+
+    def find_ids_by_doc(self, doc_id):
+        """查找文档的所有分块，按块序号排列"""
+        if not doc_id or not self.ensure_ready():
+            return []
+
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id FROM rows WHERE doc_id = ? ORDER BY chunk_index', (doc_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def update_metadata(self, vector_id, metadata, attributes=None):
+        """更新已有数据的元数据和请求中提供的结构化字段"""
+        if not self.ensure_ready():
+            return False
+
+        attributes = {name: value for name, value in (attributes or {}).items() if name in STRUCTURED_FIELDS}
+        assignments = ''.join(f', {name} = ?' for name in attributes)
+        with self._lock:
+            cursor = self._db.execute(
+                f'UPDATE rows SET metadata = ?{assignments} WHERE id = ?',
+                (metadata or "", *attributes.values(), int(vector_id))
+            )
+            self._db.commit()
+            self._generation += 1
+        return cursor.rowcount > 0
+
+    def pending_count(self):
+        """尚未回放到Milvus的数据条数"""
+        if not self.ensure_ready():
+            return 0
+
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM rows WHERE pending = 1').fetchone()[0]
+
+    def pending_rows(self, limit=500):
+        """
+        按写入顺序读取一批尚未回放到Milvus的数据
+
+        Returns:
+            list: 包含id、float32向量、内容、元数据、文档ID、块序号和结构化字段的字典列表
+        """
+        if not self.ensure_ready():
+            return []
+
+        with self._lock:
+            self._sync_rows()
+            rows = self._db.execute(
+                f'SELECT pos, {", ".join(self.ROW_FIELDS)} FROM rows '
+                'WHERE pending = 1 AND pos < ? ORDER BY pos LIMIT ?',
+                (self._count, limit)
+            ).fetchall()
+            return [
+                {**dict(zip(self.ROW_FIELDS, row[1:])), "vector": np.asarray(self._matrix[row[0]], dtype=np.float32)}
+                for row in rows
+            ]
+
+    def mark_replayed(self, id_mapping):
+        """
+        回放到Milvus后将本地数据的主键改为Milvus分配的主键，并清除待回放标记
+
+        Args:
+            id_mapping: {本地主键: Milvus主键}
+        """
+        self._update_ids(id_mapping, 'UPDATE rows SET id = ?, pending = 0 WHERE id = ?')
+
+    def remap_ids(self, id_mapping):
+        """
+        Milvus集合重建后将镜像数据的主键改为新主键（不在映射中的数据保持不变）
+
+        Args:
+            id_mapping: {原主键: 新主键}
+        """
+        self._update_ids(id_mapping, 'UPDATE rows SET id = ? WHERE id = ?')
+
+    def _update_ids(self, id_mapping, statement):
+        """按映射批量修改主键"""
+        if not id_mapping or not self.ensure_ready():
+            return
+
+        with self._lock:
+            self._db.executemany(
+                statement,
+                [(int(new_id), int(old_id)) for old_id, new_id in id_mapping.items()]
+            )
+            self._db.commit()
+            self._next_id = max(self._next_id, max(int(new_id) for new_id in id_mapping.values()) + 1)
+            self._save_meta()
+            self._generation += 1
+
+    def backfill_content_hash(self, batch_size=1000):
+        """
+        为缺少内容哈希的旧数据补齐哈希
+
+        Returns:
+            int: 补齐的条数
+        """
+        if not self.ensure_ready():
+            raise RuntimeError("NumPy向量存储初始化失败")
+
+        total = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, content FROM rows WHERE content_hash = '' LIMIT ?", (batch_size,)
+                ).fetchall()
+                if not rows:
+                    return total
+                self._db.executemany(
+                    'UPDATE rows SET content_hash = ? WHERE id = ?',
+                    [(text_hash(content), vector_id) for vector_id, content in rows]
+                )
+                self._db.commit()
+            total += len(rows)
+
+    def search_vectors(self, query_vector, limit=10, filters=None, radius=None, with_vectors=False, partitions=None):
+        """搜索相似向量"""
+        results = self.search_vectors_batch([query_vector], limit, filters, radius, with_vectors, partitions)
+        return results[0] if results else []
+
+    def search_vectors_batch(self, query_vectors, limit=10, filters=None, radius=None, with_vectors=False,
+                             partitions=None):
+        """
+        批量精确搜索
+
+        Args:
+            query_vectors: 查询向量列表
+            limit: 每个查询返回的结果数量
+            filters: parse_filter解析后的过滤条件，先按SQLite索引筛出候选行再计算top-k
+            radius: 范围搜索阈值，语义与Milvus一致（L2为最大距离，IP/COSINE为最小相似度）
+            with_vectors: 是否在结果中附带float32向量（vector字段，用于结果多样化）
+            partitions: 只搜索这些社区ID的数据（与Milvus分区语义一致，按community_id索引筛选候选行）
+
+        Returns:
+            list: 与query_vectors一一对应的结果列表，失败返回None
+        """
+        if not query_vectors:
+            return []
+
+        if partitions is not None:
+            filters = list(filters or []) + [("community_id", "in", list(partitions))]
+
+        if not self.ensure_ready():
+            return None
+
+        try:
+            # 取快照后在锁外计算，扩容不影响已映射的旧区域
+            where, params = to_sql_where(filters or [])
+            with self._lock:
+                self._sync_rows()
+                count = self._count
+                matrix = full_matrix = self._matrix[:count]
+                norms = self._norms[:count]
+                candidates = None
+                if where:
+                    candidates = np.fromiter(
+                        (row[0] for row in self._db.execute(f'SELECT pos FROM rows WHERE {where}', params)),
+                        dtype=np.int64
+                    )
+                    # 同步之后其他进程新提交的行留到下次搜索
+                    candidates = candidates[candidates < count]
+
+            if candidates is not None:
+                matrix = matrix[candidates]
+                norms = norms[candidates]
+                count = len(candidates)
+
+            if count == 0:
+                return [[] for _ in query_vectors]
+
+            queries = np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), self.vector_dim)
+            positions, distances = self._top_k(matrix, norms, queries, min(int(limit), count))
+            if candidates is not None:
+                positions = candidates[positions]
+
+            rows = self._fetch_rows({int(pos) for pos in positions.ravel()})
+            grouped = []
+            for query_positions, query_distances in zip(positions, distances):
+                search_results = []
+                for pos, distance in zip(query_positions, query_distances):
+                    if radius is not None and not self._within_radius(distance, radius):
+                        # 结果按相似度排序，之后的都不满足
+                        break
+                    row = rows[int(pos)]
+                    search_results.append({
+                        "id": row["id"],
+                        "distance": float(distance),
+                        "content": row["content"],
+                        "metadata": row["metadata"],
+                        "doc_id": row["doc_id"],
+                        "chunk_index": row["chunk_index"],
+                        **{name: row[name] for name in STRUCTURED_FIELDS}
+                    })
+                    if with_vectors:
+                        search_results[-1]["vector"] = np.asarray(full_matrix[int(pos)], dtype=np.float32)
+                grouped.append(search_results)
+
+            return grouped
+
+        except Exception as e:
+            print(f"❌ NumPy向量搜索失败: {e}")
+            return None
+
+    def _within_radius(self, distance, radius):
+        """是否满足范围搜索阈值"""
+        if self.metric_type == 'L2':
+            return distance < radius
+        return distance > radius
+
+    def _top_k(self, matrix, norms, queries, k):
+        """
+        使用argpartition计算精确top-k
+
+        Returns:
+            tuple: (位置矩阵, 距离矩阵)，按相似度从高到低排序
+        """
+        if self.metric_type == 'COSINE':
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            scores = -self._dot(queries, matrix) / np.maximum(np.sqrt(norms), 1e-12)[None, :]
+        elif self.metric_type == 'IP':
+            scores = -self._dot(queries, matrix)
+        else:
+            # |q-x|^2 = |q|^2 - 2q·x + |x|^2
+            scores = norms[None, :] - 2 * self._dot(queries, matrix)
+            scores += np.einsum('ij,ij->i', queries, queries)[:, None]
+
+        top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(top_scores, axis=1)
+        positions = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        # 与Milvus保持一致: L2返回平方距离，IP/COSINE返回相似度
+        distances = np.maximum(top_scores, 0) if self.metric_type == 'L2' else -top_scores
+        return positions, distances
+
+    def _fetch_rows(self, positions):
+        """按位置读取文本和元数据"""
+        if not positions:
+            return {}
+
+        placeholders = ','.join('?' * len(positions))
+        with self._lock:
+            cursor = self._db.execute(
+                f'SELECT pos, {", ".join(self.ROW_FIELDS)} FROM rows WHERE pos IN ({placeholders})',
+                list(positions)
+            )
+            return {row[0]: dict(zip(self.ROW_FIELDS, row[1:])) for row in cursor}
+
+    def iterate_rows(self, output_fields, after_id=None, batch_size=1000):
+        """
+        按主键顺序分批遍历所有数据
+
+        Yields:
+            list: 一批数据（字典列表）
+        """
+        if not self.ensure_ready():
+            raise RuntimeError("NumPy向量存储初始化失败")
+
+        last_id = int(after_id) if after_id is not None else -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f'SELECT {", ".join(self.ROW_FIELDS)} FROM rows WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+
+            batch = []
+            for row in rows:
+                item = dict(zip(self.ROW_FIELDS, row))
+                batch.append({field: item[field] for field in output_fields if field in item})
+            yield batch
+            last_id = rows[-1][0]
+
+    def has_field(self, field_name):
+        """是否包含指定字段（与MilvusClient接口一致）"""
+        return field_name in self.ROW_FIELDS
+
+    def vector_memory_bytes(self, count=None, precision=None):
+        """估算向量数据的内存占用"""
+        if count is None:
+            count = self._count
+        return count * self.vector_dim * VECTOR_PRECISION_BYTES[precision or self.precision]
+
+    def convert_precision(self, precision):
+        """
+        将向量文件转换为指定精度
+        按块写入该精度的新文件，meta.json切换到新精度后再删除旧文件，任一步骤中断都能按meta.json正确读取
+
+        Returns:
+            int: 转换的行数
+        """
+        if not self.ensure_ready():
+            raise RuntimeError("NumPy向量存储初始化失败")
+
+        with self._lock:
+            if precision == self.precision:
+                return 0
+
+            target_path = self._vector_file(precision)
+            tmp_path = target_path + '.tmp'
+            target = np.memmap(
+                tmp_path, dtype=np.dtype(precision), mode='w+',
+                shape=(max(self._capacity, 1), self.vector_dim)
+            )
+            for start in range(0, self._count, self.COMPUTE_BLOCK_ROWS):
+                end = min(start + self.COMPUTE_BLOCK_ROWS, self._count)
+                target[start:end] = np.asarray(self._matrix[start:end], dtype=np.float32)
+            target.flush()
+            del target
+
+            os.replace(tmp_path, target_path)
+            source_path = self._vector_path
+            self.precision = precision
+            self._save_meta()
+
+            self._matrix = None
+            os.remove(source_path)
+            self._norms = None
+            self._capacity = os.path.getsize(self._vector_path) // self._row_bytes
+            self._map()
+            self._generation += 1
+            return self._count
+
+    def disconnect(self):
+        """关闭本地存储"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            self._matrix = None
+            self._norms = None
+            self._ready.clear()
@@ -3,42 +3,189 @@ Ollama客户端工具
 用于调用Ollama API获取文本嵌入向量
 """
 import requests
+import asyncio
 import json
+import random
+import threading
+import time
 from typing import List, Optional
+from requests.adapters import HTTPAdapter
+import httpx
+from asgiref.sync import sync_to_async
+from utils.embedding_cache import get_embedding_cache, model_cache_key
+from utils.env_config import get_env_config
+from utils.model_registry import active_model_info
+
+
+def resolve_model(model: Optional[str] = None, version: Optional[str] = None):
+    """
+    确定嵌入模型及其缓存键，未指定模型时取活动集合登记的模型和版本
+    
+    Returns:
+        tuple: (模型名称, 嵌入缓存中的模型键)
+    """
+    if model is None:
+        info = active_model_info()
+        model, version = info['model'], info['version']
+    return model, model_cache_key(model, version)
+
+
+class OllamaBusyError(requests.exceptions.RequestException):
+    """并发请求数已达上限，等待超时"""
 
 
 class OllamaClient:
     """Ollama客户端类"""
     
-    def __init__(self, base_url: str = "http://localhost:11434"):
-        self.base_url = base_url
+    # 批量嵌入的读取超时（秒），批量请求耗时明显长于单条
+    BATCH_READ_TIMEOUT = 120
+    
+    def __init__(self, base_url: Optional[str] = None):
+        config = get_env_config()
+        self.base_url = (base_url or config.ollama_base_url).rstrip('/')
+        self.connect_timeout = config.ollama_connect_timeout
+        self.read_timeout = config.ollama_read_timeout
+        self.max_retries = config.ollama_max_retries
+        self.backoff_base = config.ollama_backoff_base
+        self.acquire_timeout = config.ollama_acquire_timeout
+        
+        # 共享的keep-alive连接池
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config.ollama_pool_size,
+            max_retries=0
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # 限制同时在途的请求数，防止突发流量压垮Ollama
+        self._semaphore = threading.BoundedSemaphore(config.ollama_max_concurrency)
+    
+    def _request(self, method: str, path: str, read_timeout: Optional[float] = None, **kwargs):
+        """
+        通过连接池发送请求
+        仅在连接错误和5xx时按带抖动的指数退避重试
+        
+        Raises:
+            requests.exceptions.RequestException: 重试耗尽或并发等待超时
+        """
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            raise OllamaBusyError(f"Ollama并发请求已满，等待 {self.acquire_timeout}s 超时")
+        
+        try:
+            timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+            attempt = 0
+            while True:
+                try:
+                    response = self.session.request(
+                        method, f"{self.base_url}{path}", timeout=timeout, **kwargs
+                    )
+                    if response.status_code < 500 or attempt >= self.max_retries:
+                        return response
+                    print(f"⚠️  Ollama返回 {response.status_code}，准备重试 ({attempt + 1}/{self.max_retries})")
+                except requests.exceptions.ConnectionError as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    print(f"⚠️  Ollama连接失败，准备重试 ({attempt + 1}/{self.max_retries}): {e}")
+                
+                # full jitter 退避
+                time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+                attempt += 1
+        finally:
+            self._semaphore.release()
     
-    def get_embedding(self, text: str, model: str = "chroma/all-minilm-l6-v2-f32") -> Optional[List[float]]:
+    def get_embedding(self, text: str, model: Optional[str] = None,
+                      version: Optional[str] = None) -> Optional[List[float]]:
         """
         获取文本的嵌入向量
         
         Args:
             text: 要嵌入的文本
-            model: 使用的模型名称
+            model: 使用的模型名称，默认为活动集合登记的模型
+            version: 模型版本（区分同名模型不同权重的缓存），未指定模型时取活动集合登记的版本
             
         Returns:
             List[float]: 嵌入向量，失败返回None
         """
+        model, cache_key = resolve_model(model, version)
+        cache = get_embedding_cache()
+        if cache is not None:
+            cached = cache.get(text, cache_key)
+            if cached is not None:
+                return cached
+        
+        embedding = self._request_embedding(text, model)
+        if embedding and cache is not None:
+            cache.set(text, cache_key, embedding)
+        return embedding
+    
+    def _request_embedding(self, text: str, model: str) -> Optional[List[float]]:
+        """请求Ollama获取单条文本的嵌入向量（与批量插入同用 /api/embed，返回的向量均已L2归一化）"""
+        embeddings = self._request_embeddings([text], model)
+        return embeddings[0] if embeddings else None
+    
+    def get_embeddings(self, texts: List[str], model: Optional[str] = None, version: Optional[str] = None,
+                       use_cache: bool = True) -> Optional[List[List[float]]]:
+        """
+        批量获取文本的嵌入向量（一次请求）
+        
+        Args:
+            texts: 要嵌入的文本列表
+            model: 使用的模型名称，默认为活动集合登记的模型
+            version: 模型版本（区分同名模型不同权重的缓存），未指定模型时取活动集合登记的版本
+            use_cache: 是否读写嵌入缓存（重新嵌入任务关闭，一次性的全量嵌入不挤占线上查询的缓存）
+            
+        Returns:
+            List[List[float]]: 与texts一一对应的嵌入向量列表，失败返回None
+        """
+        if not texts:
+            return []
+        
+        model, cache_key = resolve_model(model, version)
+        cache = get_embedding_cache() if use_cache else None
+        if cache is None:
+            return self._request_embeddings(texts, model)
+        
+        # 只对未命中缓存的文本请求Ollama
+        embeddings = [cache.get(text, cache_key) for text in texts]
+        missing = [index for index, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        
+        fetched = self._request_embeddings([texts[index] for index in missing], model)
+        if fetched is None:
+            return None
+        
+        for index, embedding in zip(missing, fetched):
+            embeddings[index] = embedding
+            cache.set(texts[index], cache_key, embedding)
+        return embeddings
+    
+    def _request_embeddings(self, texts: List[str], model: str) -> Optional[List[List[float]]]:
+        """
+        请求Ollama嵌入接口 /api/embed
+        单条、批量和异步嵌入都使用该接口，保证入库向量与查询向量的尺度一致
+        """
         try:
-            response = requests.post(
-                f"{self.base_url}/api/embeddings",
+            response = self._request(
+                'POST',
+                '/api/embed',
+                read_timeout=self.BATCH_READ_TIMEOUT if len(texts) > 1 else None,
                 json={
                     "model": model,
-                    "prompt": text
-                },
-                timeout=30
+                    "input": texts
+                }
             )
             
             if response.status_code == 200:
-                result = response.json()
-                return result.get("embedding")
+                embeddings = response.json().get("embeddings")
+                if not embeddings or len(embeddings) != len(texts):
+                    print(f"❌ Ollama批量嵌入返回数量不匹配: 期望 {len(texts)}")
+                    return None
+                return embeddings
             else:
-                print(f"❌ Ollama API请求失败: {response.status_code} - {response.text}")
+                print(f"❌ Ollama批量API请求失败: {response.status_code} - {response.text}")
                 return None
                 
         except requests.exceptions.RequestException as e:
@@ -48,13 +195,13 @@ class OllamaClient:
             print(f"❌ JSON解析错误: {e}")
             return None
         except Exception as e:
-            print(f"❌ 获取嵌入向量失败: {e}")
+            print(f"❌ 批量获取嵌入向量失败: {e}")
             return None
     
     def check_connection(self) -> bool:
         """检查Ollama连接状态"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._request('GET', '/api/tags', read_timeout=5)
             return response.status_code == 200
         except:
             return False
@@ -62,7 +209,7 @@ class OllamaClient:
     def list_models(self) -> Optional[list]:
         """获取可用模型列表"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._request('GET', '/api/tags', read_timeout=5)
             if response.status_code == 200:
                 return response.json().get("models", [])
             return None
@@ -70,10 +217,161 @@ class OllamaClient:
             return None
 
 
+class AsyncOllamaClient:
+    """
+    异步Ollama客户端类（ASGI下使用）
+    基于httpx.AsyncClient连接池，重试、超时与并发上限策略与OllamaClient一致
+    """
+    
+    def __init__(self, base_url: Optional[str] = None):
+        config = get_env_config()
+        self.base_url = (base_url or config.ollama_base_url).rstrip('/')
+        self.connect_timeout = config.ollama_connect_timeout
+        self.read_timeout = config.ollama_read_timeout
+        self.max_retries = config.ollama_max_retries
+        self.backoff_base = config.ollama_backoff_base
+        self.acquire_timeout = config.ollama_acquire_timeout
+        self.pool_size = config.ollama_pool_size
+        self.max_concurrency = config.ollama_max_concurrency
+        
+        # httpx客户端和信号量绑定在客户端自有的事件循环（后台线程）上，延迟创建；
+        # WSGI下async_to_sync每个请求一个新事件循环，调用方的循环只等待结果，所有请求共享同一个连接池
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+    
+    def _ensure_loop(self):
+        """启动客户端事件循环线程并创建客户端与信号量（只执行一次）"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='async-ollama-client', daemon=True).start()
+                self._client = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size
+                    )
+                )
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._loop = loop
+            return self._loop
+    
+    async def _run(self, coro):
+        """在客户端事件循环上执行协程，调用方取消时一并取消"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return await asyncio.wrap_future(future)
+    
+    async def _request(self, method: str, path: str, read_timeout: Optional[float] = None, **kwargs):
+        """
+        通过连接池发送异步请求（在客户端事件循环上执行）
+        仅在连接错误和5xx时按带抖动的指数退避重试
+        """
+        client = self._client
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise OllamaBusyError(f"Ollama并发请求已满，等待 {self.acquire_timeout}s 超时")
+        
+        try:
+            timeout = httpx.Timeout(read_timeout or self.read_timeout, connect=self.connect_timeout)
+            attempt = 0
+            while True:
+                try:
+                    response = await client.request(method, path, timeout=timeout, **kwargs)
+                    if response.status_code < 500 or attempt >= self.max_retries:
+                        return response
+                    print(f"⚠️  Ollama返回 {response.status_code}，准备重试 ({attempt + 1}/{self.max_retries})")
+                except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    print(f"⚠️  Ollama连接失败，准备重试 ({attempt + 1}/{self.max_retries}): {e}")
+                
+                await asyncio.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+                attempt += 1
+        finally:
+            self._semaphore.release()
+    
+    @staticmethod
+    async def _cache_call(method, *args):
+        """读写嵌入缓存，启用磁盘层时SQLite读写放到线程池执行，不阻塞事件循环"""
+        if method.__self__.db_path:
+            return await sync_to_async(method, thread_sensitive=False)(*args)
+        return method(*args)
+    
+    async def get_embedding(self, text: str, model: Optional[str] = None,
+                            version: Optional[str] = None) -> Optional[List[float]]:
+        """
+        异步获取文本的嵌入向量
+        
+        Args:
+            text: 要嵌入的文本
+            model: 使用的模型名称，默认为活动集合登记的模型
+            version: 模型版本（区分同名模型不同权重的缓存），未指定模型时取活动集合登记的版本
+            
+        Returns:
+            List[float]: 嵌入向量，失败返回None
+        """
+        model, cache_key = resolve_model(model, version)
+        cache = get_embedding_cache()
+        if cache is not None:
+            cached = await self._cache_call(cache.get, text, cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            response = await self._run(self._request(
+                'POST',
+                '/api/embed',
+                json={
+                    "model": model,
+                    "input": [text]
+                }
+            ))
+            
+            if response.status_code != 200:
+                print(f"❌ Ollama API请求失败: {response.status_code} - {response.text}")
+                return None
+            
+            embeddings = response.json().get("embeddings")
+            embedding = embeddings[0] if embeddings else None
+            
+        except (httpx.HTTPError, OllamaBusyError) as e:
+            print(f"❌ Ollama连接错误: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"❌ JSON解析错误: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ 获取嵌入向量失败: {e}")
+            return None
+        
+        if embedding and cache is not None:
+            await self._cache_call(cache.set, text, cache_key, embedding)
+        return embedding
+    
+    async def aclose(self):
+        """关闭连接池并停止客户端事件循环"""
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop = self._client = self._semaphore = None
+        if loop is not None:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            loop.call_soon_threadsafe(loop.stop)
+
+
 # 全局Ollama客户端实例
 ollama_client = OllamaClient()
+async_ollama_client = AsyncOllamaClient()
 
 
 def get_ollama_client():
     """获取Ollama客户端实例"""
     return ollama_client
+
+
+def get_async_ollama_client():
+    """获取异步Ollama客户端实例"""
+    return async_ollama_client
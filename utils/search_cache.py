@@ -0,0 +1,106 @@
+"""
+向量搜索结果缓存
+带TTL和容量上限的LRU，通过写入代数（generation）在插入后失效
+"""
+import array
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def vector_hash(vector) -> str:
+    """计算向量（按float32）的哈希"""
+    return hashlib.sha1(array.array('f', vector).tobytes()).hexdigest()
+
+
+def make_search_key(vector, limit, search_params, **extra) -> str:
+    """
+    构造搜索缓存键
+
+    Args:
+        vector: 查询向量
+        limit: 返回数量
+        search_params: 搜索参数（索引/度量参数）
+        extra: 其他影响结果的参数
+    """
+    params = json.dumps(
+        {'limit': limit, 'search_params': search_params, 'extra': extra},
+        sort_keys=True,
+        default=str
+    )
+    return f"{vector_hash(vector)}:{hashlib.sha1(params.encode('utf-8')).hexdigest()}"
+
+
+class SearchResultCache:
+    """搜索结果缓存类"""
+
+    def __init__(self, max_size: int = 2000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, generation):
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+            generation: 当前写入代数，与缓存条目不一致时视为失效
+
+        Returns:
+            list: 命中时返回结果副本，否则返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, results = entry
+                if entry_generation == generation and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(item) for item in results]
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, generation, results):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            generation: 执行搜索前读取到的写入代数
+            results: 搜索结果
+        """
+        with self._lock:
+            self._entries[key] = (
+                generation,
+                time.monotonic() + self.ttl,
+                [dict(item) for item in results]
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
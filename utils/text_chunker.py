@@ -0,0 +1,105 @@
+"""
+长文本分块工具
+按中文/英文句末标点切分句子，再合并为带重叠的文本块
+"""
+import re
+from typing import List
+
+# 句末标点（保留在句子末尾），连续的结束引号/括号一并保留
+_SENTENCE_END = re.compile(r'([。！？；!?;…]+[”’」』）)]*|\n+)')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按句末标点切分句子
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        List[str]: 句子列表（保留标点，去除空白句）
+    """
+    parts = _SENTENCE_END.split(text)
+    sentences = []
+    for index in range(0, len(parts), 2):
+        sentence = parts[index]
+        if index + 1 < len(parts) and not parts[index + 1].startswith('\n'):
+            sentence += parts[index + 1]
+        sentence = sentence.strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def chunk_text(text: str, max_chars: int = 500, overlap_chars: int = 80) -> List[str]:
+    """
+    将长文本切分为带重叠的文本块，尽量在句子边界处切分
+
+    Args:
+        text: 原始文本
+        max_chars: 每块最大字符数
+        overlap_chars: 相邻块之间重叠的最大字符数（取上一块末尾的完整句子）
+
+    Returns:
+        List[str]: 文本块列表
+    """
+    overlap_chars = min(overlap_chars, max_chars // 2)
+
+    # 超长句子按固定长度硬切
+    sentences = []
+    for sentence in split_sentences(text):
+        while len(sentence) > max_chars:
+            sentences.append(sentence[:max_chars])
+            sentence = sentence[max_chars - overlap_chars:]
+        sentences.append(sentence)
+
+    chunks = []
+    current = []
+    current_len = 0
+    for sentence in sentences:
+        if current and current_len + len(sentence) > max_chars:
+            chunks.append(''.join(current))
+
+            # 从上一块末尾取完整句子作为重叠
+            overlap = []
+            overlap_len = 0
+            for previous in reversed(current):
+                if overlap_len + len(previous) > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_len += len(previous)
+            # 加上新句子仍超长时放弃重叠
+            if overlap_len + len(sentence) > max_chars:
+                overlap, overlap_len = [], 0
+            current, current_len = overlap, overlap_len
+
+        current.append(sentence)
+        current_len += len(sentence)
+
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def collapse_by_document(results: List[dict], limit: int) -> List[dict]:
+    """
+    按文档折叠搜索结果：同一文档的多个分块只保留得分最高（排在最前）的一个
+
+    Args:
+        results: 已按相似度排序的搜索结果，未分块的数据doc_id为空，按自身id区分
+        limit: 折叠后最多返回的数量
+
+    Returns:
+        List[dict]: 折叠后的搜索结果
+    """
+    collapsed = []
+    seen = set()
+    for item in results:
+        key = item.get('doc_id') or f"id:{item['id']}"
+        if key in seen:
+            continue
+        seen.add(key)
+        collapsed.append(item)
+        if len(collapsed) >= limit:
+            break
+    return collapsed
@@ -0,0 +1,266 @@
+"""
+向量存储后端选择
+根据配置返回Milvus、NumPy或带自动兜底的组合后端，三者接口一致；
+启用词法索引时在外层同步写入词法索引；存储绑定模型登记中的活动集合
+"""
+import threading
+import time
+from utils.env_config import get_env_config
+from utils.milvus_client import MilvusClient, get_milvus_client
+from utils.numpy_vector_store import NumpyVectorStore
+from utils.lexical_index import get_lexical_index
+from utils.metadata_fields import STRUCTURED_FIELDS, with_created_at
+from utils.model_registry import get_model_registry
+
+
+class FallbackVectorStore:
+    """
+    带兜底的向量存储
+    写入Milvus成功后以相同ID镜像写入NumPy存储；Milvus不可用或搜索失败时改用NumPy存储。
+    Milvus写入失败时数据只写入NumPy并标记为待回放，存在待回放数据期间读操作都使用NumPy存储（数据完整），
+    Milvus恢复后在后台线程按批回放，回放后这些数据的主键改为Milvus分配的主键
+    """
+    
+    # 每批回放的条数
+    REPLAY_BATCH_SIZE = 500
+    
+    # 回放失败（Milvus仍不可用）后的重试间隔（秒）
+    REPLAY_RETRY_INTERVAL = 30
+    
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self._pending = None
+        self._replay_lock = threading.Lock()
+        self._last_replay_attempt = 0.0
+    
+    def __getattr__(self, name):
+        # 其余属性和方法（collection_name、search_cache、iterate_rows等）以主后端为准
+        return getattr(self.primary, name)
+    
+    @property
+    def is_ready(self):
+        return self.primary.is_ready or self.fallback.is_ready
+    
+    def connect(self):
+        primary_ok = self.primary.connect()
+        return self.fallback.connect() or primary_ok
+    
+    def ensure_ready(self):
+        primary_ok = self.primary.ensure_ready()
+        return self.fallback.ensure_ready() or primary_ok
+    
+    @property
+    def pending_count(self):
+        """只写入了NumPy存储、尚未回放到Milvus的数据条数"""
+        if self._pending is None:
+            self._pending = self.fallback.pending_count()
+        return self._pending
+    
+    def _read_store(self):
+        """读操作使用的存储: 存在待回放数据或Milvus不可用时使用NumPy存储"""
+        if self.pending_count:
+            self._schedule_replay()
+            return self.fallback
+        return self.primary if self.primary.ensure_ready() else self.fallback
+    
+    def _schedule_replay(self):
+        """在后台线程回放待回放数据（同一时间只有一个回放线程，失败后按间隔重试）"""
+        if time.time() - self._last_replay_attempt < self.REPLAY_RETRY_INTERVAL:
+            return
+        if not self._replay_lock.acquire(blocking=False):
+            return
+        self._last_replay_attempt = time.time()
+        threading.Thread(target=self._replay_pending, name='vector-store-replay', daemon=True).start()
+    
+    def _replay_pending(self):
+        """将待回放数据按批写入Milvus，并把NumPy存储和词法索引中的主键改为Milvus主键"""
+        try:
+            lexical_index = get_lexical_index(self.primary.collection_name)
+            replayed = 0
+            while self.primary.ensure_ready():
+                rows = self.fallback.pending_rows(self.REPLAY_BATCH_SIZE)
+                if not rows:
+                    break
+                
+                attributes = [{name: row[name] for name in STRUCTURED_FIELDS} for row in rows]
+                ids = self.primary.insert_vectors(
+                    [row["vector"] for row in rows], [row["content"] for row in rows],
+                    [row["metadata"] for row in rows], [row["doc_id"] for row in rows],
+                    [row["chunk_index"] for row in rows], attributes
+                )
+                if ids is None:
+                    break
+                
+                old_ids = [row["id"] for row in rows]
+                self.fallback.mark_replayed(dict(zip(old_ids, ids)))
+                if lexical_index is not None:
+                    lexical_index.remove(old_ids)
+                    lexical_index.add(ids, [row["content"] for row in rows], [row["doc_id"] for row in rows], attributes)
+                replayed += len(rows)
+            
+            if replayed:
+                print(f"✅ 已将 {replayed} 条兜底数据回放到Milvus")
+        except Exception as e:
+            print(f"❌ 回放兜底数据失败: {e}")
+        finally:
+            self._pending = None
+            self._replay_lock.release()
+    
+    def insert_vector(self, vector, content, metadata=None):
+        """插入向量数据"""
+        ids = self.insert_vectors([vector], [content], [metadata])
+        return ids[0] if ids else None
+    
+    def insert_vectors(self, vectors, contents, metadatas=None, doc_ids=None, chunk_indexes=None, attributes=None):
+        """批量插入，主后端失败时直接写入兜底后端"""
+        # 统一在此补齐created_at，保证主后端和镜像的时间戳一致
+        attributes = with_created_at(attributes, len(vectors))
+        
+        ids = self.primary.insert_vectors(vectors, contents, metadatas, doc_ids, chunk_indexes, attributes)
+        if ids is None:
+            print("⚠️  Milvus写入失败，写入NumPy兜底存储（Milvus恢复后回放）")
+            ids = self.fallback.insert_vectors(
+                vectors, contents, metadatas, doc_ids, chunk_indexes, attributes, pending=True
+            )
+            self._pending = None
+            return ids
+        
+        if self.fallback.insert_vectors(
+            vectors, contents, metadatas, doc_ids, chunk_indexes, attributes, ids=ids
+        ) is None:
+            print("⚠️  NumPy兜底存储镜像写入失败")
+        return ids
+    
+    def find_ids_by_hashes(self, hashes):
+        """按内容哈希查找已存在的数据，主后端不可用或有待回放数据时查兜底后端"""
+        return self._read_store().find_ids_by_hashes(hashes)
+    
+    def find_ids_by_doc(self, doc_id):
+        """查找文档的所有分块，主后端不可用或有待回放数据时查兜底后端"""
+        return self._read_store().find_ids_by_doc(doc_id)
+    
+    def update_metadata(self, vector_id, metadata, attributes=None):
+        """更新元数据和结构化字段，同时更新镜像"""
+        primary_ok = self.primary.update_metadata(vector_id, metadata, attributes)
+        fallback_ok = self.fallback.update_metadata(vector_id, metadata, attributes)
+        return primary_ok or fallback_ok
+    
+    def search_vectors(self, query_vector, limit=10, filters=None, radius=None, with_vectors=False, partitions=None):
+        """搜索相似向量"""
+        results = self.search_vectors_batch([query_vector], limit, filters, radius, with_vectors, partitions)
+        return results[0] if results else []
+    
+    def search_vectors_batch(self, query_vectors, limit=10, filters=None, radius=None, with_vectors=False,
+                             partitions=None):
+        """批量搜索，主后端失败或有待回放数据时使用兜底后端"""
+        if self.pending_count:
+            self._schedule_replay()
+            return self.fallback.search_vectors_batch(query_vectors, limit, filters, radius, with_vectors, partitions)
+        
+        results = self.primary.search_vectors_batch(query_vectors, limit, filters, radius, with_vectors, partitions)
+        if results is None:
+            print("⚠️  Milvus搜索失败，使用NumPy兜底存储")
+            return self.fallback.search_vectors_batch(query_vectors, limit, filters, radius, with_vectors, partitions)
+        return results
+    
+    def iterate_rows(self, output_fields, after_id=None, batch_size=1000):
+        """遍历所有数据，主后端不可用或有待回放数据时遍历兜底后端"""
+        return self._read_store().iterate_rows(output_fields, after_id=after_id, batch_size=batch_size)
+
+
+class LexicalSyncedStore:
+    """
+    同步词法索引的向量存储
+    向量写入成功后以相同ID写入词法索引，其余操作直接交给内部存储
+    """
+    
+    def __init__(self, store, lexical_index):
+        self.store = store
+        self.lexical_index = lexical_index
+    
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+    
+    def insert_vector(self, vector, content, metadata=None):
+        """插入向量数据"""
+        ids = self.insert_vectors([vector], [content], [metadata])
+        return ids[0] if ids else None
+    
+    def insert_vectors(self, vectors, contents, metadatas=None, doc_ids=None, chunk_indexes=None, attributes=None):
+        """批量插入并写入词法索引（词法索引写入失败不影响向量写入结果）"""
+        attributes = with_created_at(attributes, len(vectors))
+        ids = self.store.insert_vectors(vectors, contents, metadatas, doc_ids, chunk_indexes, attributes)
+        if ids is not None:
+            self.lexical_index.add(ids, contents, doc_ids, attributes)
+        return ids
+    
+    def update_metadata(self, vector_id, metadata, attributes=None):
+        """更新元数据和结构化字段，词法索引中的结构化字段同步更新（混合搜索过滤使用）"""
+        updated = self.store.update_metadata(vector_id, metadata, attributes)
+        if updated and attributes:
+            self.lexical_index.update_attributes(vector_id, attributes)
+        return updated
+
+
+_vector_store = None
+_vector_store_collection = None
+_vector_store_lock = threading.Lock()
+
+
+def build_vector_store(collection_name, vector_dim=None):
+    """
+    按配置创建绑定指定集合的向量存储（重新嵌入任务用于写入影子集合）
+    
+    VECTOR_BACKEND=milvus（默认）: Milvus，VECTOR_FALLBACK=True时带NumPy兜底
+    VECTOR_BACKEND=numpy: 仅使用进程内NumPy精确搜索
+    LEXICAL_INDEX_ENABLED=True 时外层包装该集合的词法索引同步
+    """
+    config = get_env_config()
+    if config.vector_backend == 'numpy':
+        store = NumpyVectorStore(collection_name=collection_name, vector_dim=vector_dim)
+    else:
+        milvus = get_milvus_client()
+        if milvus.collection_name != collection_name:
+            milvus = MilvusClient(collection_name, vector_dim)
+        if config.vector_fallback:
+            store = FallbackVectorStore(
+                milvus, NumpyVectorStore(collection_name=collection_name, vector_dim=vector_dim)
+            )
+        else:
+            store = milvus
+    
+    lexical_index = get_lexical_index(collection_name)
+    if lexical_index is not None:
+        store = LexicalSyncedStore(store, lexical_index)
+    return store
+
+
+def get_vector_store():
+    """获取绑定活动集合的向量存储，活动集合切换后重新创建（进行中的请求继续使用旧实例）"""
+    global _vector_store, _vector_store_collection
+    active = get_model_registry().active_collection()
+    if _vector_store is None or _vector_store_collection != active:
+        with _vector_store_lock:
+            if _vector_store is None or _vector_store_collection != active:
+                _vector_store = build_vector_store(active)
+                _vector_store_collection = active
+    return _vector_store
+
+
+def rebuild_milvus_collection(milvus_client, batch_size=1000):
+    """
+    按当前schema重建Milvus集合（字段回填、精度迁移和社区分区共用）
+    重建后Milvus主键重新分配，VECTOR_FALLBACK=True 时同步修改NumPy镜像中的主键；词法索引需另行重建
+    
+    Returns:
+        int: 迁移的数据条数
+    """
+    mirror = None
+    if get_env_config().vector_fallback:
+        mirror = NumpyVectorStore(collection_name=milvus_client.collection_name, vector_dim=milvus_client.vector_dim)
+    try:
+        return milvus_client.rebuild_collection(batch_size, on_remap=mirror.remap_ids if mirror else None)
+    finally:
+        if mirror is not None:
+            mirror.disconnect()
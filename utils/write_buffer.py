@@ -0,0 +1,191 @@
+"""
+写后缓冲（write-behind）
+插入请求先进入有界内存队列，由后台线程在攒够N条或等待T毫秒后一次性列式写入
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from utils.env_config import get_env_config
+from utils.vector_store import get_vector_store
+
+
+class BufferFullError(Exception):
+    """缓冲区已满，等待超时（反压）"""
+
+
+class WriteBehindBuffer:
+    """写后缓冲类"""
+
+    def __init__(self, store, max_rows=256, max_delay_ms=50, capacity=10000):
+        """
+        Args:
+            store: 向量存储（需提供insert_vectors）
+            max_rows: 攒够多少条立即刷新
+            max_delay_ms: 第一条进入后最多等待多少毫秒刷新
+            capacity: 缓冲区最大条数，满时submit阻塞
+        """
+        self.store = store
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue(maxsize=capacity)
+        self._closed = threading.Event()
+        # 后台线程退出的判定与关闭后的清理在同一把锁下进行，避免与关闭竞争的submit永远等不到结果
+        self._exit_lock = threading.Lock()
+        self._finished = False
+        self.flushed_rows = 0
+        self.flush_count = 0
+
+        self._thread = threading.Thread(target=self._run, name='vector-write-behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, vector, content, metadata=None, timeout=None, attributes=None) -> Future:
+        """
+        提交一条待插入数据
+
+        Args:
+            attributes: 结构化元数据字典，可选
+            timeout: 缓冲区满时最多等待的秒数，None表示一直等待
+
+        Returns:
+            Future: 刷新完成后结果为插入的ID
+
+        Raises:
+            BufferFullError: 等待超时仍无空位
+            RuntimeError: 缓冲区已关闭
+
+        与close()竞争时，若后台线程已退出，返回的Future会被取消
+        """
+        if self._closed.is_set():
+            raise RuntimeError("写后缓冲已关闭")
+
+        future = Future()
+        try:
+            self._queue.put((vector, content, metadata, attributes, future), timeout=timeout)
+        except queue.Full:
+            raise BufferFullError("写入缓冲区已满，请稍后重试")
+
+        if self._closed.is_set():
+            with self._exit_lock:
+                if self._finished:
+                    self._cancel_pending()
+        return future
+
+    def _run(self):
+        """后台刷新循环"""
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed.is_set():
+                    with self._exit_lock:
+                        if self._queue.empty():
+                            self._finished = True
+                            return
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        """一次列式写入并回填Future"""
+        futures = [item[4] for item in batch]
+        try:
+            ids = self.store.insert_vectors(
+                [item[0] for item in batch],
+                [item[1] for item in batch],
+                [item[2] for item in batch],
+                attributes=[item[3] for item in batch]
+            )
+        except Exception as e:
+            ids = None
+            print(f"❌ 写后缓冲刷新失败: {e}")
+
+        if ids is None or len(ids) != len(batch):
+            for future in futures:
+                future.set_exception(RuntimeError("批量写入失败"))
+            return
+
+        self.flushed_rows += len(batch)
+        self.flush_count += 1
+        for future, vector_id in zip(futures, ids):
+            future.set_result(vector_id)
+
+    def close(self, timeout=30):
+        """停止接收新数据并等待缓冲区排空"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️  写后缓冲未能在 {timeout}s 内排空，剩余 {self._queue.qsize()} 条")
+            return
+
+        with self._exit_lock:
+            self._cancel_pending()
+
+    def _cancel_pending(self):
+        """取消后台线程退出后仍留在队列中的数据（调用方需持有_exit_lock）"""
+        cancelled = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[4].cancel():
+                cancelled += 1
+        if cancelled:
+            print(f"⚠️  写后缓冲已关闭，取消 {cancelled} 条未写入的数据")
+
+    def stats(self) -> dict:
+        """获取缓冲区统计信息"""
+        return {
+            'pending': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'max_rows': self.max_rows,
+            'max_delay_ms': int(self.max_delay * 1000),
+            'flushed_rows': self.flushed_rows,
+            'flush_count': self.flush_count
+        }
+
+
+_write_buffer = None
+_write_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """
+    获取写后缓冲实例，未启用时返回None
+    活动集合切换后为新的向量存储创建缓冲，旧缓冲在后台排空后关闭
+    """
+    global _write_buffer
+    config = get_env_config()
+    if not config.write_behind_enabled:
+        return None
+
+    store = get_vector_store()
+    if _write_buffer is None or _write_buffer.store is not store:
+        with _write_buffer_lock:
+            if _write_buffer is None or _write_buffer.store is not store:
+                previous = _write_buffer
+                _write_buffer = WriteBehindBuffer(
+                    store,
+                    max_rows=config.write_behind_max_rows,
+                    max_delay_ms=config.write_behind_max_delay_ms,
+                    capacity=config.write_behind_capacity
+                )
+                atexit.register(_write_buffer.close)
+                if previous is not None:
+                    threading.Thread(target=previous.close, name='vector-write-behind-close', daemon=True).start()
+    return _write_buffer